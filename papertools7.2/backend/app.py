@@ -3,7 +3,7 @@ import sys
 from pathlib import Path
 sys.path.append(str(Path(__file__).resolve().parent.parent))  # 添加项目根目录到 sys.path
 from dao.paper_dao import PaperDao
-from flask import Flask
+from flask import Flask, jsonify
 from flasgger import Swagger
 # 从 config 包导入配置类和数据库实例
 from backend.config import DevelopmentConfig
@@ -23,6 +23,9 @@ def create_app():
     # 加载配置（开发环境用 DevelopmentConfig）
     app.config.from_object(DevelopmentConfig)
     app.config['UPLOAD_FOLDER'] = 'uploads'  # 明确设置上传文件夹
+    # 请求体大小上限：超出时 werkzeug 在解析表单阶段直接拒绝，不会把整个文件读入内存
+    from config.config import MAX_CONTENT_LENGTH
+    app.config['MAX_CONTENT_LENGTH'] = MAX_CONTENT_LENGTH
     # 初始化数据库，将 db 与 app 绑定
     #db.init_app(app)
     db.init_app(app)
@@ -37,6 +40,26 @@ def create_app():
     # 配置 CORS（允许前端跨域访问）
     CORS(app, origins=["http://localhost:5173"], supports_credentials=False)
 
+    # 错字检测模型预加载：必须在导入 paper_controller（构造 PaperService / Typo_Detection）之前完成
+    from config.config import SPELL_MODEL_PRELOAD, SPELL_CHECK_WORKERS
+    if SPELL_MODEL_PRELOAD:
+        from utils.spell_shards import preload_corrector
+        preload_corrector()
+    elif SPELL_CHECK_WORKERS > 1:
+        # 进程池模式：后台启动 Corrector 工作进程并加载模型，不阻塞应用启动
+        # （预加载模式下进程池在 worker 进程中首次使用时才以 fork 启动，主进程里建的进程池无法跨 fork 使用，且 fork 启动无需加载模型）
+        import threading
+        from config.logging_config import logger
+        from utils.spell_shards import get_sharded_corrector
+
+        def warmup_spell_check():
+            try:
+                get_sharded_corrector().warmup()
+            except Exception as e:
+                logger.warning(f"错字检测进程池预热失败，首次检测时再启动: {str(e)}")
+
+        threading.Thread(target=warmup_spell_check, name='spell-check-warmup', daemon=True).start()
+
     from controller.paper_controller import paper_bp
     from controller.user_controller import user_bp
     from controller.operation_controller import operation_bp 
@@ -47,11 +70,37 @@ def create_app():
     app.register_blueprint(operation_bp)
     app.register_blueprint(ai_bp)
 
+    # TF-IDF 语料统计补充历史论文：在后台线程执行一次，相似度请求不再等待冷启动统计
+    import threading
+    from controller.paper_controller import paper_service
+
+    def backfill_tfidf_corpus():
+        with app.app_context():
+            paper_service.backfill_tfidf_corpus()
+
+    threading.Thread(target=backfill_tfidf_corpus, name='tfidf-backfill', daemon=True).start()
+
 
     swagger_template = app.config['SWAGGER_TEMPLATE']
     swagger_config = app.config['SWAGGER_CONFIG']
     # 初始化 Swagger
     swagger = Swagger(app, template=swagger_template, config=swagger_config)
+
+    @app.errorhandler(413)
+    def request_entity_too_large(e):
+        return jsonify({
+            'code': 413,
+            'message': f'上传文件过大，最大允许 {MAX_CONTENT_LENGTH // 1024 // 1024} MB',
+            'data': None
+        }), 413
+
+    # 语义向量服务：每个 worker 进程共享一个模型实例
+    from service.embedding_service import get_embedding_service
+    from config.config import PRELOAD_EMBEDDING_MODEL
+    embedding_service = get_embedding_service()
+    app.extensions['embedding_service'] = embedding_service
+    if PRELOAD_EMBEDDING_MODEL:
+        embedding_service.preload()
     
     return app
 #-------------------------------------------------------
@@ -11,6 +11,81 @@ XINGHUO_API_PASSWORD="gLpqVRrdFHZuPNTYfeeU:YKOTbtqeeKVypNSTGcsK"
 # 上传文件配置
 UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'store', 'papers')
 MAX_CONTENT_LENGTH = 10 * 1024 * 1024  # 10MB 最大文件大小
+UPLOAD_SPOOL_MAX_MEMORY = int(os.getenv('UPLOAD_SPOOL_MAX_MEMORY', str(1024 * 1024)))  # 上传文件在内存中缓冲的上限，超出后转存临时文件
+
+# PDF 并行提取
+PDF_EXTRACT_WORKERS = int(os.getenv('PDF_EXTRACT_WORKERS', str(min(4, os.cpu_count() or 1))))  # 提取进程数
+PDF_PARALLEL_MIN_PAGES = int(os.getenv('PDF_PARALLEL_MIN_PAGES', '8'))    # 页数少于该值时整篇作为一个任务提取（不拆分页范围）
+PDF_PAGES_PER_TASK = int(os.getenv('PDF_PAGES_PER_TASK', '8'))            # 每个提取任务的页数
+PDF_EXTRACT_TIMEOUT = float(os.getenv('PDF_EXTRACT_TIMEOUT', '120'))      # 单篇文档提取耗时预算（秒）
+PDF_EXTRACT_MEMORY_MB = int(os.getenv('PDF_EXTRACT_MEMORY_MB', '1024'))   # 单个提取进程的内存上限（MB，0 表示不限制）
+PROGRESSIVE_EXTRACT_THREADS = int(os.getenv('PROGRESSIVE_EXTRACT_THREADS', '4'))  # 渐进式提取中后台全文提取的线程数
+QUERY_HEAD_PAGES = int(os.getenv('QUERY_HEAD_PAGES', '3'))        # 构造检索式只读取前 N 页（标题、摘要、引言）
+QUERY_HEAD_CHARS = int(os.getenv('QUERY_HEAD_CHARS', '6000'))     # 构造检索式最多读取的字符数
+
+# 旧版 Word（.doc）转换进程池
+DOC_CONVERT_WORKERS = int(os.getenv('DOC_CONVERT_WORKERS', '2'))          # 常驻转换进程数
+DOC_CONVERT_TIMEOUT = float(os.getenv('DOC_CONVERT_TIMEOUT', '60'))       # 单个文件排队 + 转换的时限（秒）
+DOC_CONVERT_QUEUE_SIZE = int(os.getenv('DOC_CONVERT_QUEUE_SIZE', '16'))   # 最多排队的任务数，超出时直接拒绝
+DOC_CONVERT_MAX_TASKS = int(os.getenv('DOC_CONVERT_MAX_TASKS', '200'))    # 每个转换进程处理多少个文件后替换（0 表示不替换）
+
+# 错字检测（pycorrector）按句分片并行
+SPELL_CHECK_WORKERS = int(os.getenv('SPELL_CHECK_WORKERS', str(min(4, os.cpu_count() or 1))))  # 常驻 Corrector 进程数（<=1 时在本进程检测）
+SPELL_SHARD_MIN_CHARS = int(os.getenv('SPELL_SHARD_MIN_CHARS', '200'))    # 分片最小字符数（太小时进程间传输开销占比高）
+SPELL_SHARD_MAX_CHARS = int(os.getenv('SPELL_SHARD_MAX_CHARS', '2000'))   # 分片最大字符数
+SPELL_CHECK_TIMEOUT = float(os.getenv('SPELL_CHECK_TIMEOUT', '300'))      # 单篇文档检测时限（秒）
+SPELL_STREAM_BATCH_CHARS = int(os.getenv('SPELL_STREAM_BATCH_CHARS', '3000'))  # 流式错字检测每批的字符数
+SPELL_BATCH_MAX_DOCUMENTS = int(os.getenv('SPELL_BATCH_MAX_DOCUMENTS', '60'))   # 单次批量检测最多文档数
+SPELL_BATCH_MAX_CONTENT_LENGTH = int(os.getenv('SPELL_BATCH_MAX_CONTENT_LENGTH', str(200 * 1024 * 1024)))  # 批量上传请求体上限
+SPELL_BATCH_TIMEOUT = float(os.getenv('SPELL_BATCH_TIMEOUT', '900'))          # 单次批量检测时限（秒）
+# 批量检测同时占用的常驻检测进程数上限（其余进程留给单篇检测的分片，整篇文档任务不会把分片挤到超时）
+SPELL_BATCH_MAX_JOBS = int(os.getenv('SPELL_BATCH_MAX_JOBS', str(max(1, SPELL_CHECK_WORKERS // 2))))
+SPELL_CACHE_MAX_ENTRIES = int(os.getenv('SPELL_CACHE_MAX_ENTRIES', '500000'))  # 句子级检测结果缓存条数上限
+SPELL_CACHE_VERSION = os.getenv('SPELL_CACHE_VERSION', '1')                # 更换 pycorrector 模型/版本后修改，使旧缓存失效
+# 预加载模式：在主进程 fork 出 web worker 之前加载 Corrector（配合 gunicorn preload_app，各 worker 写时复制共享模型内存，
+# 检测在各 worker 本进程内完成，不再另起 Corrector 进程池）
+SPELL_MODEL_PRELOAD = os.getenv('SPELL_MODEL_PRELOAD', 'False') == 'True'
+
+# 语义相似度模型配置
+EMBEDDING_MODEL_NAME = os.getenv('EMBEDDING_MODEL_NAME', 'all-MiniLM-L6-v2')
+EMBEDDING_BATCH_SIZE = int(os.getenv('EMBEDDING_BATCH_SIZE', '32'))
+PRELOAD_EMBEDDING_MODEL = os.getenv('PRELOAD_EMBEDDING_MODEL', 'False') == 'True'  # 启动时预加载模型
+# 长文档分块编码（MiniLM 输入上限约 256 个 word piece，超出部分会被截断）
+# 分块长度按 token 数估算：中文一字一个 token 计为 2，其他字符计为 1，400 约合 200 个汉字或 100 个英文 token
+EMBEDDING_CHUNK_CHARS = int(os.getenv('EMBEDDING_CHUNK_CHARS', '400'))      # 单个分块最大长度
+EMBEDDING_CHUNK_OVERLAP = int(os.getenv('EMBEDDING_CHUNK_OVERLAP', '80'))   # 长段落滑动窗口重叠长度
+EMBEDDING_MAX_CHUNKS = int(os.getenv('EMBEDDING_MAX_CHUNKS', '256'))        # 单篇文档最多编码的分块数
+EMBEDDING_TOP_K = int(os.getenv('EMBEDDING_TOP_K', '3'))                    # 文档相似度取前 k 个最佳匹配的均值
+
+# 本地缓存目录（语义向量等分析结果）
+CACHE_DIR = os.getenv('PAPER_CACHE_DIR', os.path.join(BASE_DIR, 'cache'))
+EMBEDDING_CACHE_DIR = os.path.join(CACHE_DIR, 'embeddings')
+EMBEDDING_CACHE_MEMORY_ITEMS = int(os.getenv('EMBEDDING_CACHE_MEMORY_ITEMS', '4096'))  # 内存 LRU 条数上限
+TFIDF_STATS_PATH = os.path.join(CACHE_DIR, 'tfidf', 'corpus_df.sqlite3')  # 本地论文库词表与文档频率
+EXTRACTION_CACHE_DIR = os.path.join(CACHE_DIR, 'extractions')
+EXTRACTION_CACHE_MAX_MB = int(os.getenv('EXTRACTION_CACHE_MAX_MB', '512'))  # 提取结果缓存磁盘上限（MB）
+SPELL_CACHE_PATH = os.path.join(CACHE_DIR, 'spelling', 'sentence_typos.sqlite3')  # 句子级错字检测结果缓存
+
+# 上传后后台解析论文文本
+# 已解析论文文本与解析状态：是论文内容的权威副本，与上传文件一起保存在 store 下，不放在可随时清空的缓存目录
+PAPER_TEXT_DIR = os.getenv('PAPER_TEXT_DIR', os.path.join(BASE_DIR, 'store', 'paper_text'))
+LEGACY_PAPER_TEXT_DIR = os.path.join(CACHE_DIR, 'paper_text')                    # 旧版本的存放位置，启动时迁移
+EXTRACTION_BACKGROUND_WORKERS = int(os.getenv('EXTRACTION_BACKGROUND_WORKERS', '2'))  # 后台解析线程数
+EXTRACTION_WAIT_SECONDS = float(os.getenv('EXTRACTION_WAIT_SECONDS', '30'))     # 按 paper_id 分析时等待解析完成的最长时间
+PAPER_CONTENT_DB_MAX_BYTES = 65535                                               # papers.content（MySQL TEXT）可写入的最大字节数
+
+# 相似段落候选筛选（MinHash + LSH）
+MINHASH_NUM_PERM = int(os.getenv('MINHASH_NUM_PERM', '64'))          # 签名长度
+MINHASH_SHINGLE_SIZE = int(os.getenv('MINHASH_SHINGLE_SIZE', '3'))   # 字符 shingle 长度
+LSH_THRESHOLD = float(os.getenv('LSH_THRESHOLD', '0.3'))             # 候选阈值：越低召回越高，越高精度越高
+PARAGRAPH_KEYWORD_CACHE_SIZE = int(os.getenv('PARAGRAPH_KEYWORD_CACHE_SIZE', '20000'))  # 段落关键词缓存条数上限
+ANALYZED_DOCUMENT_CACHE_SIZE = int(os.getenv('ANALYZED_DOCUMENT_CACHE_SIZE', '64'))      # 最近分析过的文档缓存篇数
+
+# 本地论文库查重（winnowing 指纹）
+WINNOWING_K = int(os.getenv('WINNOWING_K', '8'))            # k-gram 长度（字符）
+WINNOWING_WINDOW = int(os.getenv('WINNOWING_WINDOW', '4'))  # 窗口大小：长度 >= K + WINDOW - 1 的重复必被检出
+FINGERPRINT_INDEX_DIR = os.path.join(CACHE_DIR, 'fingerprints')
+FINGERPRINT_MERGE_FACTOR = int(os.getenv('FINGERPRINT_MERGE_FACTOR', '8'))  # 同一规模层级的段达到该数量时合并为一个段
 
 class Config:
     # Flask 通用配置
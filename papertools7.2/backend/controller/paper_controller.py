@@ -1,5 +1,5 @@
 # backend/routes/paper_route.py
-from flask import Blueprint, request, jsonify,current_app,send_file,make_response  
+from flask import Blueprint, request, jsonify,current_app,send_file,make_response,Response,stream_with_context
 from service.paper_service import PaperService
 from flasgger import swag_from,Swagger
 from backend.models.user import  User
@@ -9,11 +9,12 @@ from backend.models.paper import Paper # 导入相关模型
 import os
 from config.logging_config import logger
 import urllib.parse
-from config.config import BASE_DIR
+from config.config import BASE_DIR, SPELL_BATCH_MAX_CONTENT_LENGTH
 import urllib.parse  # 用于编码文件名
 from werkzeug.utils import secure_filename 
 from flask_cors import CORS, cross_origin
 import numpy as np
+import json
 
 paper_bp = Blueprint('paper', __name__, url_prefix='/api/paper')
 paper_service=PaperService()
@@ -262,7 +263,9 @@ def get_user_papers(user_id):
     'tags': ['论文管理'],
     'description': '论文错字检测',
     'parameters': [
-        {'name': 'paper_id', 'in': 'path', 'type': 'integer', 'required': True, 'description': '论文ID'}
+        {'name': 'paper_id', 'in': 'path', 'type': 'integer', 'required': True, 'description': '论文ID'},
+        {'name': 'response_mode', 'in': 'formData', 'type': 'string', 'enum': ['full', 'spans'], 'default': 'full',
+         'description': 'spans：不返回 checked_text，前端按 typo_details 的 position/length 渲染标记'}
     ],
     'responses': {
         200: {
@@ -292,19 +295,21 @@ def check_spelling():
     """论文错字检测API接口"""
     logger.info("get spelling request----------------------------")
     
-    # 1. 检查文件上传
-    if 'file' not in request.files:
+    user_id=request.form.get('user_id',type=int)
+    paper_id = request.form.get('paper_id', type=int)
+    response_mode = request.form.get('response_mode', 'full')  # spans：只返回错字位置，不返回标记后的全文
+
+    # 1. 检查文件上传（未上传文件但提供 paper_id 时，直接使用已上传论文的解析结果）
+    if 'file' not in request.files and not paper_id:
         logger.warning("request no file")
         return jsonify({
             'code': 400,
             'message': '未上传文件'
         }), 400
         
-    file = request.files['file']
-    user_id=request.form.get('user_id',type=int)
-    paper_id = request.form.get('paper_id', type=int)
+    file = request.files.get('file')
 
-    if file.filename == '':
+    if file is not None and file.filename == '' and not paper_id:
         logger.warning("上传文件名为空")
         return jsonify({
             'code': 400,
@@ -312,7 +317,7 @@ def check_spelling():
         }), 400
 
     # 检查文件类型
-    if not file.filename.endswith(('.txt', '.doc', '.docx')):
+    if file is not None and file.filename and not file.filename.endswith(('.txt', '.doc', '.docx')):
         return jsonify({
                 'code': 400,
                 'message': '不支持的文件格式，仅支持 .txt, .doc, .docx'
@@ -321,7 +326,7 @@ def check_spelling():
     # 2. 调用服务层处理
     try:
         logger.info("go wrong service")
-        success, result = paper_service.check_spelling(file,user_id,paper_id)
+        success, result = paper_service.check_spelling(file,user_id,paper_id,response_mode)
         
         if success:
             logger.info(f"spelling finish,find {len(result['typo_details'])} wrongs")
@@ -346,6 +351,109 @@ def check_spelling():
 
 
 
+@paper_bp.route('/spelling/batch', methods=['POST'])
+@swag_from({
+    'tags': ['论文管理'],
+    'description': '批量错字检测：一次提交多篇文档（文件和/或已上传论文ID），在常驻检测进程池中并行处理',
+    'consumes': ['multipart/form-data'],
+    'parameters': [
+        {'name': 'files', 'in': 'formData', 'type': 'file', 'required': False, 'description': '论文文件（可多个，.txt/.doc/.docx）'},
+        {'name': 'paper_ids', 'in': 'formData', 'type': 'string', 'required': False,
+         'description': '已上传论文ID（可重复传参，或用逗号分隔）'},
+        {'name': 'user_id', 'in': 'formData', 'type': 'integer', 'required': False, 'description': '用户ID'}
+    ],
+    'responses': {
+        200: {
+            'description': '批量检测完成',
+            'schema': {
+                'type': 'object',
+                'properties': {
+                    'code': {'type': 'integer', 'example': 200},
+                    'message': {'type': 'string', 'example': '批量错字检测完成'},
+                    'data': {
+                        'type': 'object',
+                        'properties': {
+                            'results': {'type': 'array', 'items': {'type': 'object'},
+                                        'description': '每篇文档：filename/paper_id、status、total_typos、typo_details 或 error'},
+                            'summary': {'type': 'object',
+                                        'description': 'documents、succeeded、failed、total_typos、typo_types、elapsed_seconds 等'}
+                        }
+                    }
+                }
+            }
+        },
+        400: {'description': '参数错误'}
+    }
+})
+def check_spelling_batch():
+    """批量错字检测API接口"""
+    # 批量上传的请求体上限单独放宽（单个文件仍受 MAX_CONTENT_LENGTH 限制）
+    request.max_content_length = SPELL_BATCH_MAX_CONTENT_LENGTH
+    user_id = request.form.get('user_id', type=int)
+    files = [f for f in request.files.getlist('files') if f.filename]
+    try:
+        paper_ids = [int(value) for raw in request.form.getlist('paper_ids') for value in raw.split(',') if value.strip()]
+    except ValueError:
+        return jsonify({'code': 400, 'message': 'paper_ids 格式错误', 'data': None}), 400
+
+    try:
+        success, result = paper_service.check_spelling_batch(files, paper_ids, user_id)
+        if not success:
+            return jsonify({'code': 400, 'message': result, 'data': None}), 400
+        return jsonify({'code': 200, 'message': '批量错字检测完成', 'data': result}), 200
+    except Exception as e:
+        logger.error(f"批量错字检测接口错误: {str(e)}", exc_info=True)
+        return jsonify({'code': 500, 'message': f'服务器错误: {str(e)}', 'data': None}), 500
+
+
+@paper_bp.route('/spelling/stream', methods=['POST'])
+@swag_from({
+    'tags': ['论文管理'],
+    'description': '流式错字检测：按句分批检测，以 NDJSON（每行一个 JSON 记录）逐批返回错字，最后一行为汇总',
+    'consumes': ['multipart/form-data'],
+    'produces': ['application/x-ndjson'],
+    'parameters': [
+        {'name': 'file', 'in': 'formData', 'type': 'file', 'required': False, 'description': '论文文件（.txt/.doc/.docx）'},
+        {'name': 'paper_id', 'in': 'formData', 'type': 'integer', 'required': False, 'description': '已上传论文ID（未上传文件时使用）'},
+        {'name': 'user_id', 'in': 'formData', 'type': 'integer', 'required': False, 'description': '用户ID'}
+    ],
+    'responses': {
+        200: {
+            'description': '记录依次为 {"type": "start", "filename", "total_chars"}、'
+                           '若干 {"type": "batch", "start", "end", "progress", "typos": [...]}（typos 位置为全文位置）、'
+                           '{"type": "summary", "total_typos", "total_chars", "batches", "elapsed_seconds"}；'
+                           '检测中途出错时以 {"type": "error", "message"} 结束'
+        },
+        400: {'description': '参数错误或文件无法解析'},
+        413: {'description': '文件过大'}
+    }
+})
+def check_spelling_stream():
+    """流式错字检测API接口"""
+    user_id = request.form.get('user_id', type=int)
+    paper_id = request.form.get('paper_id', type=int)
+    file = request.files.get('file')
+
+    if (file is None or file.filename == '') and not paper_id:
+        return jsonify({'code': 400, 'message': '未上传文件', 'data': None}), 400
+    if file is not None and file.filename and not file.filename.endswith(('.txt', '.doc', '.docx')):
+        return jsonify({'code': 400, 'message': '不支持的文件格式，仅支持 .txt, .doc, .docx', 'data': None}), 400
+
+    success, result = paper_service.start_spelling_stream(file, user_id, paper_id)
+    if not success:
+        code = result.get('code', 400) if isinstance(result, dict) else 400
+        message = result.get('error') if isinstance(result, dict) else result
+        return jsonify({'code': code, 'message': message, 'data': None}), code
+
+    def generate():
+        for record in result:
+            yield json.dumps(record, ensure_ascii=False) + '\n'
+
+    # 关闭代理缓冲，让每批结果立即送达浏览器
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson',
+                    headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'})
+
+
 @paper_bp.route('/plagiarism', methods=['POST'])
 @swag_from({
     'tags': ['论文管理'],
@@ -391,21 +499,21 @@ def check_spelling():
 def check_plagiarism():
     logger.info("begin check plagiarism with file upload------------------")
 
-    # 获取上传的文件
-    file = request.files.get('file')
-    if not file:
-        return jsonify({
-            'code': 400,
-            'message': '未上传论文文件',
-            'data': None
-        }), 400
-    
     # 获取查询参数
     num_articles = request.form.get('num_articles', 5, type=int)
     
     checkfunction=request.form.get('checkfunction',type=str)
     user_id=request.form.get('user_id',type=int)
     paper_id = request.form.get('paper_id', type=int)
+
+    # 获取上传的文件（未上传文件但提供 paper_id 时，直接使用已上传论文的解析结果）
+    file = request.files.get('file')
+    if not file and not paper_id:
+        return jsonify({
+            'code': 400,
+            'message': '未上传论文文件',
+            'data': None
+        }), 400
     logger.info(f'checkfunction:{checkfunction}')
     logger.info(f'paper________________data:{paper_id}')
     try:
@@ -451,22 +559,23 @@ def check_plagiarism():
 @paper_bp.route('/theme', methods=['POST'])
 def extract_theme():
     logger.info("begin 111111 extract theme")
-    
-    if 'file' not in request.files:
+    #获取查询参数
+    user_id=request.form.get('user_id',type=int)
+    paper_id = request.form.get('paper_id', type=int)
+
+    # 未上传文件但提供 paper_id 时，直接使用已上传论文的解析结果
+    if 'file' not in request.files and not paper_id:
         return jsonify({
             'code': 400,
             'message': '未上传文件'
         }), 400
     
-    file = request.files['file']
-    if file.filename == '':
+    file = request.files.get('file')
+    if file is not None and file.filename == '' and not paper_id:
         return jsonify({
             'code': 400,
             'message': '文件名为空'
         }), 400
-    #获取查询参数
-    user_id=request.form.get('user_id',type=int)
-    paper_id = request.form.get('paper_id', type=int)
     try:
         # 调用服务层方法
         result = paper_service.extract_theme(file,user_id,paper_id)
@@ -503,6 +612,28 @@ def get_total_paper_count():
         }), 500
 #lmk-----------------------------------------------------------------------------------
 
+@paper_bp.route('/metrics', methods=['GET'])
+def get_performance_metrics():
+    """获取分析组件的性能统计（模型加载、编码耗时等）"""
+    try:
+        return jsonify({
+            'code': 200,
+            'message': '获取性能统计成功',
+            'data': paper_service.get_performance_metrics()
+        }), 200
+    except Exception as e:
+        logger.error(f"获取性能统计失败: {str(e)}")
+        return jsonify({
+            'code': 500,
+            'message': f'获取性能统计失败: {str(e)}'
+        }), 500
+
+@paper_bp.route('/<int:paper_id>/extraction', methods=['GET'])
+def get_extraction_status(paper_id):
+    """查询论文上传后后台解析的状态（pending / running / done / failed）"""
+    result = paper_service.get_extraction_status(paper_id)
+    return jsonify(result), result['code']
+
 #zyb---------------------------------------------------------
 
 @paper_bp.route('/downloadPaper', methods=['GET'])
@@ -591,20 +722,25 @@ def download_file():
 #lzj----------------------------------------------------------------------------------
 @paper_bp.route('/check_local_plagiarism', methods=['POST'])
 def check_local_plagiarism():
-    # 检查是否有文件上传
-    if 'file1' not in request.files or 'file2' not in request.files:
+    # 检查是否有文件上传（每一侧都可以用已上传论文的 paper_id1 / paper_id2 代替文件）
+    paper_id1 = request.form.get('paper_id1', type=int)
+    paper_id2 = request.form.get('paper_id2', type=int)
+    if ('file1' not in request.files and not paper_id1) or ('file2' not in request.files and not paper_id2):
         return jsonify({"error": "请上传两个文件"}), 400
     logger.info('begin controller check')
-    file1 = request.files['file1']
-    file2 = request.files['file2']
+    file1 = request.files.get('file1')
+    file2 = request.files.get('file2')
     user_id=request.form.get('user_id',type=int)
     # 检查文件是否有名称（即是否真的上传了文件）
-    if file1.filename == '' or file2.filename == '':
+    if (file1 is not None and file1.filename == '' and not paper_id1) or \
+            (file2 is not None and file2.filename == '' and not paper_id2):
         return jsonify({"error": "上传的文件不能为空"}), 400
     
     try:
         # 假设check_local_plagiarism返回字典类型
-        result = paper_service.check_local_plagiarism(file1,file2,user_id)
+        result = paper_service.check_local_plagiarism(file1,file2,user_id, paper_id1, paper_id2)
+        if result.get('code') != 200 and not result.get('data'):
+            return jsonify({"code": result.get('code', 400), "error": result.get('message')}), result.get('code', 400)
         # 获取并记录比较结果列表
         result_data = result.get("data", {})
         comparison_results = result.get("data", {}).get("comparison_results", [])
@@ -18,11 +18,21 @@ import re
 from collections import Counter
 import asyncio
 from werkzeug.utils import secure_filename
+from config.config import BASE_DIR, PAPER_CONTENT_DB_MAX_BYTES
+from utils.winnowing import FingerprintIndex, winnow
+from utils.fingerprint_store import PersistentFingerprintIndex
+from utils.paper_text_store import PaperTextStore
+from utils.document_extractor import extract_document
 
 # 初始化日志记录器
 logging.basicConfig(level=logging.ERROR)
 logger = logging.getLogger(__name__)
 
+# 本地论文库指纹索引（持久化到磁盘，上传时增量写入，删除时追加墓碑）
+corpus_index = PersistentFingerprintIndex()
+# 上传后后台解析出的论文文本及解析状态
+paper_text_store = PaperTextStore()
+
 class PaperDao:
 
     def init_upload_folder(self, app):
@@ -145,6 +155,8 @@ class PaperDao:
             
             db.session.delete(paper)
             db.session.commit()
+            corpus_index.remove(paper_id)
+            paper_text_store.delete(paper_id)
             return True, "删除成功"
         except Exception as e:
             db.session.rollback()
@@ -182,48 +194,122 @@ class PaperDao:
     
 
 #论文查重关键函数
+    def _read_paper_text(self, paper):
+        """读取论文文本（优先使用数据库中已提取的内容，其次是上传时后台解析的文本，最后才解析原始文件）"""
+        if paper.content:
+            return paper.content
+        text = paper_text_store.get_text(paper.id)
+        if text is not None:
+            return text
+        if not paper.file_path:
+            return None
+        file_path = paper.file_path if os.path.isabs(paper.file_path) else os.path.join(BASE_DIR, paper.file_path)
+        if not os.path.exists(file_path):
+            return None
+        file_ext = os.path.splitext(file_path)[1].lstrip('.').lower()
+        if file_ext in ('pdf', 'docx', 'doc'):
+            result = extract_document(file_path, file_ext)
+            return result.text if result else None
+        with open(file_path, 'r', encoding='utf-8', errors='ignore') as f:
+            return f.read()
+
+    def read_paper_text(self, paper):
+        """读取论文文本"""
+        return self._read_paper_text(paper)
+
+    def save_extracted_text(self, paper_id, content):
+        """后台解析完成后回填 papers.content（超出字段长度时只保留在文本存储中）"""
+        if len(content.encode('utf-8')) > PAPER_CONTENT_DB_MAX_BYTES:
+            return False
+        try:
+            paper = Paper.query.get(paper_id)
+            if not paper:
+                return False
+            paper.content = content
+            db.session.commit()
+            return True
+        except Exception as e:
+            db.session.rollback()
+            logger.error(f"回填论文 {paper_id} 内容失败: {str(e)}")
+            return False
+
+    def index_paper(self, paper_id, content):
+        """上传时把论文指纹增量写入索引"""
+        corpus_index.add(paper_id, winnow(content) if content else [])
+
+    def get_index_stats(self):
+        """指纹索引规模统计"""
+        return corpus_index.get_stats()
+
+    def get_all_paper_ids(self):
+        """获取全部论文 ID（不加载论文内容）"""
+        return [pid for (pid,) in db.session.query(Paper.id).all()]
+
+    def iter_paper_texts(self, paper_ids, batch_size=200):
+        """分批加载论文并逐篇返回 (论文 ID, 文本)，读取失败的论文会被跳过"""
+        paper_ids = list(paper_ids)
+        for i in range(0, len(paper_ids), batch_size):
+            for p in Paper.query.filter(Paper.id.in_(paper_ids[i:i + batch_size])).all():
+                try:
+                    text = self._read_paper_text(p)
+                except Exception as e:
+                    logger.warning(f"读取论文 {p.id} 失败，跳过: {str(e)}")
+                    continue
+                yield p.id, text
+
+    def _ensure_corpus_indexed(self, batch_size=200):
+        """为索引建立前上传的历史论文补建指纹（只查询 ID，缺失的分批加载）"""
+        corpus_index.refresh()
+        missing = [pid for pid in self.get_all_paper_ids() if pid not in corpus_index]
+        for pid, text in self.iter_paper_texts(missing, batch_size):
+            corpus_index.add(pid, winnow(text) if text else [])
+        if missing:
+            logger.info(f"指纹索引新增 {len(missing)} 篇论文，当前共 {len(corpus_index)} 篇")
+
     def check_plagiarism(self, paper_id, compare_with=None):
-        """论文查重"""
+        """论文查重（winnowing 指纹比对，返回相似论文及对齐的重复片段）"""
         paper = self.get_paper_by_id(paper_id)
         if not paper:
             return False, "论文不存在"
         
         try:
-            if not os.path.exists(paper.file_path):
+            content = self._read_paper_text(paper)
+            if content is None:
                 return False, "论文文件不存在"
-            
-            with open(paper.file_path, 'r', encoding='utf-8') as f:
-                content = f.read()
-            
-            # 模拟查重逻辑（实际应集成专业查重引擎）
-            # 这里假设与系统中其他论文进行比较
+            fingerprints = winnow(content)
+
             similar_papers = []
             if compare_with:
                 # 与指定论文比较
                 compare_paper = self.get_paper_by_id(compare_with)
-                if compare_paper and os.path.exists(compare_paper.file_path):
-                    with open(compare_paper.file_path, 'r', encoding='utf-8') as f:
-                        compare_content = f.read()
-                    similarity = SequenceMatcher(None, content, compare_content).ratio()
+                compare_content = self._read_paper_text(compare_paper) if compare_paper else None
+                if compare_content is not None:
+                    single_index = FingerprintIndex()
+                    single_index.add(compare_paper.id, winnow(compare_content))
+                    matches = single_index.query(fingerprints)
+                    match = matches[0] if matches else {'similarity': 0.0, 'spans': []}
                     similar_papers.append({
                         "paper_id": compare_paper.id,
                         "title": compare_paper.title,
-                        "similarity": similarity
+                        "similarity": match['similarity'],
+                        "matched_spans": match['spans']
                     })
             else:
-                # 与所有其他论文比较（简化示例）
-                all_papers = Paper.query.filter(Paper.id != paper_id).all()
-                for p in all_papers:
-                    if os.path.exists(p.file_path):
-                        with open(p.file_path, 'r', encoding='utf-8') as f:
-                            compare_content = f.read()
-                        similarity = SequenceMatcher(None, content, compare_content).ratio()
-                        if similarity > 0.2:  # 设定相似度阈值
-                            similar_papers.append({
-                                "paper_id": p.id,
-                                "title": p.title,
-                                "similarity": similarity
-                            })
+                # 与论文库中其他论文比较：通过指纹倒排索引只定位共享指纹的论文
+                self._ensure_corpus_indexed()
+                matches = corpus_index.query(fingerprints, exclude=paper.id, min_similarity=0.2)  # 设定相似度阈值
+                titles = dict(
+                    db.session.query(Paper.id, Paper.title).filter(Paper.id.in_([m['doc_id'] for m in matches])).all()
+                ) if matches else {}
+                for match in matches:
+                    if match['doc_id'] not in titles:
+                        continue  # 索引中残留的已删除论文
+                    similar_papers.append({
+                        "paper_id": match['doc_id'],
+                        "title": titles[match['doc_id']],
+                        "similarity": match['similarity'],
+                        "matched_spans": match['spans']
+                    })
             
             # 计算总体重复率（简化示例）
             total_similarity = sum(p["similarity"] for p in similar_papers) / max(1, len(similar_papers))
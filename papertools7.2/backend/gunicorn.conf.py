@@ -0,0 +1,29 @@
+# backend/gunicorn.conf.py
+"""
+生产部署配置：gunicorn -c gunicorn.conf.py "app:create_app()"
+
+预加载模式（SPELL_MODEL_PRELOAD=True）下由主进程执行 create_app() 加载 Corrector 等模型，
+再 fork 出各 worker，模型内存以写时复制的方式共享，不再每个 worker 各加载一份。
+fork 前调用 gc.freeze()，把已有对象移出 GC 追踪，避免 worker 里的垃圾回收触碰这些对象的引用计数/GC 头而把共享页复制成私有页。
+"""
+import gc
+import os
+
+bind = os.getenv('GUNICORN_BIND', '0.0.0.0:5000')
+workers = int(os.getenv('GUNICORN_WORKERS', '4'))
+threads = int(os.getenv('GUNICORN_THREADS', '4'))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', '330'))  # 略大于 SPELL_CHECK_TIMEOUT
+preload_app = os.getenv('SPELL_MODEL_PRELOAD', 'False') == 'True'
+
+
+def when_ready(server):
+    """应用已在主进程加载完成、即将 fork worker"""
+    if preload_app:
+        gc.freeze()
+        from utils.spell_shards import preloaded_model_stats
+        server.log.info(f"模型已在主进程预加载，fork 前冻结 {gc.get_freeze_count()} 个对象: {preloaded_model_stats()}")
+
+
+def post_fork(server, worker):
+    from utils.process_memory import process_memory
+    server.log.info(f"worker {worker.pid} 启动，内存 {process_memory()}")
@@ -7,7 +7,6 @@ from sqlalchemy.ext.declarative import declarative_base
 from werkzeug.utils import secure_filename
 from io import BytesIO
 from config.logging_config import logger
-import docx
 
 
 class Paper(db.Model):
@@ -79,30 +78,18 @@ class Paper(db.Model):
 
     @staticmethod
     def extract_content(content_bytes, filename):
-        """提取文件内容（支持 .docx）"""
+        """提取文件内容（支持 .docx / .pdf / .txt，与服务层共用提取引擎和提取缓存）"""
+        from utils.document_extractor import extract_document
         if filename.endswith('.docx'):
             try:
                 logger.info("begin to fix docx")
-                # 将二进制数据转换为文档对象
-                docx_file = BytesIO(content_bytes)
-                doc = docx.Document(docx_file)
-                
-                # 提取所有段落文本
-                content = "\n".join([para.text for para in doc.paragraphs])
-                
-                return content
+                return extract_document(content_bytes, 'docx').text
             except Exception as e:
                 print(f"提取 docx 内容失败111111111111111: {e}")
                 return None
         elif filename.endswith('.pdf'):
             # 处理 PDF 提取（需要 PyPDF2 库）
-            from PyPDF2 import PdfReader
-            pdf_file = BytesIO(content_bytes)
-            reader = PdfReader(pdf_file)
-            content = ""
-            for page in reader.pages:
-                content += page.extract_text() or ""
-            return content
+            return extract_document(content_bytes, 'pdf', pdf_engine='pypdf2').text
         elif filename.endswith('.txt'):
             # 已在服务层处理
             return content_bytes.decode('utf-8', errors='ignore')
@@ -0,0 +1,143 @@
+# backend/service/analyzed_document.py
+"""
+一次分析、多处复用的文档对象
+
+同一篇论文在一次查重/主题提取中会依次经过关键词提取、相似度计算、相似段落提取、摘要生成等阶段，
+以前每个阶段都各自清洗文本、调用 jieba 分词、切分段落。AnalyzedDocument 在首次访问时计算这些结果并保存，
+之后各阶段直接读取，分词等开销对每篇文档只付出一次。
+"""
+from collections import Counter
+from functools import wraps
+from typing import Callable, List, Tuple
+
+import jieba
+import numpy as np
+
+from utils.text_normalization import (
+    Span, CHINESE_RE, WORD_RE, PARAGRAPH_RE, SENTENCE_SPLIT_RE, TOKEN_STOP_WORDS, KEYWORD_STOP_WORDS,
+    NormalizedText, clean_for_tokenize, normalize, preprocess_paragraph, split_sentences
+)
+
+
+def _memoized_property(method):
+    """
+    只计算一次的只读属性，结果保存在实例的 _memo 中
+    （不使用 functools.cached_property：Python 3.12 之前它在所有实例间共用一把锁，并发请求会互相阻塞）
+    """
+    @wraps(method)
+    def getter(self):
+        return self.memoize(method.__name__, lambda: method(self))
+    return property(getter)
+
+
+class AnalyzedDocument:
+    """
+    文档分析结果（各字段在首次访问时计算并缓存）
+    - text: 原文
+    - paragraphs / sentences: 段落、句子及其在原文中的偏移
+    - processed_paragraphs: 规范化段落；normalized_paragraph(i): 第 i 段的规范化结果及到段落原文的偏移映射
+    - tokens / term_counts: jieba 分词（已过滤停用词）及词频
+    - index_terms: TF-IDF 使用的词频
+    - word_counts: 正则切分的词频
+    - keywords(top_n): 主题关键词
+    - chunk_embeddings: 分块语义向量（首次使用时才调用模型）
+    """
+
+    def __init__(self, text: str):
+        self.text = text or ''
+        self._memo = {}
+
+    def __len__(self):
+        return len(self.text)
+
+    def __bool__(self):
+        return bool(self.text)
+
+    @_memoized_property
+    def normalized(self) -> str:
+        """小写文本"""
+        return self.text.lower()
+
+    @_memoized_property
+    def raw_tokens(self) -> Tuple[str, ...]:
+        """jieba 分词原始结果（全文只分词一次）"""
+        return tuple(jieba.cut(clean_for_tokenize(self.text)))
+
+    @_memoized_property
+    def tokens(self) -> Tuple[str, ...]:
+        """过滤停用词和单字后的分词结果"""
+        return tuple(word for word in self.raw_tokens if word and word not in TOKEN_STOP_WORDS and len(word) > 1)
+
+    @_memoized_property
+    def term_counts(self) -> Counter:
+        """分词词频"""
+        return Counter(self.tokens)
+
+    @_memoized_property
+    def index_terms(self) -> Counter:
+        """TF-IDF 使用的词频（分词结果小写化，去掉空白）"""
+        return Counter(word.lower() for word in self.tokens if not word.isspace())
+
+    @_memoized_property
+    def _keyword_counts(self) -> Counter:
+        return Counter(word for word in self.raw_tokens if word and word not in KEYWORD_STOP_WORDS and len(word) > 1)
+
+    def keywords(self, top_n: int = 5) -> List[str]:
+        """按词频选取的中文主题关键词"""
+        return [word for word, _ in self._keyword_counts.most_common(top_n) if CHINESE_RE.search(word)]
+
+    @_memoized_property
+    def word_counts(self) -> Counter:
+        """正则切分的词频（不依赖 jieba，英文按单词、中文按连续字符串）"""
+        return Counter(WORD_RE.findall(self.normalized))
+
+    @_memoized_property
+    def paragraphs(self) -> List[Span]:
+        """按换行切分的非空段落"""
+        return [Span(m.group(), m.start(), m.end()) for m in PARAGRAPH_RE.finditer(self.text) if m.group().strip()]
+
+    @_memoized_property
+    def processed_paragraphs(self) -> List[str]:
+        """与 paragraphs 一一对应的预处理段落（所有段落都要参与比对，使用不记录偏移的快速写法）"""
+        return [preprocess_paragraph(p.text) for p in self.paragraphs]
+
+    def normalized_paragraph(self, index: int) -> NormalizedText:
+        """
+        第 index 段的规范化结果，附带每个字符在段落原文中的位置（文本与 processed_paragraphs[index] 相同）
+        记录偏移约慢一倍，只在需要把匹配片段映射回原文的段落上按需计算
+        """
+        return self.memoize(('normalized_paragraph', index), lambda: normalize(self.paragraphs[index].text))
+
+    @_memoized_property
+    def sentences(self) -> List[Span]:
+        """按中英文句末标点切分的句子（句末标点归入前一句）"""
+        return split_sentences(self.text, SENTENCE_SPLIT_RE)
+
+    def memoize(self, key, compute: Callable):
+        """保存依赖外部组件的派生结果（如段落 TextRank 关键词），同一文档只计算一次"""
+        if key not in self._memo:
+            self._memo[key] = compute()
+        return self._memo[key]
+
+    @property
+    def chunk_embeddings(self) -> np.ndarray:
+        """分块语义向量（未计算时单独编码，批量场景请使用 embed_documents）"""
+        if 'chunk_embeddings' not in self._memo:
+            embed_documents([self])
+        return self._memo['chunk_embeddings']
+
+
+def embed_documents(documents: List[AnalyzedDocument], embedding_service=None) -> List[np.ndarray]:
+    """
+    为多篇文档计算分块语义向量：尚未编码的文档合并为一个批次，已编码的直接复用
+    :return: 与 documents 一一对应的 (n_i, dim) 分块向量
+    """
+    if embedding_service is None:
+        from service.embedding_service import get_embedding_service
+        embedding_service = get_embedding_service()
+    pending = [doc for doc in documents if 'chunk_embeddings' not in doc._memo]
+    if pending:
+        pending = list({id(doc): doc for doc in pending}.values())
+        for doc, embeddings in zip(pending, embedding_service.encode_documents([doc.text for doc in pending])):
+            doc._memo['chunk_embeddings'] = embeddings
+    return [doc._memo['chunk_embeddings'] for doc in documents]
@@ -0,0 +1,129 @@
+# backend/service/background_extraction.py
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError as FutureTimeoutError
+from contextlib import nullcontext
+from typing import Callable, Dict, Optional
+
+from flask import current_app, has_app_context
+
+from config.config import EXTRACTION_BACKGROUND_WORKERS, PDF_EXTRACT_TIMEOUT
+from config.logging_config import logger
+from utils.document_extractor import extract_document
+from utils.paper_text_store import (
+    PaperTextStore, STATUS_PENDING, STATUS_RUNNING, STATUS_DONE, STATUS_FAILED
+)
+
+
+class BackgroundExtractor:
+    """上传后在后台线程解析论文文本，解析结果和状态写入 PaperTextStore"""
+
+    def __init__(self, store: PaperTextStore, max_workers: int = EXTRACTION_BACKGROUND_WORKERS):
+        self.store = store
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix='paper-extract')
+        self._futures = {}  # paper_id -> Future（仅本进程提交的任务）
+        self._lock = threading.Lock()
+
+        # 统计
+        self.completed = 0
+        self.failed = 0
+        self.total_time = 0.0
+
+    def submit(self, paper_id, file_path: str, on_success: Callable[[int, str], None] = None,
+               content_hash: str = None):
+        """
+        提交解析任务
+        :param content_hash: 上传时已算出的文件 SHA-256（用于查询提取缓存）
+        :param on_success: 解析成功后在同一后台线程中调用 on_success(paper_id, text)（如写入数据库、建立索引）
+        """
+        self.store.set_status(paper_id, STATUS_PENDING)
+        app = current_app._get_current_object() if has_app_context() else None
+        future = self._executor.submit(self._run, app, paper_id, file_path, on_success, content_hash)
+        with self._lock:
+            self._futures[paper_id] = future
+        future.add_done_callback(lambda _: self._forget(paper_id, future))
+        return future
+
+    def _forget(self, paper_id, future):
+        with self._lock:
+            if self._futures.get(paper_id) is future:
+                del self._futures[paper_id]
+
+    def _run(self, app, paper_id, file_path: str, on_success, content_hash: str = None):
+        with app.app_context() if app is not None else nullcontext():
+            start = time.perf_counter()
+            self.store.set_status(paper_id, STATUS_RUNNING)
+            try:
+                file_ext = os.path.splitext(file_path)[1].lstrip('.').lower()
+                result = extract_document(file_path, file_ext, content_hash=content_hash)
+                if result is None:
+                    raise ValueError(f"不支持的文件格式: {file_ext}")
+                self.store.put_text(paper_id, result.text)
+            except Exception as e:
+                elapsed = time.perf_counter() - start
+                logger.error(f"论文 {paper_id} 后台解析失败: {str(e)}", exc_info=True)
+                self.store.set_status(paper_id, STATUS_FAILED, error=str(e), seconds=round(elapsed, 3))
+                with self._lock:
+                    self.failed += 1
+                return None
+
+            if on_success is not None:
+                try:
+                    on_success(paper_id, result.text)
+                except Exception as e:
+                    logger.error(f"论文 {paper_id} 解析后处理失败: {str(e)}", exc_info=True)
+
+            elapsed = time.perf_counter() - start
+            self.store.set_status(paper_id, STATUS_DONE, chars=len(result.text),
+                                  complete=result.complete, seconds=round(elapsed, 3))
+            with self._lock:
+                self.completed += 1
+                self.total_time += elapsed
+            logger.info(f"论文 {paper_id} 后台解析完成：{len(result.text)} 字符，耗时 {elapsed:.2f} 秒")
+            return result.text
+
+    def get_status(self, paper_id) -> Optional[Dict]:
+        """
+        解析状态；其他进程中的任务长时间停留在 pending/running（如进程已退出）时视为失败
+        """
+        status = self.store.get_status(paper_id)
+        if status and status['status'] in (STATUS_PENDING, STATUS_RUNNING):
+            with self._lock:
+                local = paper_id in self._futures
+            if not local and time.time() - status['updated_at'] > PDF_EXTRACT_TIMEOUT * 2:
+                status = dict(status, status=STATUS_FAILED, error='解析任务已中断')
+        return status
+
+    def wait(self, paper_id, timeout: float) -> Optional[Dict]:
+        """等待解析完成（最多 timeout 秒），返回最新状态"""
+        with self._lock:
+            future = self._futures.get(paper_id)
+        if future is not None:
+            try:
+                future.result(timeout=timeout)
+            except FutureTimeoutError:
+                pass
+            return self.get_status(paper_id)
+
+        # 任务在其他 worker 进程中执行：轮询状态文件
+        deadline = time.monotonic() + timeout
+        status = self.get_status(paper_id)
+        while status and status['status'] in (STATUS_PENDING, STATUS_RUNNING) and time.monotonic() < deadline:
+            time.sleep(0.2)
+            status = self.get_status(paper_id)
+        return status
+
+    def wait_all(self, paper_ids, timeout: float) -> Dict:
+        """等待多篇论文解析完成（共用一个截止时间，总等待不超过 timeout 秒），返回 {paper_id: 最新状态}"""
+        deadline = time.monotonic() + timeout
+        return {paper_id: self.wait(paper_id, max(0.0, deadline - time.monotonic())) for paper_id in paper_ids}
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'in_flight': len(self._futures),
+                'completed': self.completed,
+                'failed': self.failed,
+                'avg_seconds': round(self.total_time / self.completed, 4) if self.completed else 0
+            }
@@ -0,0 +1,182 @@
+# backend/service/batch_spell_check.py
+"""
+批量错字检测
+
+教师一次上传整个班的论文时，逐篇在请求线程里检测只能用到一个核。这里把每篇文档作为一个任务
+交给错字检测的常驻进程池（utils.spell_shards.ShardedCorrector，与单篇分片检测共用同一组进程和 Corrector，
+每个 web 进程只有这一组模型副本；预加载模式下该进程池以 fork 启动，共享预加载的模型）。
+整篇文档的任务耗时远大于单篇检测的分片，同时提交的批量任务数限制在 SPELL_BATCH_MAX_JOBS 个，
+其余工作进程始终留给单篇检测；批量任务超时只放弃本批的结果，不重置共享的进程池。
+工作进程第一次处理整篇文档时基于已加载的 Corrector 构造 Typo_Detection 并一直复用。
+txt/docx 的提取在工作进程内完成；.doc 在 web 进程中交给 .doc 转换进程池，工作进程只收到文本。
+工作进程以 spawn 方式启动时，依赖 app.py 加入 sys.path 的项目根目录导入 service 包。
+"""
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed, wait, TimeoutError as FutureTimeoutError
+from concurrent.futures.process import BrokenProcessPool
+from typing import Dict, List
+
+from config.config import DOC_CONVERT_WORKERS, SPELL_BATCH_MAX_JOBS, SPELL_BATCH_TIMEOUT
+from config.logging_config import logger
+from utils.document_extractor import extract_document
+from utils.spell_shards import ShardedCorrector, get_sharded_corrector
+
+_worker_detector = None  # 工作进程内常驻的 Typo_Detection
+
+
+def _get_worker_detector():
+    """工作进程内的 Typo_Detection（本进程内检测，复用工作进程已加载的 Corrector）"""
+    global _worker_detector
+    if _worker_detector is None:
+        from service.typo_detection_service import Typo_Detection
+        _worker_detector = Typo_Detection(use_process_pool=False)
+    return _worker_detector
+
+
+def _check_document(job: Dict) -> Dict:
+    """
+    在工作进程中检测一篇文档
+    :param job: {'text': 已有文本} 或 {'source': 路径或 bytes, 'file_ext', 'content_hash'}（不含 .doc）
+    """
+    start = time.perf_counter()
+    try:
+        content = job.get('text')
+        if content is None:
+            result = extract_document(job['source'], job['file_ext'], content_hash=job.get('content_hash'))
+            content = result.text if result is not None else None
+        extracted = time.perf_counter()
+        if not content:
+            return {'status': 'failed', 'error': '文件内容为空或无法解析'}
+        typos = _get_worker_detector()._detect_typos(content)
+        return {
+            'status': 'ok',
+            'total_chars': len(content),
+            'typos': typos,
+            'extract_seconds': round(job.get('extract_seconds', 0) + extracted - start, 3),
+            'detect_seconds': round(time.perf_counter() - extracted, 3)
+        }
+    except Exception as e:
+        return {'status': 'failed', 'error': f'错字检测失败: {str(e)}'}
+
+
+def _extract_doc_job(job: Dict) -> Dict:
+    """.doc 在 web 进程中经共享的转换进程池提取，返回只含文本的任务"""
+    start = time.perf_counter()
+    result = extract_document(job['source'], 'doc', content_hash=job.get('content_hash'))
+    return {'text': result.text if result is not None else '', 'extract_seconds': time.perf_counter() - start}
+
+
+class BatchSpellChecker:
+    """把整篇文档的检测任务分发到错字检测常驻进程池（最多占用 max_jobs 个进程），并汇总统计"""
+
+    def __init__(self, engine: ShardedCorrector = None, max_jobs: int = SPELL_BATCH_MAX_JOBS):
+        self.engine = engine or get_sharded_corrector()
+        self.max_jobs = max(1, min(max_jobs, self.engine.workers))
+        self._slots = threading.BoundedSemaphore(self.max_jobs)  # 本进程所有批次共享的进程份额
+        # 等待 .doc 转换的线程（转换本身在 .doc 转换进程池中执行，自带排队上限和超时）
+        self._doc_threads = ThreadPoolExecutor(max_workers=max(1, DOC_CONVERT_WORKERS),
+                                               thread_name_prefix='batch-doc')
+        self._lock = threading.Lock()
+
+        # 统计
+        self.batches = 0
+        self.documents = 0
+        self.failures = 0
+        self.busy_time = 0.0   # 各文档处理耗时之和
+        self.wall_time = 0.0   # 各批次墙钟耗时之和
+
+    def _submit(self, job: Dict, deadline: float):
+        """取得一个进程份额后提交任务，任务结束（含取消）时归还；截止时间前取不到份额时返回 None"""
+        if not self._slots.acquire(timeout=max(0.0, deadline - time.perf_counter())):
+            return None
+        try:
+            future = self.engine.submit(_check_document, job)
+        except Exception:
+            self._slots.release()
+            raise
+        future.add_done_callback(lambda _: self._slots.release())
+        return future
+
+    def check(self, jobs: List[Dict], timeout: float = SPELL_BATCH_TIMEOUT) -> List[Dict]:
+        """
+        并行检测一批文档，按提交顺序返回每篇的结果（单篇失败或超时不影响其他文档）
+        :return: [{'status': 'ok'|'failed'|'timeout', ...}]
+        """
+        start = time.perf_counter()
+        deadline = start + timeout
+        results = [None] * len(jobs)
+        timed_out = {'status': 'timeout', 'error': f'批量检测超时（{timeout:.0f} 秒）'}
+
+        # .doc 先并发转换为文本；其余格式按顺序提交，.doc 转换完成一篇提交一篇
+        doc_futures = {self._doc_threads.submit(_extract_doc_job, job): i
+                       for i, job in enumerate(jobs) if job.get('file_ext') == 'doc'}
+        ready = [(i, job) for i, job in enumerate(jobs) if job.get('file_ext') != 'doc']
+        futures = {}
+        try:
+            for i, job in ready:
+                futures[i] = self._submit(job, deadline)
+            for doc_future in as_completed(doc_futures, timeout=max(0.0, deadline - time.perf_counter())):
+                i = doc_futures[doc_future]
+                try:
+                    job = doc_future.result()
+                except Exception as e:
+                    results[i] = {'status': 'failed', 'error': f'文件解析失败: {str(e)}'}
+                    continue
+                futures[i] = self._submit(job, deadline)
+        except FutureTimeoutError:
+            pass  # 未转换完的 .doc 记为超时
+
+        submitted = [future for future in futures.values() if future is not None]
+        done, not_done = wait(submitted, timeout=max(0.0, deadline - time.perf_counter()))
+        for future in not_done:
+            future.cancel()  # 排队中的任务直接取消；已在执行的任务完成后自动归还份额
+        for i in range(len(jobs)):
+            if results[i] is not None:
+                continue
+            future = futures.get(i)
+            if future is None or future in not_done:
+                results[i] = dict(timed_out)
+                continue
+            try:
+                results[i] = future.result()
+            except BrokenProcessPool:
+                results[i] = {'status': 'failed', 'error': '检测进程异常退出'}  # 进程池已由检测引擎丢弃重建
+
+        wall = time.perf_counter() - start
+        failures = sum(1 for r in results if r['status'] != 'ok')
+        with self._lock:
+            self.batches += 1
+            self.documents += len(jobs)
+            self.failures += failures
+            self.busy_time += sum(r.get('extract_seconds', 0) + r.get('detect_seconds', 0) for r in results)
+            self.wall_time += wall
+        logger.info(f"批量错字检测完成：{len(jobs)} 篇，失败 {failures} 篇，耗时 {wall:.2f} 秒")
+        return results
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.engine.workers,
+                'max_jobs': self.max_jobs,
+                'batches': self.batches,
+                'documents': self.documents,
+                'failures': self.failures,
+                'documents_per_second': round(self.documents / self.wall_time, 3) if self.wall_time else 0,
+                # 文档累计耗时 / 墙钟耗时：接近工作进程数说明并行充分
+                'parallelism': round(self.busy_time / self.wall_time, 2) if self.wall_time else 0
+            }
+
+
+_checker = None
+_checker_lock = threading.Lock()
+
+
+def get_batch_spell_checker() -> BatchSpellChecker:
+    """进程内共享的批量检测器"""
+    global _checker
+    if _checker is None:
+        with _checker_lock:
+            if _checker is None:
+                _checker = BatchSpellChecker()
+    return _checker
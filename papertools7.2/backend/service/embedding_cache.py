@@ -0,0 +1,223 @@
+# backend/service/embedding_cache.py
+import hashlib
+import json
+import os
+import re
+import threading
+import unicodedata
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import numpy as np
+
+from config.config import EMBEDDING_CACHE_DIR, EMBEDDING_CACHE_MEMORY_ITEMS
+from config.logging_config import logger
+
+try:
+    import fcntl  # 多 worker 进程同时追加时加文件锁（Windows 下不可用）
+except ImportError:
+    fcntl = None
+
+_WHITESPACE_RE = re.compile(r'\s+')
+
+
+def normalize_for_key(text: str) -> str:
+    """缓存键的文本归一化：NFKC + 合并空白"""
+    text = unicodedata.normalize('NFKC', text or '')
+    return _WHITESPACE_RE.sub(' ', text).strip()
+
+
+def make_cache_key(text: str, model_name: str) -> str:
+    """内容寻址键：模型名 + 归一化文本的 SHA-256"""
+    digest = hashlib.sha256()
+    digest.update(model_name.encode('utf-8'))
+    digest.update(b'\0')
+    digest.update(normalize_for_key(text).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class EmbeddingCache:
+    """
+    语义向量缓存（两级）
+    - 内存层：有界 LRU
+    - 磁盘层：追加写入的 float32 向量文件（内存映射读取）+ 行号索引文件
+    """
+
+    def __init__(self, model_name: str, cache_dir: str = EMBEDDING_CACHE_DIR,
+                 memory_items: int = EMBEDDING_CACHE_MEMORY_ITEMS):
+        self.model_name = model_name
+        self.memory_items = memory_items
+        self.cache_dir = os.path.join(cache_dir, re.sub(r'[^\w.-]', '_', model_name))
+        os.makedirs(self.cache_dir, exist_ok=True)
+
+        self.vectors_path = os.path.join(self.cache_dir, 'vectors.f32')
+        self.index_path = os.path.join(self.cache_dir, 'index.tsv')
+        self.meta_path = os.path.join(self.cache_dir, 'meta.json')
+        self.lock_path = os.path.join(self.cache_dir, '.lock')
+
+        self._lock = threading.RLock()
+        self._memory = OrderedDict()  # key -> np.ndarray
+        self._index = {}              # key -> 行号
+        self._index_read_pos = 0      # 已读取的索引文件字节位置（增量加载其他进程写入的条目）
+        self._dim = None
+        self._mmap = None
+        self._mmap_rows = 0
+
+        # 命中统计
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+        self._load_meta()
+        self._refresh_index()
+
+    # ------------------------- 磁盘层 -------------------------
+    def _load_meta(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, 'r', encoding='utf-8') as f:
+                self._dim = json.load(f).get('dim')
+
+    def _write_meta(self, dim):
+        tmp_path = f"{self.meta_path}.tmp"
+        with open(tmp_path, 'w', encoding='utf-8') as f:
+            json.dump({'model_name': self.model_name, 'dim': dim}, f)
+        os.replace(tmp_path, self.meta_path)
+        self._dim = dim
+
+    def _refresh_index(self):
+        """增量读取索引文件新增的行"""
+        if not os.path.exists(self.index_path):
+            return
+        with open(self.index_path, 'rb') as f:
+            f.seek(self._index_read_pos)
+            for line in f:
+                if not line.endswith(b'\n'):
+                    break  # 其他进程正在写入的半行，下次再读
+                key, _, row = line.rstrip(b'\n').partition(b'\t')
+                if row:
+                    self._index[key.decode('ascii')] = int(row)
+                self._index_read_pos += len(line)
+
+    def _get_mmap(self):
+        """按需（重新）映射向量文件"""
+        if self._dim is None or not os.path.exists(self.vectors_path):
+            return None
+        rows = os.path.getsize(self.vectors_path) // (4 * self._dim)
+        if rows == 0:
+            return None
+        if self._mmap is None or rows != self._mmap_rows:
+            self._mmap = np.memmap(self.vectors_path, dtype=np.float32, mode='r', shape=(rows, self._dim))
+            self._mmap_rows = rows
+        return self._mmap
+
+    def _read_disk(self, key) -> Optional[np.ndarray]:
+        row = self._index.get(key)
+        if row is None:
+            return None
+        vectors = self._get_mmap()
+        if vectors is None or row >= vectors.shape[0]:
+            return None
+        return np.array(vectors[row])  # 拷贝出来，避免持有映射引用
+
+    def _append_disk(self, items):
+        """批量追加向量到磁盘层"""
+        dim = items[0][1].shape[0]
+        if self._dim is not None and self._dim != dim:
+            logger.warning(f"向量维度不一致（缓存 {self._dim}，当前 {dim}），跳过写入磁盘缓存")
+            return
+
+        with open(self.lock_path, 'a') as lock_file:
+            if fcntl:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                if self._dim is None:
+                    self._load_meta()
+                    if self._dim is None:
+                        self._write_meta(dim)
+                self._refresh_index()
+                items = [(key, vec) for key, vec in items if key not in self._index]
+                if not items:
+                    return
+
+                # 写入中途崩溃会在文件末尾留下半行向量/半行索引，先截掉，否则之后追加的行号全部错位
+                start_row = 0
+                if os.path.exists(self.vectors_path):
+                    start_row = os.path.getsize(self.vectors_path) // (4 * dim)
+                    if os.path.getsize(self.vectors_path) != start_row * 4 * dim:
+                        logger.warning(f"向量缓存文件末尾有不完整的行，截断到 {start_row} 行")
+                        os.truncate(self.vectors_path, start_row * 4 * dim)
+                if os.path.exists(self.index_path) and os.path.getsize(self.index_path) > self._index_read_pos:
+                    os.truncate(self.index_path, self._index_read_pos)
+                block = np.stack([vec for _, vec in items]).astype(np.float32, copy=False)
+                with open(self.vectors_path, 'ab') as f:
+                    f.write(block.tobytes())
+                with open(self.index_path, 'ab') as f:
+                    f.write(''.join(f"{key}\t{start_row + i}\n" for i, (key, _) in enumerate(items)).encode('ascii'))
+                self._refresh_index()
+            finally:
+                if fcntl:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    # ------------------------- 内存层 -------------------------
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.memory_items:
+            self._memory.popitem(last=False)
+
+    # ------------------------- 对外接口 -------------------------
+    def get_many(self, texts: List[str]) -> List[Optional[np.ndarray]]:
+        """批量查询缓存，未命中的位置返回 None"""
+        results = []
+        with self._lock:
+            index_refreshed = False
+            for text in texts:
+                key = make_cache_key(text, self.model_name)
+                vector = self._memory.get(key)
+                if vector is not None:
+                    self._memory.move_to_end(key)
+                    self.memory_hits += 1
+                    results.append(vector)
+                    continue
+
+                if key not in self._index and not index_refreshed:
+                    self._refresh_index()  # 其他进程可能已写入
+                    index_refreshed = True
+                vector = self._read_disk(key)
+                if vector is not None:
+                    self.disk_hits += 1
+                    self._remember(key, vector)
+                else:
+                    self.misses += 1
+                results.append(vector)
+        return results
+
+    def put_many(self, texts: List[str], vectors: np.ndarray):
+        """批量写入缓存（内存层 + 磁盘层）"""
+        if len(texts) == 0:
+            return
+        items = []
+        with self._lock:
+            for text, vector in zip(texts, vectors):
+                key = make_cache_key(text, self.model_name)
+                vector = np.asarray(vector, dtype=np.float32)
+                self._remember(key, vector)
+                items.append((key, vector))
+            try:
+                self._append_disk(items)
+            except OSError as e:
+                logger.warning(f"写入语义向量磁盘缓存失败: {str(e)}")
+
+    def get_stats(self) -> Dict:
+        """缓存命中统计"""
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                'memory_items': len(self._memory),
+                'memory_capacity': self.memory_items,
+                'disk_items': len(self._index),
+                'memory_hits': self.memory_hits,
+                'disk_hits': self.disk_hits,
+                'misses': self.misses,
+                'hit_rate': round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else 0
+            }
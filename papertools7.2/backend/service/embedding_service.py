@@ -0,0 +1,255 @@
+# backend/service/embedding_service.py
+import re
+import threading
+import time
+from bisect import bisect_right
+from itertools import accumulate
+from typing import Dict, List
+
+import numpy as np
+
+from config.config import (
+    EMBEDDING_MODEL_NAME, EMBEDDING_BATCH_SIZE, EMBEDDING_CHUNK_CHARS,
+    EMBEDDING_CHUNK_OVERLAP, EMBEDDING_MAX_CHUNKS, EMBEDDING_TOP_K
+)
+from config.logging_config import logger
+from service.embedding_cache import EmbeddingCache
+
+_PARAGRAPH_SPLIT_RE = re.compile(r'\n\s*\n|\n')
+# 中日韩文字及全角标点：MiniLM 的 WordPiece 词表把这些字符逐个切成一个 token
+_CJK_RE = re.compile(r'[\u3000-\u303f\u3400-\u4dbf\u4e00-\u9fff\uf900-\ufaff\uff00-\uffef]')
+
+
+def chunk_length(text: str) -> int:
+    """
+    分块长度（按模型 token 数估算）：CJK 字符一字一个 token，计为 2；其他字符约 4 个一个 token，计为 1
+    这样 max_chars 对中文约为字数的两倍、对英文约为 token 数的四倍，两种文本都不会超出模型输入窗口
+    """
+    return len(text) + len(_CJK_RE.findall(text))
+
+
+def _split_long_paragraph(paragraph: str, max_chars: int, step: int) -> List[str]:
+    """按 chunk_length 计的滑动窗口切分超长段落"""
+    prefix = list(accumulate((2 if _CJK_RE.match(ch) else 1 for ch in paragraph), initial=0))
+    chunks = []
+    start = 0
+    while start < len(paragraph):
+        end = max(start + 1, bisect_right(prefix, prefix[start] + max_chars) - 1)
+        chunks.append(paragraph[start:end])
+        if end >= len(paragraph):
+            break
+        start = max(start + 1, bisect_right(prefix, prefix[start] + step) - 1)
+    return chunks
+
+
+def split_into_chunks(text: str, max_chars: int = EMBEDDING_CHUNK_CHARS,
+                      overlap: int = EMBEDDING_CHUNK_OVERLAP, max_chunks: int = EMBEDDING_MAX_CHUNKS) -> List[str]:
+    """
+    将长文档切分为适合模型输入长度的分块（长度按 chunk_length 计）
+    - 短段落合并到同一分块，直到接近 max_chars
+    - 超长段落按滑动窗口切分（相邻窗口重叠 overlap）
+    - 分块数超过 max_chunks 时均匀抽样，保证编码耗时有上限
+    """
+    chunks = []
+    current = ''
+    current_length = 0
+    step = max(1, max_chars - overlap)
+    for paragraph in _PARAGRAPH_SPLIT_RE.split(text or ''):
+        paragraph = paragraph.strip()
+        if not paragraph:
+            continue
+        length = chunk_length(paragraph)
+        if length > max_chars:
+            if current:
+                chunks.append(current)
+                current, current_length = '', 0
+            chunks.extend(_split_long_paragraph(paragraph, max_chars, step))
+        elif current_length + length + 1 > max_chars:
+            if current:
+                chunks.append(current)
+            current, current_length = paragraph, length
+        else:
+            current = f"{current}\n{paragraph}" if current else paragraph
+            current_length += length + 1 if current_length else length
+    if current:
+        chunks.append(current)
+
+    if len(chunks) > max_chunks:
+        picked = np.linspace(0, len(chunks) - 1, max_chunks).round().astype(int)
+        chunks = [chunks[i] for i in sorted(set(picked.tolist()))]
+    return chunks
+
+
+def max_sim_scores(query_chunks: np.ndarray, candidate_chunks: List[np.ndarray],
+                   top_k: int = EMBEDDING_TOP_K) -> np.ndarray:
+    """
+    基于分块相似度矩阵的文档级相似度
+    对每个候选文档的每个分块取其与查询文档所有分块的最大余弦相似度，
+    再取前 top_k 个最佳匹配的均值作为该候选文档的得分
+    :param query_chunks: (m, dim) 查询文档（上传论文）的分块向量
+    :param candidate_chunks: 每个候选文档的 (n_i, dim) 分块向量
+    :return: 每个候选文档的得分数组
+    """
+    scores = np.zeros(len(candidate_chunks), dtype=np.float32)
+    if query_chunks.size == 0 or not candidate_chunks:
+        return scores
+
+    sizes = [len(chunks) for chunks in candidate_chunks]
+    stacked = np.vstack([chunks for chunks in candidate_chunks if len(chunks)]) if any(sizes) else None
+    if stacked is None:
+        return scores
+    best = (stacked @ query_chunks.T).max(axis=1)  # 一次矩阵乘法得到所有候选分块的最佳匹配
+
+    offset = 0
+    for i, size in enumerate(sizes):
+        if size:
+            part = best[offset:offset + size]
+            k = min(top_k, size)
+            scores[i] = np.partition(part, size - k)[size - k:].mean()
+            offset += size
+    return scores
+
+
+class EmbeddingService:
+    """进程级语义向量服务（模型每个 worker 只加载一次，线程安全）"""
+
+    def __init__(self, model_name: str = EMBEDDING_MODEL_NAME, batch_size: int = EMBEDDING_BATCH_SIZE,
+                 cache: EmbeddingCache = None):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.cache = cache if cache is not None else EmbeddingCache(model_name)
+        self._model = None
+        self._load_lock = threading.Lock()    # 保证模型只加载一次
+        self._encode_lock = threading.Lock()  # 串行化推理，避免多线程争用同一模型
+        self._stats_lock = threading.Lock()
+
+        # 性能统计
+        self.load_time = None
+        self.encode_batches = 0
+        self.encoded_texts = 0
+        self.total_encode_time = 0.0
+        self.total_wait_time = 0.0  # 等待其他请求释放模型的时间（不计入编码耗时）
+        self.last_batch = {}
+
+    def _get_model(self):
+        """懒加载模型（双重检查锁）"""
+        if self._model is None:
+            with self._load_lock:
+                if self._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    start = time.perf_counter()
+                    self._model = SentenceTransformer(self.model_name)
+                    self.load_time = time.perf_counter() - start
+                    logger.info(f"语义模型 {self.model_name} 加载完成，耗时 {self.load_time:.2f} 秒")
+        return self._model
+
+    def preload(self):
+        """预加载模型（应用启动时调用）"""
+        self._get_model()
+        return self
+
+    def encode_many(self, texts: List[str]) -> np.ndarray:
+        """
+        批量计算文本向量（优先读取缓存，只对未命中的文本调用模型）
+        :param texts: 文本列表
+        :return: (len(texts), dim) 的 float32 矩阵，每行已做 L2 归一化
+        """
+        texts = list(texts)
+        if not texts:
+            return np.zeros((0, 0), dtype=np.float32)
+
+        cached = self.cache.get_many(texts)
+        missing = [i for i, vector in enumerate(cached) if vector is None]
+        if missing:
+            # 同一批次内重复的文本只编码一次
+            unique_texts = list(dict.fromkeys(texts[i] for i in missing))
+            encoded = self._encode_batch(unique_texts)
+            self.cache.put_many(unique_texts, encoded)
+            encoded_by_text = dict(zip(unique_texts, encoded))
+            for i in missing:
+                cached[i] = encoded_by_text[texts[i]]
+
+        return np.vstack(cached).astype(np.float32, copy=False)
+
+    def _encode_batch(self, texts: List[str]) -> np.ndarray:
+        """调用模型编码一批文本，分别记录等锁时间和编码耗时"""
+        model = self._get_model()
+        wait_start = time.perf_counter()
+        with self._encode_lock:
+            start = time.perf_counter()
+            embeddings = model.encode(
+                texts,
+                batch_size=self.batch_size,
+                convert_to_numpy=True,
+                normalize_embeddings=True,
+                show_progress_bar=False
+            )
+            elapsed = time.perf_counter() - start
+        waited = start - wait_start
+
+        with self._stats_lock:
+            self.encode_batches += 1
+            self.encoded_texts += len(texts)
+            self.total_encode_time += elapsed
+            self.total_wait_time += waited
+            self.last_batch = {'size': len(texts), 'seconds': round(elapsed, 4), 'wait_seconds': round(waited, 4)}
+        logger.info(f"语义向量批量编码 {len(texts)} 条，耗时 {elapsed:.3f} 秒（等待模型 {waited:.3f} 秒）")
+
+        return np.asarray(embeddings, dtype=np.float32)
+
+    def encode(self, text: str) -> np.ndarray:
+        """计算单条文本向量"""
+        return self.encode_many([text])[0]
+
+    def encode_documents(self, texts: List[str]) -> List[np.ndarray]:
+        """
+        分块编码多篇文档（所有分块合并为一个批次，分块向量同样走缓存）
+        :return: 每篇文档的 (n_i, dim) 分块向量矩阵
+        """
+        chunk_lists = [split_into_chunks(text) for text in texts]
+        flat_chunks = [chunk for chunks in chunk_lists for chunk in chunks]
+        if not flat_chunks:
+            return [np.zeros((0, 0), dtype=np.float32) for _ in texts]
+
+        embeddings = self.encode_many(flat_chunks)
+        results = []
+        offset = 0
+        for chunks in chunk_lists:
+            results.append(embeddings[offset:offset + len(chunks)])
+            offset += len(chunks)
+        return results
+
+    def document_similarities(self, query_text: str, texts: List[str]) -> np.ndarray:
+        """查询文档与多篇候选文档的分块 max-sim 相似度"""
+        documents = self.encode_documents([query_text] + list(texts))
+        return max_sim_scores(documents[0], documents[1:])
+
+    def get_stats(self) -> Dict:
+        """返回模型加载与编码耗时统计"""
+        with self._stats_lock:
+            return {
+                'model_name': self.model_name,
+                'loaded': self._model is not None,
+                'load_time': round(self.load_time, 4) if self.load_time is not None else None,
+                'encode_batches': self.encode_batches,
+                'encoded_texts': self.encoded_texts,
+                'total_encode_time': round(self.total_encode_time, 4),
+                'avg_batch_time': round(self.total_encode_time / self.encode_batches, 4) if self.encode_batches else 0,
+                'total_wait_time': round(self.total_wait_time, 4),
+                'last_batch': dict(self.last_batch),
+                'cache': self.cache.get_stats()
+            }
+
+
+_embedding_service = None
+_embedding_service_lock = threading.Lock()
+
+
+def get_embedding_service() -> EmbeddingService:
+    """获取进程内唯一的 EmbeddingService 实例"""
+    global _embedding_service
+    if _embedding_service is None:
+        with _embedding_service_lock:
+            if _embedding_service is None:
+                _embedding_service = EmbeddingService()
+    return _embedding_service
@@ -0,0 +1,88 @@
+# backend/service/minhash_lsh.py
+import zlib
+from collections import defaultdict
+from typing import Iterable, List, Set, Tuple
+
+import numpy as np
+
+from config.config import MINHASH_NUM_PERM, MINHASH_SHINGLE_SIZE, LSH_THRESHOLD
+
+_MERSENNE_PRIME = (1 << 31) - 1
+_MAX_HASH = (1 << 31) - 1
+
+
+def char_shingles(text: str, k: int = MINHASH_SHINGLE_SIZE) -> np.ndarray:
+    """字符 k-gram 集合（哈希为 31 位整数）"""
+    if not text:
+        return np.zeros(0, dtype=np.uint64)
+    if len(text) <= k:
+        grams = {text}
+    else:
+        grams = {text[i:i + k] for i in range(len(text) - k + 1)}
+    return np.fromiter((zlib.crc32(g.encode('utf-8')) & _MAX_HASH for g in grams),
+                       dtype=np.uint64, count=len(grams))
+
+
+def optimal_bands(num_perm: int, threshold: float) -> Tuple[int, int]:
+    """
+    选择 LSH 分带参数 (bands, rows)，使碰撞概率曲线的拐点 (1/b)^(1/r) 最接近阈值
+    阈值越低召回越高、候选越多；阈值越高精度越高、候选越少
+    """
+    best = (num_perm, 1)
+    best_error = float('inf')
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if error < best_error:
+            best, best_error = (bands, rows), error
+    return best
+
+
+class MinHashLSH:
+    """基于字符 shingle 的 MinHash 签名 + LSH 分带，用于快速筛选候选相似段落对"""
+
+    def __init__(self, threshold: float = LSH_THRESHOLD, num_perm: int = MINHASH_NUM_PERM,
+                 shingle_size: int = MINHASH_SHINGLE_SIZE, seed: int = 1):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.shingle_size = shingle_size
+        self.bands, self.rows = optimal_bands(num_perm, threshold)
+
+        rng = np.random.RandomState(seed)
+        self._a = rng.randint(1, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+        self._b = rng.randint(0, _MERSENNE_PRIME, size=num_perm).astype(np.uint64)
+
+    def signature(self, text: str) -> np.ndarray:
+        """计算文本的 MinHash 签名"""
+        hashes = char_shingles(text, self.shingle_size)
+        if hashes.size == 0:
+            return np.full(self.num_perm, _MAX_HASH, dtype=np.uint64)
+        # (a*x + b) mod p，对每个排列取最小值；a、x 均小于 2^31，乘积不会溢出 uint64
+        permuted = (np.outer(hashes, self._a) + self._b) % _MERSENNE_PRIME
+        return permuted.min(axis=0)
+
+    def _band_keys(self, signature: np.ndarray) -> List[bytes]:
+        return [signature[band * self.rows:(band + 1) * self.rows].tobytes() for band in range(self.bands)]
+
+    def candidate_pairs(self, texts1: Iterable[str], texts2: Iterable[str]) -> Set[Tuple[int, int]]:
+        """
+        返回至少在一个分带上碰撞的 (i, j) 段落对
+        空文本不参与比较
+        """
+        buckets = defaultdict(list)
+        for j, text in enumerate(texts2):
+            if not text:
+                continue
+            for band, key in enumerate(self._band_keys(self.signature(text))):
+                buckets[(band, key)].append(j)
+
+        pairs = set()
+        for i, text in enumerate(texts1):
+            if not text:
+                continue
+            for band, key in enumerate(self._band_keys(self.signature(text))):
+                for j in buckets.get((band, key), ()):
+                    pairs.add((i, j))
+        return pairs
@@ -33,18 +33,48 @@ from selenium.webdriver.chrome.service import Service
 from webdriver_manager.chrome import ChromeDriverManager
 
 from service.typo_detection_service import Typo_Detection
-from typing import Tuple, Dict, Union,List
+from service.embedding_service import get_embedding_service
+from service.minhash_lsh import MinHashLSH
+from service.analyzed_document import AnalyzedDocument, embed_documents
+from service.embedding_service import max_sim_scores
+from service.tfidf import CorpusStatistics, TfidfVectorizer
+from service.background_extraction import BackgroundExtractor
+from service.batch_spell_check import get_batch_spell_checker
+from dao.paper_dao import paper_text_store
+from utils.paper_text_store import STATUS_PENDING, STATUS_RUNNING, STATUS_FAILED
+from typing import Tuple, Dict, Union, List, Optional
 from werkzeug.datastructures import FileStorage
 import pdfplumber
 from docx import Document
 from config.config import BASE_DIR      # 从配置导入项目根路径
+from config.config import PARAGRAPH_KEYWORD_CACHE_SIZE, ANALYZED_DOCUMENT_CACHE_SIZE, EXTRACTION_WAIT_SECONDS
+from config.config import QUERY_HEAD_PAGES, QUERY_HEAD_CHARS, SPELL_STREAM_BATCH_CHARS, SPELL_BATCH_MAX_DOCUMENTS
+from utils.lru_cache import LRUCache
+from utils.document_extractor import extract_document, get_extraction_cache, ProgressiveExtraction
+from utils.doc_converter import get_doc_converter
+from utils.spell_shards import get_sharded_corrector
+from utils.process_memory import process_memory
+from utils.spooled_upload import SpooledUpload, UploadTooLarge
+from utils.text_normalization import (
+    CHINESE_STOP_WORDS, CN_SENTENCE_SPLIT_RE, search_terms, split_sentence_texts, strip_punctuation, to_original_span
+)
+import hashlib
+from contextlib import ExitStack
 
 from difflib import SequenceMatcher
+import numpy as np
 
 class PaperService:
     def __init__(self):
         self.paper_dao = PaperDao()
         self.typo_detection_service =Typo_Detection()
+        self.embedding_service = get_embedding_service()  # 进程级共享的语义模型
+        self.segment_lsh = MinHashLSH()  # 相似段落候选筛选
+        self.paragraph_keyword_cache = LRUCache(PARAGRAPH_KEYWORD_CACHE_SIZE)  # 段落 TextRank 关键词缓存（跨请求共享）
+        self.document_cache = LRUCache(ANALYZED_DOCUMENT_CACHE_SIZE)  # 按内容哈希缓存 AnalyzedDocument
+        self.corpus_statistics = CorpusStatistics()  # 本地论文库文档频率（TF-IDF 的 IDF 来源）
+        self.tfidf = TfidfVectorizer(self.corpus_statistics)
+        self.background_extractor = BackgroundExtractor(paper_text_store)  # 上传后后台解析论文文本
         self.api_key = None
         self.last_api_call_time = 0
         self.min_api_interval = 1  # 两次API请求之间至少间隔1秒
@@ -248,62 +278,61 @@ class PaperService:
 
 #zyb--------删除---_extract_google_scholar_article--------------------------
 #zyb--------删除---_extract_google_scholar_article--------------------------
+    ### 辅助函数：文档分析（分词、段落切分等只做一次）
+    def analyze(self, text) -> AnalyzedDocument:
+        """
+        获取文本的 AnalyzedDocument（已是 AnalyzedDocument 时直接返回）
+        同一内容在最近的请求中分析过时复用缓存结果
+        """
+        if isinstance(text, AnalyzedDocument):
+            return text
+        text = text or ''
+        key = hashlib.sha1(text.encode('utf-8')).hexdigest()
+        return self.document_cache.get_or_compute(key, lambda: AnalyzedDocument(text))
+
     ### 辅助函数：主题关键词提取
     def extract_keywords(self, text, top_n=5):
         """优化关键词提取（增强中文支持）"""
         logger.info("begin extract_keywords")
-        text = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9\uff00-\uffff]', ' ', text)#清理文本
-        words = jieba.cut(text)#分词
-        #停用词过滤
-        stop_words = set([
-            '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', 
-            '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', 
-            '自己', '这个', '那个', '然后', '如果', '所以', '但是', '因为', '或者', '而且'
-        ])
-        filtered_words = [word for word in words if word and word not in stop_words and len(word) > 1]
-        #词频统计
-        word_counts = Counter(filtered_words)
+        keywords = self.analyze(text).keywords(top_n)
         logger.info("end extract_keywords")
-        return [word for word, _ in word_counts.most_common(top_n) if re.search(r'[\u4e00-\u9fa5]', word)]
+        return keywords
 
     ### 辅助函数：文本预处理
     def preprocess_text(self, text):
         """优化文本预处理（增加对英文的支持）"""
         if not text:
             return []
-        text = re.sub(r'[^\u4e00-\u9fa5a-zA-Z0-9\s]', ' ', text)
-        words = jieba.cut(text)
-        stop_words = set([
-            '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', 
-            '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', 
-            '自己', 'a', 'an', 'the', 'in', 'on', 'at', 'by', 'for', 'to', 'of', 'with', 'is',
-            'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having'
-        ])
-        return [word for word in words if word and word not in stop_words and len(word) > 1]
+        return list(self.analyze(text).tokens)
 
     ### 核心功能：论文主题提取
     def extract_theme(self, file,user_id,paper_id):
         """论文主题提取（直接接收文件）"""
         try:
             logger.info("begin  find theme")
-            if not file or not file.filename:
-                return {'code': 400, 'message': '未上传有效文件'}
-            
-            filename = file.filename
-            file_ext = filename.split('.')[-1].lower()
-            paper_content = self._extract_file_content(file, file_ext)
+            if (not file or not file.filename) and paper_id:
+                # 未上传文件时使用已上传论文的解析结果
+                paper_content, filename, error = self._load_stored_paper(paper_id)
+                if error:
+                    return {'code': 400, 'message': error}
+            else:
+                if not file or not file.filename:
+                    return {'code': 400, 'message': '未上传有效文件'}
+                filename = file.filename
+                file_ext = filename.split('.')[-1].lower()
+                paper_content = self._extract_file_content(file, file_ext)
             
             if not paper_content:
                 return {'code': 400, 'message': '文件内容为空，无法提取主题'}
             
-            processed_text = self.preprocess_text(paper_content)
-            keywords = self.extract_keywords(paper_content, top_n=5)
+            document = self.analyze(paper_content)
+            keywords = self.extract_keywords(document, top_n=5)
             if not keywords:
                 return {'code': 400, 'message': '无法提取主题关键词'}
             
-            word_counts = Counter(processed_text)
+            word_counts = document.term_counts
             top_words = word_counts.most_common(20)
-            theme_summary = self._generate_theme_summary(paper_content, keywords, top_words)
+            theme_summary = self._generate_theme_summary(document, keywords, top_words)
             
             paper_title = filename.rsplit('.', 1)[0]
             logger.info(f"end  find theme11111111{theme_summary}")
@@ -334,41 +363,36 @@ class PaperService:
             return {'code': 500, 'message': f'主题提取失败: {str(e)}'}
 
     def _extract_file_content(self, file, file_ext):
-        """从文件对象中提取内容（支持多种格式）"""
+        """从文件对象中提取内容（支持多种格式，同一文件重复提交时直接读取提取缓存）"""
         try:
-            file_bytes = file.read()
-            if file_ext == 'txt':
-                return file_bytes.decode('utf-8', errors='ignore')
-            elif file_ext == 'pdf':
-                import pdfplumber
-                with pdfplumber.open(io.BytesIO(file_bytes)) as pdf:
-                    return ''.join([page.extract_text() or '' for page in pdf.pages])
-            elif file_ext == 'docx':
-                from docx import Document
-                doc = Document(io.BytesIO(file_bytes))
-                return '\n'.join([para.text for para in doc.paragraphs])
-            elif file_ext == 'doc':
-                import textract
-                text = textract.process(io.BytesIO(file_bytes), extension='doc')
-                return text.decode('utf-8', errors='ignore')
-            else:
+            # 按块读取上传流（大文件转存临时文件，同时计算哈希），提取器按路径读取
+            with SpooledUpload.from_file(file) as upload:
+                result = extract_document(upload.source(), file_ext, content_hash=upload.sha256)
+            if result is None:
                 current_app.logger.warning(f'不支持的文件格式: {file_ext}')
                 return None
+            return result.text
+        except UploadTooLarge as e:
+            current_app.logger.warning(f'文件过大: {str(e)}')
+            return None
         except Exception as e:
             current_app.logger.error(f'文件解析错误: {str(e)}')
             return None
 
+    def _start_progressive_extraction(self, file, file_ext):
+        """缓冲上传文件并开始渐进式提取（上传副本在开头读取和全文提取都结束后删除）"""
+        upload = SpooledUpload.from_file(file)
+        try:
+            return ProgressiveExtraction(upload.source(), file_ext, content_hash=upload.sha256, owner=upload)
+        except Exception:
+            upload.close()
+            raise
+
     def _generate_theme_summary(self, text, keywords, top_words, summary_length=500):
         """生成主题摘要"""
         logger.info("begin theme summary")
-        #分割文本
-        paragraphs = re.split(r'(。|！|\?|\.|!|\?)', text)
-        full_paragraphs = []
-        for i in range(0, len(paragraphs), 2):
-            if i + 1 < len(paragraphs):
-                full_paragraphs.append(paragraphs[i] + paragraphs[i+1])
-            else:
-                full_paragraphs.append(paragraphs[i])
+        #分割文本（复用文档分析时切分好的句子）
+        full_paragraphs = [sentence.text for sentence in self.analyze(text).sentences]
         #段落评分
         paragraph_scores = []
         for para in full_paragraphs:
@@ -449,8 +473,10 @@ class PaperService:
             # 拼接完整存储路径：backend/filestore/唯一文件名
             file_path = os.path.join(self.filestore_path, unique_filename)  
 
-            # 保存文件到 filestore
-            file.save(file_path)  
+            # 保存文件到 filestore（流式读取并计算哈希，大文件的临时副本直接移动到目标位置）
+            with SpooledUpload.from_file(file) as upload:
+                upload.save(file_path)
+                content_hash = upload.sha256
             logger.info(f"文件已保存至: {file_path}")
             # 在保存文件后添加
             logger.info(f"绝对路径: {os.path.abspath(file_path)}")
@@ -466,6 +492,10 @@ class PaperService:
             # 调用 DAO 持久化到数据库
             self.paper_dao.create_paper(new_paper)  
             logger.info(f"论文上传成功 - ID: {new_paper.id}")
+
+            # 后台解析论文文本：回填 content、写入指纹索引和 TF-IDF 统计，之后可直接按 paper_id 分析
+            self.background_extractor.submit(new_paper.id, file_path, on_success=self._on_paper_extracted,
+                                           content_hash=content_hash)
             return new_paper.id
 
         except Exception as e:
@@ -474,24 +504,84 @@ class PaperService:
                 os.remove(file_path)
             logger.error(f"上传失败: {str(e)}", exc_info=True)
             raise
+    def _on_paper_extracted(self, paper_id, content):
+        """后台解析完成：回填论文内容，增量写入指纹索引和 TF-IDF 统计"""
+        self.paper_dao.save_extracted_text(paper_id, content)
+        self.paper_dao.index_paper(paper_id, content)
+        if content:
+            self.corpus_statistics.add_document(paper_id, self.analyze(content).index_terms)
+        logger.info(f"论文 {paper_id} 指纹已写入索引")
+
+    def _load_stored_paper(self, paper_id, wait_seconds: float = EXTRACTION_WAIT_SECONDS):
+        """
+        按 paper_id 读取已上传论文的文本（后台解析尚未完成时最多等待 wait_seconds 秒）
+        :return: (内容, 文件名, 错误信息)
+        """
+        paper = self.paper_dao.get_paper_by_id(paper_id)
+        if not paper:
+            return None, None, '论文不存在'
+        status = self.background_extractor.get_status(paper_id)
+        if status and status['status'] in (STATUS_PENDING, STATUS_RUNNING):
+            status = self.background_extractor.wait(paper_id, wait_seconds)
+            if status and status['status'] in (STATUS_PENDING, STATUS_RUNNING):
+                return None, None, '论文正在解析中，请稍后重试'
+        if status and status['status'] == STATUS_FAILED:
+            logger.warning(f"论文 {paper_id} 后台解析失败（{status.get('error')}），尝试重新解析原文件")
+        content = self.paper_dao.read_paper_text(paper)
+        if not content:
+            return None, None, '论文内容为空或无法解析'
+        file_ext = os.path.splitext(paper.file_path or '')[1]
+        return content, f"{paper.title}{file_ext}", None
+
+    def get_extraction_status(self, paper_id):
+        """查询论文的后台解析状态"""
+        paper = self.paper_dao.get_paper_by_id(paper_id)
+        if not paper:
+            return {'code': 404, 'message': '论文不存在', 'data': None}
+        status = self.background_extractor.get_status(paper_id)
+        if status is None:
+            # 后台解析上线前上传的论文：没有状态记录，首次按 paper_id 分析时解析
+            status = {'paper_id': paper_id, 'status': 'done' if paper.content else 'not_extracted'}
+        return {'code': 200, 'message': '获取解析状态成功', 'data': status}
+
     def check_plagiarism(self, file,num_articles,user_id,paper_id, api_key=None):
         """基于Semantic Scholar API的论文查重（增强健壮性）"""
         logger.info("begin service check_plagiarism with Semantic Scholar API")
         
-        # 1. 解析上传文件获取内容
+        # 1. 解析上传文件获取内容（未上传文件时使用已上传论文的解析结果）
+        #    上传文件采用渐进式提取：前几页（标题、摘要、引言）读出后即可构造检索式并请求 API，
+        #    全文提取在后台同时进行，到相似度比较阶段再等待全文
+        extraction = None
+        keywords = []
+        start_time = time.perf_counter()
         try:
-            filename = file.filename
-            if not filename:
-                return {
-                    'code': 400,
-                    'message': '未上传有效文件',
-                    'data': None
-                }
-                
-            file_ext = filename.split('.')[-1].lower()
-            paper_content = self._extract_file_content(file, file_ext)
+            if (not file or not file.filename) and paper_id:
+                paper_content, filename, error = self._load_stored_paper(paper_id)
+                if error:
+                    return {'code': 400, 'message': error, 'data': None}
+                query_text = paper_content
+            else:
+                filename = file.filename if file else None
+                if not filename:
+                    return {
+                        'code': 400,
+                        'message': '未上传有效文件',
+                        'data': None
+                    }
+                    
+                file_ext = filename.split('.')[-1].lower()
+                extraction = self._start_progressive_extraction(file, file_ext)
+                paper_content = None
+                try:
+                    query_text = extraction.head(QUERY_HEAD_PAGES, QUERY_HEAD_CHARS)
+                except Exception as e:
+                    logger.warning(f"读取论文开头失败，等待全文提取: {str(e)}")
+                    query_text = None
+                if not query_text or not query_text.strip():
+                    # 开头没有可用文本（如扫描页），退回到全文
+                    query_text = paper_content = extraction.text()
             
-            if not paper_content:
+            if not query_text:
                 return {
                     'code': 400,
                     'message': '论文内容为空，无法查重',
@@ -501,6 +591,8 @@ class PaperService:
             paper_title = filename.rsplit('.', 1)[0]
             
         except Exception as e:
+            if extraction is not None:
+                extraction.close()
             return {
                 'code': 500,
                 'message': f'文件解析失败: {str(e)}',
@@ -512,10 +604,10 @@ class PaperService:
             if api_key:
                 self.set_api_key(api_key)
             
-            # 3. 提取关键词
-            keywords = self.extract_keywords(paper_content)
+            # 3. 提取关键词（只用论文开头部分）
+            keywords = self.extract_keywords(query_text)
             if not keywords:
-                keywords = re.findall(r'[\u4e00-\u9fa5a-zA-Z0-9]{2,}', paper_title)[:3]
+                keywords = search_terms(paper_title, 3)
                 if not keywords:
                     return {
                         'code': 400,
@@ -524,7 +616,7 @@ class PaperService:
                     }
                     
             search_query = ' '.join(keywords)
-            logger.info(f"Semantic Scholar搜索关键词: {search_query}")
+            logger.info(f"Semantic Scholar搜索关键词: {search_query}（距开始 {time.perf_counter() - start_time:.2f} 秒）")
             
             # 4. 通过API获取相似文章
             api_results = self.search_semantic_scholar(search_query, num_articles)
@@ -545,7 +637,7 @@ class PaperService:
                 
             if not api_results.get('data'):
                 # 尝试使用不同的搜索策略（如使用标题）
-                title_query = re.sub(r'[^\w\s]', '', paper_title)
+                title_query = strip_punctuation(paper_title)
                 logger.info(f"尝试备用搜索策略: {title_query}")
                 api_results = self.search_semantic_scholar(title_query, num_articles)
                 
@@ -564,21 +656,26 @@ class PaperService:
                     }
             
             #lzj5. 计算相似度并提取相似片段（核心修改）
-            similar_articles = api_results['data']
+            if paper_content is None:
+                try:
+                    paper_content = extraction.text()  # 等待后台全文提取完成
+                except Exception as e:
+                    return {'code': 500, 'message': f'文件解析失败: {str(e)}', 'data': None}
+                if not paper_content:
+                    return {'code': 400, 'message': '论文内容为空，无法查重', 'data': None}
+            document = self.analyze(paper_content)  # 相似度、相似片段共用同一份分析结果
+            similar_articles = [article for article in api_results['data'] if article.get('abstract')]  # 跳过没有摘要的文章
+            # 一次性计算全部文献的相似度（论文只分析一次，摘要批量编码）
+            similarities = self._calculate_batch_similarity(
+                document, [article['abstract'] for article in similar_articles]
+            )
             comparison_results = []
         
-            for article in similar_articles:
-                abstract = article.get('abstract', '')  # 对比文件内容（文献摘要）
-                if not abstract:
-                    continue  # 跳过没有摘要的文章
-                logger.info(f"Before calling _extract_similar_segments, paper_content: {paper_content}")  # 添加日志
-                logger.info(f"Before calling _extract_similar_segments, abstract: {abstract}")  # 添加日志
-                # 计算相似度（调用原有方法）
-                similarity = self._calculate_advanced_similarity(paper_content, abstract)
-            
+            for article, similarity in zip(similar_articles, similarities):
+                abstract = article['abstract']  # 对比文件内容（文献摘要）
                 # 提取相似片段（调用新增方法）
                 similar_segments_text1, similar_segments_text2 = self._extract_similar_segments(
-                    paper_content, abstract
+                    document, abstract
                 )
             
                 # 将相似片段加入结果
@@ -641,106 +738,164 @@ class PaperService:
         """改进的相似度计算（结合关键词和语义相似度）"""
         if not text1 or not text2:
             return 0.0
-        logger.info('begin _calculate_advanced_similarity')
-        # 1. 基于关键词的相似度（原逻辑）
-        keywords1 = self.extract_keywords(text1, top_n=10)
-        keyword_match = sum(1 for kw in keywords1 if kw in text2)
-        keyword_similarity = (keyword_match / len(keywords1)) * 0.4 * 100  # 占40%权重
-        
-        # 2. 基于词频的相似度
-        from collections import Counter
-        words1 = re.findall(r'\b[\w]+\b', text1.lower())
-        words2 = re.findall(r'\b[\w]+\b', text2.lower())
-        count1 = Counter(words1)
-        count2 = Counter(words2)
-        
-        # 计算Jaccard相似度
-        intersection = sum((count1 & count2).values())
-        union = sum((count1 | count2).values())
-        jaccard_similarity = (intersection / union) * 0.3 * 100  # 占30%权重
-        
-        # 3. 语义相似度（使用简单词嵌入，需安装sentence-transformers）
-        semantic_similarity = 0.0
+        return self._calculate_batch_similarity(text1, [text2])[0]
+
+    def _calculate_batch_similarity(self, paper_content, texts):
+        """
+        批量相似度计算：上传论文只分析一次，所有候选文本一次性向量化打分
+        :param paper_content: 上传论文内容（str 或 AnalyzedDocument）
+        :param texts: 候选文本列表（如文献摘要，str 或 AnalyzedDocument）
+        :return: 与 texts 一一对应的相似度列表（0-100）
+        """
+        if not paper_content or not texts:
+            return [0.0] * len(texts)
+        logger.info(f'begin _calculate_batch_similarity, {len(texts)} candidates')
+        num_candidates = len(texts)
+        document = self.analyze(paper_content)
+        candidates = [self.analyze(text) for text in texts]
+
+        # 1. 基于关键词的相似度（论文关键词只提取一次）
+        keywords1 = self.extract_keywords(document, top_n=10)
+        if keywords1:
+            keyword_hits = np.array([[kw in candidate.text for kw in keywords1] for candidate in candidates], dtype=np.float64)
+            keyword_similarity = keyword_hits.mean(axis=1) * 0.4 * 100  # 占40%权重
+        else:
+            keyword_similarity = np.zeros(num_candidates)
+
+        # 2. 基于 TF-IDF 的词法相似度（稀疏向量余弦，IDF 来自本地论文库，常见词权重低、专业术语权重高）
+        tfidf_similarity = self.tfidf.similarities(
+            document.index_terms, [candidate.index_terms for candidate in candidates]
+        ) * 0.3 * 100  # 占30%权重
+
+        # 3. 语义相似度（论文与候选文本分块后一次批量编码，按分块 max-sim 聚合，覆盖全文而非仅开头）
+        semantic_similarity = np.zeros(num_candidates)
         try:
-            from sentence_transformers import SentenceTransformer
-            import numpy as np
-            
-            # 加载轻量级模型
-            model = SentenceTransformer('all-MiniLM-L6-v2')
-            # 计算文本嵌入
-            embedding1 = model.encode(text1)
-            embedding2 = model.encode(text2)
-            # 余弦相似度
-            cosine_sim = np.dot(embedding1, embedding2) / (np.linalg.norm(embedding1) * np.linalg.norm(embedding2))
-            semantic_similarity = cosine_sim * 0.3 * 100  # 占30%权重
+            # 论文与尚未编码的候选文本合并为一个批次编码，已编码过的文档直接复用向量
+            embeddings = embed_documents([document] + candidates, self.embedding_service)
+            semantic_similarity = max_sim_scores(embeddings[0], embeddings[1:]) * 0.3 * 100  # 占30%权重
         except Exception as e:
             logger.warning(f"语义相似度计算失败，使用基础算法: {str(e)}")
-        
+
         # 综合相似度
-        total_similarity = keyword_similarity + jaccard_similarity + semantic_similarity
-        return min(total_similarity, 100.0)  # 限制最大值为100
+        total_similarity = keyword_similarity + tfidf_similarity + semantic_similarity
+        return [float(value) for value in np.minimum(total_similarity, 100.0)]  # 限制最大值为100
+
 
+    def backfill_tfidf_corpus(self):
+        """
+        把尚未计入文档频率的本地论文补充统计（应用启动时在后台线程执行一次，不在请求中执行；
+        新上传的论文由后台解析完成时增量计入）
+        """
+        try:
+            self.corpus_statistics.refresh()
+            missing = [pid for pid in self.paper_dao.get_all_paper_ids() if pid not in self.corpus_statistics]
+            if not missing:
+                return
+            self.corpus_statistics.add_documents(
+                (pid, set(self.analyze(text).index_terms) if text else ())
+                for pid, text in self.paper_dao.iter_paper_texts(missing)
+            )
+            logger.info(f"TF-IDF 语料统计新增 {len(missing)} 篇论文，当前共 {self.corpus_statistics.num_docs} 篇")
+        except Exception as e:
+            logger.warning(f"更新 TF-IDF 语料统计失败，使用已有统计: {str(e)}")
 
     def delete_paper(self, paper_id):
         """删除论文"""
+        # 删除前读取内容，用于从文档频率中扣除
+        terms = None
+        if paper_id in self.corpus_statistics:
+            for _, text in self.paper_dao.iter_paper_texts([paper_id]):
+                terms = self.analyze(text).index_terms if text else ()
         success, message = self.paper_dao.delete_paper(paper_id)
         if not success:
             return {'code': 400, 'message': message}
+        if terms is not None:
+            self.corpus_statistics.remove_document(paper_id, terms)
         return {'code': 200, 'message': message}
     
     ### 错字检测功能
-    def check_spelling(self, file: FileStorage,user_id,paper_id) -> Tuple[bool, Dict]:
-        """优化版论文错字检测主方法"""
+    def _load_spelling_content(self, file: FileStorage, paper_id) -> Tuple[str, str, Optional[Dict]]:
+        """
+        错字检测的文本来源：上传文件，或未上传文件时已上传论文的解析结果
+        :return: (文本, 文件名, 错误)，错误统一为 {"error": 错误信息, "code": 状态码}
+        """
+        # 1. 检查文件有效性（未上传文件时使用已上传论文的解析结果）
+        if (not file or file.filename == '') and paper_id:
+            content, filename, error = self._load_stored_paper(paper_id)
+            if error:
+                return None, filename, {"error": error, "code": 400}
+        else:
+            if not file or file.filename == '':
+                return None, None, {"error": "未提供有效文件", "code": 400}
+            filename = file.filename
+
+            # 2. 解析文件内容（纯文本严格按 UTF-8 解码，其他格式走统一提取入口和提取缓存）
+            file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else 'txt'
+            if file_ext == 'txt':
+                with SpooledUpload.from_file(file) as upload:
+                    content = upload.decode_text('utf-8')
+            else:
+                content = self._extract_file_content(file, file_ext)
+        if not content:
+            return None, filename, {"error": "文件内容为空或无法解析", "code": 404}
+        return content, filename, None
+
+    @staticmethod
+    def _format_typo(typo: Dict) -> Dict:
+        """错字检测结果转换为接口返回格式"""
+        return {
+            'position': typo['position'],
+            'word': typo['wrong_word'],
+            'length': typo['length'],
+            'suggestions': typo['suggestions'],
+            'context': typo['context']
+        }
+
+    def check_spelling(self, file: FileStorage,user_id,paper_id, response_mode: str = 'full') -> Tuple[bool, Dict]:
+        """
+        优化版论文错字检测主方法
+        :param response_mode: 'full' 返回标记好的 checked_text；'spans' 不返回 checked_text，由前端按 typo_details 的位置渲染
+        """
         try:
             logger.info("开始论文错字检测服务")
 
-            # 1. 检查文件有效性
-            if not file or file.filename == '':
-                return False, '未提供有效文件'
-            
-            # 2. 解析文件内容
-            content = file.stream.read().decode('utf-8')
-            
-            if not content:
-                return False, {"error": "文件内容为空或无法解析", "code": 404}
-                
+            content, filename, error = self._load_spelling_content(file, paper_id)
+            if error:
+                return False, error
+
             # 3. 执行错字检测（使用专业库）
             typo_results = self.typo_detection_service._detect_typos(content)
             
-            # 4. 生成标记文本
-            checked_text = self._format_checked_text(content, typo_results)
-            
+            # 4. 生成标记文本（spans 模式下由前端按位置渲染，不再重复返回一份全文）
+            checked_text = self._format_checked_text(content, typo_results) if response_mode != 'spans' else None
+
             logger.info(f"finish,find {len(typo_results)} wrong(s)")
             # 改错成功后记录操作
             Operation.log_operation(
                 user_id=user_id,
                 paper_id=paper_id,
                 operation_type="spellcheck",
-                file_name=file.filename,
+                file_name=filename,
                 operation_time=datetime.now()
             )
             # 4. 转换结果格式（关键修改）
-            formatted_results = []
-            for typo in typo_results:
-                formatted_typo = {
-                'position': typo['position'],
-                'word': typo['wrong_word'],
-                'length': typo['length'],
-                'suggestions': typo['suggestions'],
-                'context': typo['context']
-                }
-                formatted_results.append(formatted_typo)
+            formatted_results = [self._format_typo(typo) for typo in typo_results]
         
-            return True, {
+            result = {
             "total_typos": len(formatted_results),
             "typo_details": formatted_results,
-            "checked_text": checked_text,
             "original_text": content
             }
+            if checked_text is not None:
+                result["checked_text"] = checked_text
+            return True, result
             
         except FileNotFoundError:
             logger.error("文件no exist")
             return False, {"error": "文件不存在", "code": 404}
+        except UploadTooLarge as e:
+            logger.warning(f"错字检测文件过大: {str(e)}")
+            return False, {"error": str(e), "code": 413}
         except UnicodeDecodeError:
             logger.error("文件编码错误，无法解析")
             return False, {"error": "文件code wrong，请检查文件格式", "code": 400}
@@ -750,23 +905,182 @@ class PaperService:
         finally:
             logger.info("spelling end")
 
+    def check_spelling_batch(self, files: List[FileStorage], paper_ids: List[int], user_id) -> Tuple[bool, Dict]:
+        """
+        批量错字检测：多篇文档的提取和检测分发到常驻 Typo_Detection 进程池并行执行
+        返回每篇文档的结果（错字位置，不含标记后的全文）和整批汇总；单篇失败不影响其他文档
+        """
+        total = len(files) + len(paper_ids)
+        if total == 0:
+            return False, '未提供文件或论文ID'
+        if total > SPELL_BATCH_MAX_DOCUMENTS:
+            return False, f'单次最多检测 {SPELL_BATCH_MAX_DOCUMENTS} 篇文档'
+
+        start = time.perf_counter()
+        documents = []  # (描述, 任务, 无需检测时的结果)
+        with ExitStack() as stack:
+            for file in files:
+                filename = file.filename or ''
+                entry = {'filename': filename}
+                file_ext = filename.rsplit('.', 1)[-1].lower() if '.' in filename else ''
+                try:
+                    if file_ext not in ('txt', 'doc', 'docx'):
+                        raise ValueError('不支持的文件格式，仅支持 .txt, .doc, .docx')
+                    upload = stack.enter_context(SpooledUpload.from_file(file))
+                    if file_ext == 'txt':
+                        job = {'text': upload.decode_text('utf-8')}
+                    else:
+                        job = {'source': upload.source(), 'file_ext': file_ext, 'content_hash': upload.sha256}
+                    documents.append((entry, job, None))
+                except UnicodeDecodeError:
+                    documents.append((entry, None, {'status': 'failed', 'error': '文件编码错误，请检查文件格式'}))
+                except (UploadTooLarge, ValueError) as e:
+                    documents.append((entry, None, {'status': 'failed', 'error': str(e)}))
+            # 尚未解析完的论文一起等待（共用一个截止时间），仍未完成的标记为 pending，不逐篇阻塞请求线程
+            statuses = self.background_extractor.wait_all(paper_ids, EXTRACTION_WAIT_SECONDS)
+            for paper_id in paper_ids:
+                status = statuses.get(paper_id)
+                if status and status['status'] in (STATUS_PENDING, STATUS_RUNNING):
+                    entry = {'paper_id': paper_id, 'filename': None}
+                    documents.append((entry, None, {'status': 'pending', 'error': '论文正在解析中，请稍后重试'}))
+                    continue
+                content, filename, error = self._load_stored_paper(paper_id, wait_seconds=0)
+                entry = {'paper_id': paper_id, 'filename': filename}
+                if error:
+                    documents.append((entry, None, {'status': 'failed', 'error': error}))
+                else:
+                    documents.append((entry, {'text': content}, None))
+
+            jobs = [job for _, job, _ in documents if job is not None]
+            checked = iter(get_batch_spell_checker().check(jobs) if jobs else [])
+
+        results = []
+        type_counts = Counter()
+        for entry, job, outcome in documents:
+            if job is not None:
+                outcome = next(checked)
+            entry['status'] = outcome['status']
+            if outcome['status'] != 'ok':
+                entry['error'] = outcome['error']
+                results.append(entry)
+                continue
+            typos = outcome['typos']
+            type_counts.update(typo['type'] for typo in typos)
+            entry.update({
+                'total_chars': outcome['total_chars'],
+                'total_typos': len(typos),
+                'typo_details': [self._format_typo(typo) for typo in typos],
+                'extract_seconds': outcome['extract_seconds'],
+                'detect_seconds': outcome['detect_seconds']
+            })
+            results.append(entry)
+            Operation.log_operation(
+                user_id=user_id,
+                paper_id=entry.get('paper_id'),
+                operation_type="spellcheck",
+                file_name=entry['filename'],
+                operation_time=datetime.now()
+            )
+
+        succeeded = [r for r in results if r['status'] == 'ok']
+        elapsed = time.perf_counter() - start
+        summary = {
+            'documents': len(results),
+            'succeeded': len(succeeded),
+            'pending': sum(1 for r in results if r['status'] == 'pending'),
+            'failed': sum(1 for r in results if r['status'] not in ('ok', 'pending')),
+            'total_typos': sum(r['total_typos'] for r in succeeded),
+            'total_chars': sum(r['total_chars'] for r in succeeded),
+            'avg_typos_per_document': round(sum(r['total_typos'] for r in succeeded) / len(succeeded), 2) if succeeded else 0,
+            'typo_types': dict(type_counts),
+            'elapsed_seconds': round(elapsed, 3),
+            'documents_per_second': round(len(results) / elapsed, 3) if elapsed else 0
+        }
+        logger.info(f"批量错字检测：{summary}")
+        return True, {'results': results, 'summary': summary}
+
+    def start_spelling_stream(self, file: FileStorage, user_id, paper_id) -> Tuple[bool, object]:
+        """
+        流式错字检测：先解析文本（解析失败时与 check_spelling 一样直接返回错误），
+        成功时返回逐条产出记录的生成器：start -> 若干 batch（每批错字，位置为全文位置）-> summary
+        """
+        try:
+            content, filename, error = self._load_spelling_content(file, paper_id)
+        except UploadTooLarge as e:
+            logger.warning(f"错字检测文件过大: {str(e)}")
+            return False, {"error": str(e), "code": 413}
+        except UnicodeDecodeError:
+            logger.error("文件编码错误，无法解析")
+            return False, {"error": "文件code wrong，请检查文件格式", "code": 400}
+        except Exception as e:
+            logger.error(f"错字检测服务fail: {str(e)}", exc_info=True)
+            return False, {"error": f"错字检测失败: {str(e)}", "code": 500}
+        if error:
+            return False, error
+        return True, self._iter_spelling_records(content, filename, user_id, paper_id)
+
+    def _iter_spelling_records(self, content: str, filename: str, user_id, paper_id):
+        start = time.perf_counter()
+        total_chars = len(content)
+        total_typos = 0
+        batches = 0
+        yield {'type': 'start', 'filename': filename, 'total_chars': total_chars}
+        try:
+            for batch_start, batch_end, typos in self.typo_detection_service.iter_typo_batches(
+                    content, SPELL_STREAM_BATCH_CHARS):
+                batches += 1
+                total_typos += len(typos)
+                yield {
+                    'type': 'batch',
+                    'start': batch_start,
+                    'end': batch_end,
+                    'progress': round(batch_end / total_chars, 4),
+                    'typos': [self._format_typo(typo) for typo in typos]
+                }
+            Operation.log_operation(
+                user_id=user_id,
+                paper_id=paper_id,
+                operation_type="spellcheck",
+                file_name=filename,
+                operation_time=datetime.now()
+            )
+        except Exception as e:
+            logger.error(f"流式错字检测fail: {str(e)}", exc_info=True)
+            yield {'type': 'error', 'message': f'错字检测失败: {str(e)}'}
+            return
+        elapsed = time.perf_counter() - start
+        logger.info(f"流式错字检测完成：{total_chars} 字符，{batches} 批，{total_typos} 处错字，耗时 {elapsed:.2f} 秒")
+        yield {
+            'type': 'summary',
+            'total_typos': total_typos,
+            'total_chars': total_chars,
+            'batches': batches,
+            'elapsed_seconds': round(elapsed, 3)
+        }
+
     def _format_checked_text(self, content: str, typo_results: List[Dict]) -> str:
-        """生成标记错字的文本，适配前端HTML格式"""
+        """
+        生成标记错字的文本，适配前端HTML格式：错字前后各插入 [TYPO:建议]
+        按位置从前往后一次拼接各段（与错字数量无关地只复制一遍原文）；与前一处错字重叠的结果跳过
+        """
         if not typo_results:
             return content
-            
-        # 按位置倒序排序，避免插入标记后位置偏移
-        for result in sorted(typo_results, key=lambda x: x['position'], reverse=True):
+
+        parts = []
+        last = 0
+        for result in sorted(typo_results, key=lambda x: x['position']):
             pos = result['position']
+            if pos < last:
+                continue
             word = result['wrong_word']
-            suggestions = result['suggestions']
-            
-            # 生成后端标记，前端会转换为HTML
-            marker = f"[TYPO:{suggestions[0]}]"  # 取第一个建议
-            #marker = f'[TYPO:{",".join(suggestions)}]'
-            content = f"{content[:pos]}{marker}{word}{marker}{content[pos+len(word):]}"
-            
-        return content
+            marker = f"[TYPO:{result['suggestions'][0]}]"  # 生成后端标记（取第一个建议），前端会转换为HTML
+            parts.append(content[last:pos])
+            parts.append(marker)
+            parts.append(word)
+            parts.append(marker)
+            last = pos + len(word)
+        parts.append(content[last:])
+        return ''.join(parts)
     
 
     def _get_context(self, text: str, position: int, length: int) -> str:
@@ -789,47 +1103,41 @@ class PaperService:
             raise ValueError(f"获取论文总数失败: {str(e)}")
 #lmk------------------------------------------------------------
 
+    def get_performance_metrics(self):
+        """获取各分析组件的性能统计"""
+        return {
+            'embedding': self.embedding_service.get_stats(),
+            'fingerprint_index': self.paper_dao.get_index_stats(),
+            'paragraph_keyword_cache': self.paragraph_keyword_cache.get_stats(),
+            'tfidf_corpus': self.corpus_statistics.get_stats(),
+            'extraction_cache': get_extraction_cache().get_stats(),
+            'doc_conversion': get_doc_converter().get_stats(),
+            'spell_check': get_sharded_corrector().get_stats(),
+            'batch_spell_check': get_batch_spell_checker().get_stats(),
+            'process_memory': process_memory(),
+            'background_extraction': self.background_extractor.get_stats()
+        }
+
 #lzj----------------------------------------------------------------------------
 
-    def _extract_similar_segments(self, text1: str, text2: str) -> tuple:
+    def _extract_similar_segments(self, text1: str, text2: str, lsh_threshold: float = None) -> tuple:
         """
         提取两段文本中相似的段落（关键词提取优化版）
-        :param text1: 原文件文本（上传的论文）
-        :param text2: 对比文件文本（相似文献）
+        :param text1: 原文件文本（上传的论文，str 或 AnalyzedDocument）
+        :param text2: 对比文件文本（相似文献，str 或 AnalyzedDocument）
+        :param lsh_threshold: MinHash/LSH 候选阈值，默认使用配置 LSH_THRESHOLD
         :return: 原文件相似段落列表、对比文件相似段落列表
         """
-        logger.info(f"text1 length: {len(text1)}, text2 length: {len(text2)}")
+        document1 = self.analyze(text1)
+        document2 = self.analyze(text2)
+        logger.info(f"text1 length: {len(document1)}, text2 length: {len(document2)}")
         logger.info('开始检查相似段落（关键词语义匹配模式）')
 
-        # 按段落分割（保留原始换行）
-        def split_paragraphs(text):
-            paragraphs = re.split(r'(\n+)', text)
-            combined = []
-            current_para = ""
-            for part in paragraphs:
-                if re.fullmatch(r'\n+', part):
-                    if current_para:
-                        combined.append(current_para)
-                        current_para = ""
-                    combined.append(part)
-                else:
-                    current_para += part
-            if current_para:
-                combined.append(current_para)
-            return [p for p in combined if p.strip()]
-
-        # 文本预处理（保留中文、字母、数字）
-        def preprocess_text(text):
-            text = re.sub(r'[^\w\s\u4e00-\u9fa5]', '', text.lower())
-            return re.sub(r'\s+', ' ', text).strip()
-
-        # 分割文本
-        original_paragraphs1 = split_paragraphs(text1)
-        original_paragraphs2 = split_paragraphs(text2)
-
-        # 预处理文本
-        processed_paragraphs1 = [preprocess_text(p) for p in original_paragraphs1]
-        processed_paragraphs2 = [preprocess_text(p) for p in original_paragraphs2]
+        # 分割文本（按换行切分的段落）并预处理（保留中文、字母、数字），均由文档分析结果提供
+        original_paragraphs1 = [p.text for p in document1.paragraphs]
+        original_paragraphs2 = [p.text for p in document2.paragraphs]
+        processed_paragraphs1 = document1.processed_paragraphs
+        processed_paragraphs2 = document2.processed_paragraphs
 
         logger.info(f"文本1分割为 {len(original_paragraphs1)} 个段落，文本2分割为 {len(original_paragraphs2)} 个段落")
 
@@ -841,26 +1149,26 @@ class PaperService:
         from collections import defaultdict
         import jieba.analyse
 
-        # 加载停用词
-        stopwords = set(['的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己'])
-
         # 提取段落关键词（结合TextRank和TF-IDF）
-        def extract_keywords(paragraph, top_k=5):
-            if not paragraph:
-                return []
-                
+        def textrank_keywords(paragraph, top_k):
             # 使用jieba的textrank提取关键词
             keywords = jieba.analyse.textrank(paragraph, topK=top_k, withWeight=True, allowPOS=('ns', 'n', 'vn', 'v'))
             
             # 过滤停用词并确保词长>=2
-            keywords = [(word, weight) for word, weight in keywords 
-                    if word not in stopwords and len(word) >= 2]
-            
-            return keywords if keywords else []  # 确保至少返回空列表
+            return tuple((word, weight) for word, weight in keywords 
+                    if word not in CHINESE_STOP_WORDS and len(word) >= 2)
+
+        def extract_keywords(paragraph, top_k=5):
+            if not paragraph:
+                return []
+            # 按段落内容哈希缓存：重复对比同一草稿或小幅修改后复查时，只有新增/修改的段落才会重新运行 TextRank
+            key = (hashlib.sha1(paragraph.encode('utf-8')).hexdigest(), top_k)
+            keywords = self.paragraph_keyword_cache.get_or_compute(key, lambda: textrank_keywords(paragraph, top_k))
+            return list(keywords)  # 确保至少返回空列表
 
-        # 提取所有段落的关键词
-        keywords1 = [extract_keywords(p) for p in processed_paragraphs1]
-        keywords2 = [extract_keywords(p) for p in processed_paragraphs2]
+        # 提取所有段落的关键词（同一文档与多篇文献对比时只提取一次）
+        keywords1 = document1.memoize('paragraph_keywords', lambda: [extract_keywords(p) for p in processed_paragraphs1])
+        keywords2 = document2.memoize('paragraph_keywords', lambda: [extract_keywords(p) for p in processed_paragraphs2])
         
         # 提取所有关键词的集合（用于句子关键词计数）
         all_keywords = set()
@@ -872,16 +1180,7 @@ class PaperService:
         # 按句子分割并标记关键词最多的句子
         def mark_keyword_sentences(paragraph, keywords_set):
             # 按句子分割（中文句号、问号、感叹号）
-            sentences = re.split(r'([。？！])', paragraph)
-            combined_sentences = []
-            current_sentence = ""
-            
-            for i, part in enumerate(sentences):
-                current_sentence += part
-                # 如果是标点符号或者最后一部分，组成一个完整句子
-                if i % 2 == 1 or i == len(sentences) - 1:
-                    combined_sentences.append(current_sentence)
-                    current_sentence = ""
+            combined_sentences = split_sentence_texts(paragraph, CN_SENTENCE_SPLIT_RE)
             
             # 计算每个句子的关键词数量
             sentence_keyword_counts = []
@@ -904,6 +1203,17 @@ class PaperService:
             
             return marked_paragraph
 
+        # 规范化段落上的相同片段映射回段落原文，返回 ([原文1中的 [起, 止)], [原文2中的 [起, 止)])
+        def matched_spans(i, j, min_size=8):
+            norm1 = document1.normalized_paragraph(i)
+            norm2 = document2.normalized_paragraph(j)
+            spans1, spans2 = [], []
+            for block in SequenceMatcher(None, norm1.text, norm2.text).get_matching_blocks():
+                if block.size >= min_size:
+                    spans1.append(list(to_original_span(norm1, block.a, block.a + block.size)))
+                    spans2.append(list(to_original_span(norm2, block.b, block.b + block.size)))
+            return spans1, spans2
+
         # --------------------- 相似度计算模块 ---------------------
         # 计算关键词重叠率
         def keyword_overlap(kw1, kw2):
@@ -912,50 +1222,75 @@ class PaperService:
             overlap = set1 & set2
             return len(overlap) / max(len(set1), len(set2)) if max(len(set1), len(set2)) > 0 else 0
 
-        # 改进的字符级相似度计算
-        def char_similarity(para1, para2):
-            # 忽略短文本
-            if len(para1) < 10 or len(para2) < 10:
-                return 0
-            return SequenceMatcher(None, para1, para2).ratio()
-
         # 综合相似度计算（提高关键词权重，调整阈值）
         def combined_similarity(kw1, kw2, para1, para2):
             # 关键词重叠率（权重60%）
             kw_sim = keyword_overlap(kw1, kw2)
-            # 字符级相似度（权重40%）
-            char_sim = char_similarity(para1, para2)
+            # 字符级相似度（权重40%，忽略短文本）；上界不足以达到阈值时跳过昂贵的 ratio() 计算
+            if len(para1) >= 10 and len(para2) >= 10:
+                matcher = SequenceMatcher(None, para1, para2)
+                if kw_sim * 0.6 + matcher.quick_ratio() * 0.4 < 0.35:
+                    return kw_sim * 0.6
+                char_sim = matcher.ratio()
+            else:
+                char_sim = 0
             # 综合相似度（阈值提高到0.35）
             return kw_sim * 0.6 + char_sim * 0.4
 
-        # --------------------- 段落匹配主逻辑 ---------------------
-        for i, (para1, kw1) in enumerate(zip(processed_paragraphs1, keywords1)):
-            if len(para1.split()) < 5:  # 增加段落长度阈值
+        # --------------------- 候选段落对筛选（MinHash + LSH） ---------------------
+        # 只有在 LSH 中碰撞的段落对（字符层面可能相似）才进入精确打分；
+        # 未碰撞的段落对字符相似度可视为不超过阈值，只有关键词重叠率足够高时才可能达到 0.35，
+        # 这部分通过关键词倒排索引补充，避免漏掉“换说法但关键词一致”的段落
+        lsh = self.segment_lsh if lsh_threshold is None else MinHashLSH(threshold=lsh_threshold)
+        valid1 = [p if len(p.split()) >= 5 else '' for p in processed_paragraphs1]  # 增加段落长度阈值
+        valid2 = [p if len(p.split()) >= 5 else '' for p in processed_paragraphs2]
+        candidates = lsh.candidate_pairs(valid1, valid2)
+
+        min_keyword_overlap = (0.35 - 0.4 * lsh.threshold) / 0.6
+        keyword_index = defaultdict(set)
+        for j, kw2 in enumerate(keywords2):
+            if valid2[j]:
+                for word, _ in kw2:
+                    keyword_index[word].add(j)
+        for i, kw1 in enumerate(keywords1):
+            if not valid1[i]:
                 continue
-                
-            for j, (para2, kw2) in enumerate(zip(processed_paragraphs2, keywords2)):
-                if len(para2.split()) < 5:
-                    continue
-                    
-                # 计算综合相似度
-                sim = combined_similarity(kw1, kw2, para1, para2)
-                if sim >= 0.35:  # 提高相似度阈值
-                    # 提取当前段落的关键词集合
-                    current_keywords = set(word for word, _ in kw1 + kw2)
-                    
-                    # 标记关键词最多的句子
-                    marked_original1 = mark_keyword_sentences(original_paragraphs1[i], current_keywords)
-                    marked_original2 = mark_keyword_sentences(original_paragraphs2[j], current_keywords)
-                    
-                    similar_pairs.append({
-                        'index1': i,
-                        'index2': j,
-                        'similarity': sim,
-                        'original1': original_paragraphs1[i],
-                        'original2': original_paragraphs2[j],
-                        'marked_original1': marked_original1,
-                        'marked_original2': marked_original2
-                    })
+            related = set()
+            for word, _ in kw1:
+                related |= keyword_index.get(word, set())
+            for j in related:
+                if (i, j) not in candidates and keyword_overlap(kw1, keywords2[j]) >= min_keyword_overlap:
+                    candidates.add((i, j))
+
+        logger.info(f"LSH 候选段落对 {len(candidates)} 个（全量 {len(processed_paragraphs1) * len(processed_paragraphs2)} 个）")
+
+        # --------------------- 段落匹配主逻辑 ---------------------
+        for i, j in sorted(candidates):
+            para1, kw1 = processed_paragraphs1[i], keywords1[i]
+            para2, kw2 = processed_paragraphs2[j], keywords2[j]
+
+            # 计算综合相似度
+            sim = combined_similarity(kw1, kw2, para1, para2)
+            if sim >= 0.35:  # 提高相似度阈值
+                # 提取当前段落的关键词集合
+                current_keywords = set(word for word, _ in kw1 + kw2)
+
+                # 标记关键词最多的句子
+                marked_original1 = mark_keyword_sentences(original_paragraphs1[i], current_keywords)
+                marked_original2 = mark_keyword_sentences(original_paragraphs2[j], current_keywords)
+                spans1, spans2 = matched_spans(i, j)
+
+                similar_pairs.append({
+                    'index1': i,
+                    'index2': j,
+                    'similarity': sim,
+                    'original1': original_paragraphs1[i],
+                    'original2': original_paragraphs2[j],
+                    'marked_original1': marked_original1,
+                    'marked_original2': marked_original2,
+                    'spans1': spans1,
+                    'spans2': spans2
+                })
 
         # --------------------- 结果去重与排序 ---------------------
         unique_pairs = []
@@ -964,24 +1299,25 @@ class PaperService:
             # 改进的去重逻辑：基于段落内容相似度
             key1 = (pair['index1'], pair['index2'])
             key2 = (pair['index2'], pair['index1'])
-            
+            if key1 in seen or key2 in seen:
+                continue
+
             # 检查是否已存在相似内容
             original1 = pair['original1'].strip()
             original2 = pair['original2'].strip()
-            
-            # 计算原始文本的相似度
-            original_sim = SequenceMatcher(None, original1, original2).ratio()
-            
+
+            # 计算原始文本的相似度（先用廉价的上界过滤，只有可能超过 0.95 时才算精确值）
+            matcher = SequenceMatcher(None, original1, original2)
+
             # 如果两段文本几乎相同，只保留一个
-            if original_sim > 0.95:
+            if matcher.real_quick_ratio() > 0.95 and matcher.quick_ratio() > 0.95 and matcher.ratio() > 0.95:
                 continue
-                
-            if key1 not in seen and key2 not in seen:
-                seen.add(key1)
-                seen.add(key2)
-                unique_pairs.append(pair)
-                if len(unique_pairs) >= 100:  # 减少最大保留数量
-                    break
+
+            seen.add(key1)
+            seen.add(key2)
+            unique_pairs.append(pair)
+            if len(unique_pairs) >= 100:  # 减少最大保留数量
+                break
 
         logger.info(f"找到 {len(unique_pairs)} 个相似段落对（关键词语义匹配模式）")
 
@@ -992,45 +1328,57 @@ class PaperService:
             segments1.append({
                 'content': pair['original1'],
                 'marked_content': pair['marked_original1'],
+                'matched_spans': pair['spans1'],  # 与对比段落字面相同的片段在 content 中的 [起, 止) 偏移
                 'similarity': round(pair['similarity'], 2),
                 'matched_with': pair['index2']
             })
             segments2.append({
                 'content': pair['original2'],
                 'marked_content': pair['marked_original2'],
+                'matched_spans': pair['spans2'],
                 'similarity': round(pair['similarity'], 2),
                 'matched_with': pair['index1']
             })
         logger.info("提取的相似片段 - 文本1: %s, 文本2: %s", segments1, segments2)
         return segments1, segments2
         
-    def check_local_plagiarism(self, file1, file2,user_id):
-        """本地文件查重"""
+    def check_local_plagiarism(self, file1, file2,user_id, paper_id1=None, paper_id2=None):
+        """本地文件查重（两侧均可用已上传论文的 paper_id 代替文件）"""
+        filename1 = file1.filename if file1 else None
         try:
             # 提取文件内容
             logger.info('begin local check')
-            file_ext1 = file1.filename.split('.')[-1].lower()
-            paper_content1 = self._extract_file_content(file1, file_ext1)
-            file_ext2 = file2.filename.split('.')[-1].lower()
-            paper_content2 = self._extract_file_content(file2, file_ext2)
-            filename=file1.name
+            contents = []
+            for file, paper_id in ((file1, paper_id1), (file2, paper_id2)):
+                if (not file or not file.filename) and paper_id:
+                    content, name, error = self._load_stored_paper(paper_id)
+                    if error:
+                        return {'code': 400, 'message': error, 'data': None}
+                else:
+                    name = file.filename
+                    content = self._extract_file_content(file, name.split('.')[-1].lower())
+                contents.append((content, name))
+            (paper_content1, filename1), (paper_content2, filename2) = contents
+            filename = file1.name if file1 else filename1
             if not paper_content1 or not paper_content2:
                 return {
                     'code': 400,
                     'message': '文件内容为空，无法查重',
                     'data': None
                 }
+            document1 = self.analyze(paper_content1)
+            document2 = self.analyze(paper_content2)
             # 计算相似度
-            similarity = self._calculate_advanced_similarity(paper_content1, paper_content2)
+            similarity = self._calculate_advanced_similarity(document1, document2)
             similarity = float(similarity)  # 新增这一行s
             # 提取相似片段
             similar_segments_text1, similar_segments_text2 = self._extract_similar_segments(
-                paper_content1, paper_content2
+                document1, document2
             )
 
             comparison_results = [
                 {
-                    'article_title': file2.filename,
+                    'article_title': filename2,
                     'similarity_rate': round(similarity, 2),
                     'url': '',
                     'authors': '',
@@ -1058,7 +1406,7 @@ class PaperService:
                 'message': '查重完成（本地文件对比）',
                 'data': {
                     'comprehensive_similarity': round(avg_similarity, 2),
-                    'paper_title': file1.filename,
+                    'paper_title': filename1,
                     'comparison_results': comparison_results,
                     'keywords': [],
                     'num_articles': len(comparison_results),
@@ -1074,7 +1422,7 @@ class PaperService:
                 'message': f'查重过程出错：{str(e)}',
                 'data': {
                     'comprehensive_similarity': 0,
-                    'paper_title': file1.filename,
+                    'paper_title': filename1,
                     'comparison_results': [],
                     'keywords': [],
                     'num_articles': 0,
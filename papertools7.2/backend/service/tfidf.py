@@ -0,0 +1,245 @@
+# backend/service/tfidf.py
+"""
+基于本地论文库 IDF 的稀疏 TF-IDF 向量
+
+- 词表：词 -> 整数 ID，文档频率（DF）按 ID 存放在数组中
+- 文档向量：按 ID 排序的 int 数组 + 对应权重（L2 归一化），多篇文档按 CSR 格式拼接
+- 相似度：查询向量与候选矩阵的稀疏点积（余弦），所有候选一次完成
+DF 统计保存在 SQLite 中（多个 worker 进程共享）：上传论文时增量更新，删除论文时扣减，每次只写入变化的词；
+每条记录带修改版本号，各 worker 刷新时只读取自己上次加载之后变化的记录，不重新加载整份统计
+"""
+import os
+import sqlite3
+import threading
+from collections import namedtuple
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+import numpy as np
+
+from config.config import TFIDF_STATS_PATH
+from config.logging_config import logger
+
+# 稀疏向量：排序后的词 ID 与权重
+SparseVector = namedtuple('SparseVector', ['indices', 'values'])
+# 按行拼接的稀疏矩阵（CSR）：第 i 行为 indices/values[indptr[i]:indptr[i+1]]
+SparseMatrix = namedtuple('SparseMatrix', ['indptr', 'indices', 'values'])
+
+
+class CorpusStatistics:
+    """本地论文库的词表与文档频率（SQLite 持久化，内存中保存词表和 DF 数组）"""
+
+    def __init__(self, path: str = TFIDF_STATS_PATH):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        # 词只增不删，rowid 连续递增，词 ID 取 rowid - 1
+        self._conn.execute('CREATE TABLE IF NOT EXISTS terms ('
+                           'id INTEGER PRIMARY KEY, term TEXT NOT NULL UNIQUE, df INTEGER NOT NULL, version INTEGER NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_terms_version ON terms (version)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS docs ('
+                           'doc_id PRIMARY KEY, present INTEGER NOT NULL, version INTEGER NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_docs_version ON docs (version)')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value INTEGER NOT NULL)')
+        self._conn.execute("INSERT OR IGNORE INTO meta (key, value) VALUES ('version', 0)")
+        self.vocabulary = {}        # 词 -> ID
+        self._df = np.zeros(1024, dtype=np.int64)
+        self.doc_ids = set()
+        self._version = 0  # 已加载到的修改版本
+        self.refresh()
+
+    def __contains__(self, doc_id):
+        return doc_id in self.doc_ids
+
+    @property
+    def num_docs(self) -> int:
+        return len(self.doc_ids)
+
+    def _current_version(self) -> int:
+        return self._conn.execute("SELECT value FROM meta WHERE key = 'version'").fetchone()[0]
+
+    def refresh(self):
+        """读取其他 worker（或本进程）上次加载之后写入的变化"""
+        with self._lock:
+            try:
+                version = self._current_version()
+                if version == self._version:
+                    return
+                terms = self._conn.execute('SELECT id, term, df FROM terms WHERE version > ? ORDER BY id',
+                                           (self._version,)).fetchall()
+                docs = self._conn.execute('SELECT doc_id, present FROM docs WHERE version > ?',
+                                          (self._version,)).fetchall()
+            except sqlite3.Error as e:
+                logger.warning(f"加载 TF-IDF 语料统计失败，使用已有统计: {str(e)}")
+                return
+            # 词表只追加：向量化期间持有的旧引用中已有词的 ID 不变；DF 数组整体替换
+            df = self._df
+            max_id = terms[-1][0] if terms else 0
+            if max_id > len(df):
+                df = np.zeros(max(max_id, len(df) * 2), dtype=np.int64)
+                df[:len(self._df)] = self._df
+            else:
+                df = df.copy()
+            for rowid, term, count in terms:
+                self.vocabulary.setdefault(term, rowid - 1)
+                df[rowid - 1] = count
+            doc_ids = set(self.doc_ids)
+            for doc_id, present in docs:
+                if present:
+                    doc_ids.add(doc_id)
+                else:
+                    doc_ids.discard(doc_id)
+            self._df, self.doc_ids, self._version = df, doc_ids, version
+
+    def _write(self, apply):
+        """在一个写事务中修改统计（BEGIN IMMEDIATE 跨进程互斥），提升版本号后读取变化"""
+        with self._lock:
+            try:
+                self._conn.execute('BEGIN IMMEDIATE')
+                try:
+                    version = self._current_version() + 1
+                    if apply(version):
+                        self._conn.execute("UPDATE meta SET value = ? WHERE key = 'version'", (version,))
+                    self._conn.execute('COMMIT')
+                except BaseException:
+                    self._conn.execute('ROLLBACK')
+                    raise
+            except sqlite3.Error as e:
+                logger.warning(f"更新 TF-IDF 语料统计失败: {str(e)}")
+            self.refresh()
+
+    def _is_present(self, doc_id) -> bool:
+        row = self._conn.execute('SELECT present FROM docs WHERE doc_id = ?', (doc_id,)).fetchone()
+        return bool(row and row[0])
+
+    def add_document(self, doc_id, terms: Iterable[str]):
+        """把一篇论文的词（去重后）计入文档频率；重复添加同一篇论文会被忽略"""
+        self.add_documents([(doc_id, terms)])
+
+    def add_documents(self, documents: Iterable[Tuple[object, Iterable[str]]]):
+        """批量计入多篇论文（一个事务；调用方应先算好各篇的词，避免持锁期间读取论文）"""
+        documents = list(documents)
+
+        def apply(version):
+            changed = False
+            for doc_id, terms in documents:
+                if self._is_present(doc_id):
+                    continue
+                rows = [(term, version) for term in set(terms)]
+                self._conn.executemany('INSERT OR IGNORE INTO terms (term, df, version) VALUES (?, 0, ?)', rows)
+                self._conn.executemany('UPDATE terms SET df = df + 1, version = ? WHERE term = ?',
+                                       [(version, term) for term, _ in rows])
+                self._conn.execute('INSERT OR REPLACE INTO docs (doc_id, present, version) VALUES (?, 1, ?)',
+                                   (doc_id, version))
+                changed = True
+            return changed
+
+        self._write(apply)
+
+    def remove_document(self, doc_id, terms: Iterable[str]):
+        """从文档频率中扣除一篇论文的词"""
+        terms = set(terms)
+
+        def apply(version):
+            if not self._is_present(doc_id):
+                return False
+            self._conn.executemany('UPDATE terms SET df = MAX(df - 1, 0), version = ? WHERE term = ?',
+                                   [(version, term) for term in terms])
+            self._conn.execute('UPDATE docs SET present = 0, version = ? WHERE doc_id = ?', (version, doc_id))
+            return True
+
+        self._write(apply)
+
+    def snapshot(self):
+        """返回 (词表, DF 数组, 文档数)：刷新时词表只追加、DF 数组整体替换，向量化期间引用保持一致"""
+        with self._lock:
+            return self.vocabulary, self._df, self.num_docs
+
+    @staticmethod
+    def idf(df: np.ndarray, num_docs: int) -> np.ndarray:
+        """平滑 IDF：log((1 + N) / (1 + df)) + 1"""
+        return np.log((1.0 + num_docs) / (1.0 + df)) + 1.0
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {'documents': self.num_docs, 'vocabulary': len(self.vocabulary)}
+
+
+class TfidfVectorizer:
+    """把词频转换为 L2 归一化的稀疏 TF-IDF 向量（TF 取 1 + log(tf)）"""
+
+    def __init__(self, corpus: CorpusStatistics):
+        self.corpus = corpus
+
+    def transform_many(self, term_counts_list: List[Mapping[str, int]]) -> SparseMatrix:
+        """
+        批量向量化
+        语料库外的词在本批次内临时分配 ID（>= 词表大小），不写入词表
+        """
+        self.corpus.refresh()
+        vocabulary, df_table, num_docs = self.corpus.snapshot()
+        base = len(vocabulary)
+        extra = {}
+        indptr = [0]
+        all_ids, all_tf = [], []
+        for term_counts in term_counts_list:
+            row = {}
+            for term, count in term_counts.items():
+                idx = vocabulary.get(term)
+                if idx is None or idx >= base:
+                    idx = extra.setdefault(term, base + len(extra))
+                row[idx] = row.get(idx, 0) + count
+            ids = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+            tf = np.fromiter(row.values(), dtype=np.float64, count=len(row))
+            order = np.argsort(ids)
+            all_ids.append(ids[order])
+            all_tf.append(tf[order])
+            indptr.append(indptr[-1] + len(row))
+
+        indices = np.concatenate(all_ids) if all_ids else np.zeros(0, dtype=np.int64)
+        tf = np.concatenate(all_tf) if all_tf else np.zeros(0, dtype=np.float64)
+        known = indices < base  # 语料库外的词 df 视为 0
+        df = np.zeros(len(indices), dtype=np.float64)
+        df[known] = df_table[indices[known]]
+        values = (1.0 + np.log(np.maximum(tf, 1.0))) * CorpusStatistics.idf(df, num_docs)
+
+        # 按行做 L2 归一化
+        indptr = np.asarray(indptr, dtype=np.int64)
+        rows = np.repeat(np.arange(len(indptr) - 1), np.diff(indptr))
+        norms = np.sqrt(np.bincount(rows, weights=values ** 2, minlength=len(indptr) - 1))
+        values = values / np.where(norms > 0, norms, 1.0)[rows] if len(values) else values
+        return SparseMatrix(indptr, indices, values)
+
+    def transform(self, term_counts: Mapping[str, int]) -> SparseVector:
+        matrix = self.transform_many([term_counts])
+        return SparseVector(matrix.indices, matrix.values)
+
+    def similarities(self, query_counts: Mapping[str, int], candidate_counts: List[Mapping[str, int]]) -> np.ndarray:
+        """
+        查询文档与多篇候选文档的余弦相似度
+        查询与候选在同一批次向量化（临时 ID 一致），结果为一次稀疏点积
+        """
+        matrix = self.transform_many([query_counts] + list(candidate_counts))
+        return sparse_cosine(matrix)
+
+
+def sparse_cosine(matrix: SparseMatrix) -> np.ndarray:
+    """第 0 行与其余各行的点积（各行已归一化，即余弦相似度）"""
+    num_rows = len(matrix.indptr) - 1
+    if num_rows <= 1:
+        return np.zeros(0, dtype=np.float64)
+    q_end = matrix.indptr[1]
+    query_ids, query_values = matrix.indices[:q_end], matrix.values[:q_end]
+    cand_ids, cand_values = matrix.indices[q_end:], matrix.values[q_end:]
+    rows = np.repeat(np.arange(num_rows - 1), np.diff(matrix.indptr[1:]))
+
+    # 候选的每个非零项在查询的有序 ID 中二分查找
+    if len(query_ids) == 0 or len(cand_ids) == 0:
+        return np.zeros(num_rows - 1, dtype=np.float64)
+    pos = np.searchsorted(query_ids, cand_ids)
+    pos_clipped = np.minimum(pos, len(query_ids) - 1)
+    hit = query_ids[pos_clipped] == cand_ids
+    products = np.where(hit, cand_values * query_values[pos_clipped], 0.0)
+    return np.bincount(rows, weights=products, minlength=num_rows - 1)
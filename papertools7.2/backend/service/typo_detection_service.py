@@ -5,6 +5,12 @@ from typing import List, Dict, Tuple, Set, Union  # 补充 Tuple 等的导入
 from collections import defaultdict
 import pycorrector
 from pycorrector import Corrector  # 导入Corrector类
+from concurrent.futures.process import BrokenProcessPool
+from config.config import SPELL_CHECK_WORKERS, SPELL_MODEL_PRELOAD
+from utils.spell_shards import correct_errors, detect_with_cache, get_sharded_corrector, preloaded_corrector
+from utils.typo_cache import get_typo_cache
+from utils.text_normalization import TYPO_TEXT_RE, sentence_batches
+from utils.aho_corasick import AhoCorasick, IntervalIndex
 
 
 logger = logging.getLogger(__name__)
@@ -12,9 +18,14 @@ logger = logging.getLogger(__name__)
 TypoResult = Dict[str, Union[int, str, List[str]]]
 
 class Typo_Detection:
-    def __init__(self):
-        """初始化中文错字检测器，加载多维度错字字典"""
-        self.corrector = Corrector()
+    def __init__(self, use_process_pool: bool = SPELL_CHECK_WORKERS > 1 and not SPELL_MODEL_PRELOAD):
+        """
+        初始化中文错字检测器，加载多维度错字字典
+        :param use_process_pool: 语言模型检测交给按句分片的常驻进程池（本进程不加载 Corrector，仅在进程池不可用时兜底加载）；
+                                 预加载模式下默认关闭，直接使用 fork 前加载、各 worker 共享的 Corrector
+        """
+        self.use_process_pool = use_process_pool
+        self._corrector = None if use_process_pool else (preloaded_corrector() or Corrector())
         #self.corrector = pycorrector
         # 1. 同音字错字字典 (正确词: 错字集合)
         self.homophone_typos = {
@@ -59,9 +70,34 @@ class Typo_Detection:
             for typo in typos:
                 self.typo_dict[typo].add(correct)
         
-        # 5. 编译正则表达式 (匹配中文、英文、数字及部分常用标点)
-        self.typo_pattern = re.compile(r'[\u4e00-\u9fa5a-zA-Z0-9，。、？！：；,.!?;:]+')
+        # 5. 在错字字典上构建 Aho-Corasick 自动机：一次扫描找出所有错字，耗时与字典大小无关
+        self.typo_automaton = AhoCorasick(self.typo_dict)
+        
+        # 6. 编译正则表达式 (匹配中文、英文、数字及部分常用标点)
+        self.typo_pattern = TYPO_TEXT_RE
     
+    @property
+    def corrector(self) -> Corrector:
+        """本进程内的 Corrector（使用进程池时按需加载）"""
+        if self._corrector is None:
+            self._corrector = preloaded_corrector() or Corrector()
+        return self._corrector
+
+    def _corrector_errors(self, content: str):
+        """语言模型检测：按句查缓存，只有未缓存的句子做 correct()，位置为全文位置"""
+        if self.use_process_pool:
+            try:
+                return get_sharded_corrector().detect(content)
+            except BrokenProcessPool as e:
+                logger.warning(f"错字检测进程池不可用，在本进程检测: {str(e)}")
+        errors, _ = detect_with_cache(
+            content,
+            lambda shards: [correct_errors(self.corrector, shard) for shard in shards],
+            lambda checked_chars: max(checked_chars, 1),  # 本进程检测不需要切分，未命中的句子合成一片
+            get_typo_cache()
+        )
+        return errors
+
     def _get_context(self, content: str, start: int, length: int = 20) -> str:
         """获取错字上下文，标记错误位置"""
         try:
@@ -89,54 +125,55 @@ class Typo_Detection:
         results = []
     
         try:
-            # 1. 使用Corrector实例进行纠错
-            details = self.corrector.detect(content)
-            corrected_text = self.corrector.correct(content)
-            
-            # 处理检测结果
-            for item in details:
-                if item:
-                    start, end, wrong, correct = item
-                    results.append({
-                        'position': start,
-                        'wrong_word': wrong,
-                        'length': len(wrong),
-                        'suggestions': [correct],
-                        'context': self._get_context(content, start),
-                        'type': 'pycorrector'
-                    })
+            # 1. 使用Corrector进行纠错（按句分片并行，每个分片一次 correct() 同时得到位置和建议）
+            for error in self._corrector_errors(content):
+                results.append({
+                    'position': error.start,
+                    'wrong_word': error.wrong,
+                    'length': len(error.wrong),
+                    'suggestions': [error.correct],
+                    'context': self._get_context(content, error.start),
+                    'type': 'pycorrector'
+                })
         except Exception as e:
             logger.error(f"PyCorrector检测错误: {str(e)}")
             # fallback到自定义检测
             results = self._detect_typos_with_custom_dict(content)
         
-        # 2. 使用自定义词典检测专业领域错字
-        for word, correct_list in self.typo_dict.items():
-            pos = 0
-            while True:
-                pos = content.find(word, pos)
-                if pos == -1:
-                    break
-                # 检查是否未被pycorrector检测到
-                is_duplicate = any(
-                    r['position'] <= pos < r['position'] + r['length'] 
-                    for r in results
-                )
-                if not is_duplicate:
-                    results.append({
-                        'position': pos,
-                        'wrong_word': word,
-                        'length': len(word),
-                        'suggestions': list(correct_list),
-                        'context': self._get_context(content, pos),
-                        'type': self._get_error_type(word)
-                    })
-                pos += 1
+        # 2. 使用自定义词典检测专业领域错字（自动机单次扫描）
+        # 已有结果的区间按起点排序建索引，判断命中位置是否已被覆盖为 O(log n)；
+        # 自定义词典的命中按位置（同位置长词优先）处理，只需和已接受命中的最远终点比较
+        covered = IntervalIndex((r['position'], r['position'] + r['length']) for r in results)
+        custom_end = -1
+        for pos, word in self.typo_automaton.find_all(content):
+            if pos < custom_end or covered.covers(pos):
+                continue
+            results.append({
+                'position': pos,
+                'wrong_word': word,
+                'length': len(word),
+                'suggestions': list(self.typo_dict[word]),
+                'context': self._get_context(content, pos),
+                'type': self._get_error_type(word)
+            })
+            custom_end = pos + len(word)
         
         # 3. 合并结果
         results = self._merge_typo_results(results)
         return results
     
+    def iter_typo_batches(self, content: str, batch_chars: int):
+        """
+        按句分批检测，每批检测完立即返回 (批起点, 批终点, 该批错字)，错字位置和上下文均相对全文
+        批次在句子边界切分，错字不会跨批，结果与整篇检测一致
+        """
+        for batch in sentence_batches(content, batch_chars):
+            results = self._detect_typos(batch.text) if batch.text.strip() else []
+            for result in results:
+                result['position'] += batch.start
+                result['context'] = self._get_context(content, result['position'])
+            yield batch.start, batch.end, results
+
     def _merge_typo_results(self, results: List[Dict]) -> List[Dict]:
         """按位置合并重复的错字检测结果"""
         if not results:
@@ -167,44 +204,17 @@ class Typo_Detection:
         logger.info("使用自定义词典进行错字检测")
         results = []
     
-        # 1. 构建错字长度索引（从长到短检测，避免短错字覆盖长错字）
-        typo_lengths = sorted(set(len(word) for word in self.typo_dict.keys()), reverse=True)
-    
-        # 2. 按长度从长到短检测错字
-        for length in typo_lengths:
-            # 生成匹配指定长度的正则表达式
-            pattern = rf'(\w{{{length}}})'
-            for match in re.finditer(pattern, content):
-                word = match.group(1)
-                if word in self.typo_dict:
-                    position = match.start()
-                    results.append({
-                    'position': position,
-                    'wrong_word': word,
-                    'length': len(word),
-                    'suggestions': list(self.typo_dict[word]),
-                    'context': self._get_context(content, position),
-                    'type': self._get_error_type(word)
-                    })
-                    logger.debug(f"自定义词典检测到错字: '{word}'，位置: {position}")
-    
-        # 3. 处理长度为1的错字（单独处理）
-        for match in re.finditer(r'(\w)', content):
-            word = match.group(1)
-            if word in self.typo_dict and len(word) == 1:
-                position = match.start()
-                results.append({
-                'position': position,
-                'wrong_word': word,
-                'length': 1,
-                'suggestions': list(self.typo_dict[word]),
-                'context': self._get_context(content, position),
-                'type': self._get_error_type(word)
-                })
-    
-        # 4. 按位置排序结果
-        if results:
-            results.sort(key=lambda x: x['position'])
+        # 自动机单次扫描找出所有错字（按位置排序，同一位置长错字在前，避免短错字覆盖长错字）
+        for position, word in self.typo_automaton.find_all(content):
+            results.append({
+            'position': position,
+            'wrong_word': word,
+            'length': len(word),
+            'suggestions': list(self.typo_dict[word]),
+            'context': self._get_context(content, position),
+            'type': self._get_error_type(word)
+            })
+            logger.debug(f"自定义词典检测到错字: '{word}'，位置: {position}")
     
         logger.info(f"自定义词典检测完成，共发现 {len(results)} 个错字")
         return results
\ No newline at end of file
@@ -0,0 +1,52 @@
+# test_aho_corasick.py
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils.aho_corasick import AhoCorasick, IntervalIndex
+
+
+def naive_matches(patterns, text):
+    return sorted(((i, p) for p in set(patterns) if p for i in range(len(text)) if text.startswith(p, i)),
+                  key=lambda m: (m[0], -len(m[1])))
+
+
+def test_overlapping_and_nested_patterns():
+    patterns = ['按装', '安装', '装置', '按装置', '置', '按', '', '按装']  # 重复和空模式串被忽略
+    automaton = AhoCorasick(patterns)
+    assert len(automaton) == 6
+    text = '请按装置说明按装安装包'
+    assert automaton.find_all(text) == naive_matches(patterns, text)
+    assert automaton.find_all(text)[:4] == [(1, '按装置'), (1, '按装'), (1, '按'), (2, '装置')]
+    ends = [start + len(p) for start, p in automaton.iter_matches(text)]
+    assert ends == sorted(ends)  # 按结束位置顺序返回
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_random_dictionary_matches_naive_scan(seed):
+    rng = random.Random(seed)
+    alphabet = '甲乙丙丁ab'
+    patterns = [''.join(rng.choice(alphabet) for _ in range(rng.randint(1, 4))) for _ in range(30)]
+    text = ''.join(rng.choice(alphabet) for _ in range(300))
+    assert AhoCorasick(patterns).find_all(text) == naive_matches(patterns, text)
+
+
+def test_interval_index_with_overlapping_intervals():
+    index = IntervalIndex([(10, 20), (12, 14), (30, 31), (5, 8), (15, 25)])
+    covered = {pos for pos in range(40) if index.covers(pos)}
+    assert covered == set(range(5, 8)) | set(range(10, 25)) | {30}
+    # 被长区间包含的短区间不影响后面位置的判断
+    assert IntervalIndex([(0, 100), (1, 2)]).covers(50)
+    assert not IntervalIndex([]).covers(0)
+
+
+@pytest.mark.parametrize('seed', range(10))
+def test_interval_index_matches_naive(seed):
+    rng = random.Random(seed)
+    intervals = [(s, s + rng.randint(0, 10)) for s in (rng.randint(0, 100) for _ in range(20))]
+    index = IntervalIndex(intervals)
+    for pos in range(-5, 120):
+        assert index.covers(pos) == any(s <= pos < e for s, e in intervals)
@@ -0,0 +1,76 @@
+# test_batch_spell_check.py
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BACKEND_DIR, os.path.dirname(BACKEND_DIR)]  # service 包经 backend.dao 导入
+from service import batch_spell_check
+from service.batch_spell_check import BatchSpellChecker
+
+
+class FakeEngine:
+    """用线程池模拟常驻检测进程池，记录同时执行的任务数"""
+
+    def __init__(self, workers=4):
+        self.workers = workers
+        self._executor = ThreadPoolExecutor(max_workers=workers)
+        self._lock = threading.Lock()
+        self.running = 0
+        self.peak = 0
+
+    def submit(self, fn, *args):
+        def run():
+            with self._lock:
+                self.running += 1
+                self.peak = max(self.peak, self.running)
+            try:
+                return fn(*args)
+            finally:
+                with self._lock:
+                    self.running -= 1
+        return self._executor.submit(run)
+
+
+def fake_check(job):
+    time.sleep(job.get('sleep', 0.05))
+    return {'status': 'ok', 'total_chars': len(job['text']), 'typos': [], 'extract_seconds': 0, 'detect_seconds': 0}
+
+
+def test_batch_uses_bounded_share_and_keeps_order(monkeypatch):
+    monkeypatch.setattr(batch_spell_check, '_check_document', fake_check)
+    engine = FakeEngine(workers=4)
+    checker = BatchSpellChecker(engine, max_jobs=2)
+    results = checker.check([{'text': 'x' * n} for n in range(1, 9)], timeout=10)
+    assert [r['total_chars'] for r in results] == list(range(1, 9))
+    assert engine.peak == 2  # 其余进程留给单篇检测
+    assert checker.get_stats()['documents'] == 8
+
+
+def test_batch_timeout_marks_remaining_documents_without_resetting_engine(monkeypatch):
+    monkeypatch.setattr(batch_spell_check, '_check_document', fake_check)
+    engine = FakeEngine(workers=2)  # 没有 reset/重建接口：超时不应触碰共享进程池
+    checker = BatchSpellChecker(engine, max_jobs=1)
+    results = checker.check([{'text': 'a', 'sleep': 0.05}, {'text': 'b', 'sleep': 1}, {'text': 'c'}], timeout=0.4)
+    assert [r['status'] for r in results] == ['ok', 'timeout', 'timeout']
+    time.sleep(1)
+    assert checker._slots.acquire(timeout=0)  # 超时任务结束后份额已归还
+
+
+def test_doc_jobs_are_converted_before_detection(monkeypatch):
+    monkeypatch.setattr(batch_spell_check, '_check_document', fake_check)
+
+    def fake_extract(job):
+        if job['source'] == 'broken.doc':
+            raise ValueError('文档结构损坏')
+        return {'text': 'doc text', 'extract_seconds': 0}
+
+    monkeypatch.setattr(batch_spell_check, '_extract_doc_job', fake_extract)
+    checker = BatchSpellChecker(FakeEngine(workers=2), max_jobs=2)
+    results = checker.check([{'source': 'a.doc', 'file_ext': 'doc'}, {'text': 'txt'},
+                             {'source': 'broken.doc', 'file_ext': 'doc'}], timeout=5)
+    assert [r['status'] for r in results] == ['ok', 'ok', 'failed']
+    assert results[0]['total_chars'] == len('doc text')
+    assert '文档结构损坏' in results[2]['error']
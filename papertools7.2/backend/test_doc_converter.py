@@ -0,0 +1,119 @@
+# test_doc_converter.py
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils import doc_converter
+from utils.doc_converter import (
+    DocConversionTimeout, DocConverterPool, DocFormatError, _CompoundFile, read_doc_text
+)
+
+REPO_ROOT = os.path.abspath(os.path.join(os.path.dirname(__file__), '..', '..'))
+# WPS 写出的 .doc：文件末尾的扇区不完整（文件大小 % 512 = 341）
+WPS_DOC = os.path.join(REPO_ROOT, '万卷书系统设计说明书.doc')
+
+
+@pytest.mark.skipif(not os.path.exists(WPS_DOC), reason='示例文档不存在')
+def test_read_doc_with_truncated_last_sector():
+    assert os.path.getsize(WPS_DOC) % 512 != 0
+    text = read_doc_text(WPS_DOC)
+    assert '软件系统设计说明书' in text
+    assert len(text) > 10000
+
+
+@pytest.mark.skipif(not os.path.exists(WPS_DOC), reason='示例文档不存在')
+def test_sector_past_end_of_file_is_rejected():
+    with open(WPS_DOC, 'rb') as f:
+        data = f.read()
+    cfb = _CompoundFile(data)
+    past_end = len(data) // cfb.sector_size + 1
+    with pytest.raises(DocFormatError):
+        cfb._sector(past_end)
+    last = cfb._sector(past_end - 2)
+    assert len(last) == cfb.sector_size
+
+
+def fake_convert(path):
+    """文件名含 slow 时模拟卡住的转换，含 busy 时耗时 1 秒"""
+    if 'slow' in path:
+        time.sleep(30)
+    if 'busy' in path:
+        time.sleep(1)
+    if 'bad' in path:
+        raise ValueError(path)
+    return 'ole', f'text of {path}:{os.getpid()}'
+
+
+@pytest.fixture
+def converter(monkeypatch):
+    monkeypatch.setattr(doc_converter, '_convert_doc', fake_convert)
+    pools = []
+
+    def make(**kwargs):
+        pool = DocConverterPool(**kwargs)
+        pool._context = multiprocessing.get_context('fork')  # 工作进程继承替换后的转换函数
+        pools.append(pool)
+        return pool
+
+    yield make
+    for pool in pools:
+        for worker in pool._idle:
+            worker.stop()
+
+
+needs_fork = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='需要 fork 启动方式')
+
+
+@needs_fork
+def test_timeout_replaces_only_the_stuck_worker(converter):
+    pool = converter(workers=2, timeout=10)
+    other = {}
+
+    def other_document():  # 与卡住的任务同时在另一个进程中转换
+        other['text'] = pool.convert('busy.doc')
+
+    thread = threading.Thread(target=other_document)
+    thread.start()
+    time.sleep(0.2)
+    with pytest.raises(DocConversionTimeout):
+        pool.convert('slow.doc', timeout=0.5)
+    thread.join()
+    assert other['text'].startswith('text of busy.doc')
+
+    busy_pid = int(other['text'].rsplit(':', 1)[1])
+    start = time.perf_counter()
+    texts = [pool.convert('a.doc'), pool.convert('b.doc')]
+    assert time.perf_counter() - start < 5
+    assert busy_pid in {int(text.rsplit(':', 1)[1]) for text in texts}  # 未超时的进程继续使用
+    stats = pool.get_stats()
+    assert stats['timeouts'] == 1 and stats['replaced_workers'] == 1 and stats['completed'] == 3
+
+
+@needs_fork
+def test_waiting_for_a_busy_worker_times_out_without_killing_it(converter):
+    pool = converter(workers=1, timeout=10)
+    other = {}
+    thread = threading.Thread(target=lambda: other.setdefault('text', pool.convert('busy.doc')))
+    thread.start()
+    time.sleep(0.2)
+    with pytest.raises(DocConversionTimeout):
+        pool.convert('a.doc', timeout=0.3)
+    thread.join()
+    assert other['text'].startswith('text of busy.doc')
+    assert pool.get_stats()['replaced_workers'] == 0
+
+
+@needs_fork
+def test_worker_errors_and_max_tasks(converter):
+    pool = converter(workers=1, max_tasks=2)
+    with pytest.raises(ValueError):
+        pool.convert('bad.doc')
+    first = pool.convert('a.doc').rsplit(':', 1)[1]
+    second = pool.convert('b.doc').rsplit(':', 1)[1]
+    assert first != second  # 处理满 max_tasks 个文件后替换
+    assert pool.get_stats()['failed'] == 1
@@ -0,0 +1,88 @@
+# test_document_extractor.py
+import multiprocessing
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils import document_extractor
+from utils.document_extractor import _extract_in_pool, extract_pdf
+
+pytestmark = pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='需要 fork 启动方式')
+
+
+def fake_page_count(path, engine):
+    return 40 if 'long' in path else 3
+
+
+def fake_pages(path, engine, start=0, end=None):
+    """文件名含 slow 时每页耗时 0.2 秒"""
+    for i in range(start, end):
+        if 'slow' in path:
+            time.sleep(0.2)
+        yield f'{path}-{i}'
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(document_extractor, 'iter_pdf_pages', fake_pages)
+    monkeypatch.setattr(document_extractor, '_pdf_page_count', fake_page_count)
+    pool = ProcessPoolExecutor(max_workers=2, mp_context=multiprocessing.get_context('fork'))  # 工作进程继承替换后的函数
+    yield pool
+    pool.shutdown(wait=True, cancel_futures=True)
+
+
+def test_budget_overrun_stops_only_that_document(pool, monkeypatch):
+    monkeypatch.setattr(document_extractor, 'PDF_PAGES_PER_TASK', 10)
+    other = {}
+
+    def other_document():  # 与超时文档共用进程池
+        other['result'] = _extract_in_pool(pool, 'long', 'pdfplumber', time.perf_counter() + 30)
+
+    start = time.perf_counter()
+    texts, complete = _extract_in_pool(pool, 'long-slow', 'pdfplumber', time.perf_counter() + 1)
+    elapsed = time.perf_counter() - start
+    thread = threading.Thread(target=other_document)
+    thread.start()
+    thread.join(10)
+
+    assert not complete and elapsed < 2
+    assert 0 < sum(1 for text in texts if text) < 40
+    assert all(text in ('', f'long-slow-{i}') for i, text in enumerate(texts))
+    assert other['result'] == ([f'long-{i}' for i in range(40)], True)  # 进程池未被终止，其他文档照常提取
+
+
+def test_short_document_runs_as_one_task_in_pool(pool):
+    submitted = []
+    submit = pool.submit
+
+    def record(fn, *args):
+        submitted.append(fn.__name__)
+        return submit(fn, *args)
+
+    pool.submit = record
+    assert _extract_in_pool(pool, 'short', 'pdfplumber', time.perf_counter() + 10) == (['short-0', 'short-1', 'short-2'], True)
+    assert submitted == ['_count_pdf_pages', '_extract_pdf_pages']
+
+
+def test_broken_pool_is_discarded_and_extracted_in_process(monkeypatch):
+    class BrokenPool:
+        def submit(self, *args):
+            raise BrokenProcessPool('工作进程已退出')
+
+        def shutdown(self, wait=True, cancel_futures=False):
+            self.closed = True
+
+    broken = BrokenPool()
+    monkeypatch.setattr(document_extractor, 'iter_pdf_pages', fake_pages)
+    monkeypatch.setattr(document_extractor, '_pdf_page_count', fake_page_count)
+    monkeypatch.setattr(document_extractor, '_pool', broken)
+
+    result = extract_pdf('short', timeout=10)
+    assert result.text == 'short-0\nshort-1\nshort-2' and result.complete
+    assert document_extractor._pool is None and broken.closed
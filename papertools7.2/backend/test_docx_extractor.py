@@ -0,0 +1,72 @@
+# test_docx_extractor.py
+import io
+import os
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils.document_extractor import _iter_docx_part, extract_docx, iter_docx_paragraphs
+
+docx = pytest.importorskip('docx')
+from docx.enum.text import WD_BREAK
+
+W_NS = 'http://schemas.openxmlformats.org/wordprocessingml/2006/main'
+MC_NS = 'http://schemas.openxmlformats.org/markup-compatibility/2006'
+
+
+def old_extract(data: bytes) -> str:
+    """原来的实现：python-docx 构建文档对象后拼接正文段落"""
+    return '\n'.join(p.text for p in docx.Document(io.BytesIO(data)).paragraphs)
+
+
+def build_docx(table: bool = False) -> bytes:
+    document = docx.Document()
+    document.add_heading('基于指纹的论文查重', level=1)
+    paragraph = document.add_paragraph('第一段：')
+    paragraph.add_run('加粗的文字').bold = True
+    paragraph.add_run('\t制表符之后')
+    paragraph.add_run().add_break(WD_BREAK.LINE)
+    paragraph.add_run('换行之后')
+    document.add_paragraph('')
+    for i in range(200):
+        document.add_paragraph(f'第 {i} 段正文，English words & <special> chars.')
+    if table:
+        cells = document.add_table(rows=2, cols=2).cell
+        for r in range(2):
+            for c in range(2):
+                cells(r, c).text = f'单元格{r}{c}'
+        document.add_paragraph('表格之后的段落')
+    buffer = io.BytesIO()
+    document.save(buffer)
+    return buffer.getvalue()
+
+
+def test_matches_old_extractor_on_body_paragraphs(tmp_path):
+    data = build_docx()
+    path = tmp_path / 'paper.docx'
+    path.write_bytes(data)
+    expected = old_extract(data)
+    assert extract_docx(data).text == expected
+    assert extract_docx(str(path)).text == expected
+    assert extract_docx(io.BytesIO(data)).text == expected
+    assert '加粗的文字\t制表符之后\n换行之后' in expected
+
+
+def test_tables_are_included_in_document_order():
+    data = build_docx(table=True)
+    paragraphs = list(iter_docx_paragraphs(data))
+    body = '\n'.join(p for p in paragraphs if not p.startswith('单元格'))
+    assert body == old_extract(data)  # 其余段落与旧实现一致
+    cells = paragraphs.index('单元格00')
+    assert paragraphs[cells:cells + 5] == ['单元格00', '单元格01', '单元格10', '单元格11', '表格之后的段落']
+
+
+def test_textbox_fallback_is_not_duplicated():
+    xml = f'''<w:document xmlns:w="{W_NS}" xmlns:mc="{MC_NS}"><w:body>
+      <w:p><w:r><w:t>正文</w:t></w:r><w:r><mc:AlternateContent>
+        <mc:Choice><w:txbxContent><w:p><w:r><w:t>文本框</w:t></w:r></w:p></w:txbxContent></mc:Choice>
+        <mc:Fallback><w:txbxContent><w:p><w:r><w:t>文本框</w:t></w:r></w:p></w:txbxContent></mc:Fallback>
+      </mc:AlternateContent></w:r><w:r><w:t>继续</w:t></w:r></w:p>
+    </w:body></w:document>'''.encode('utf-8')
+    assert list(_iter_docx_part(io.BytesIO(xml))) == ['文本框', '正文继续']
@@ -0,0 +1,93 @@
+# test_extraction_cache.py
+import hashlib
+import io
+import os
+import sys
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils import document_extractor
+from utils.document_extractor import ExtractionResult, extract_document
+from utils.extraction_cache import ExtractionCache, sha256_of
+
+
+def test_sha256_of_all_source_types(tmp_path):
+    data = os.urandom(3 * 1024 * 1024 + 7)  # 多于一个读取块
+    path = tmp_path / 'paper.pdf'
+    path.write_bytes(data)
+    expected = hashlib.sha256(data).hexdigest()
+    stream = io.BytesIO(data)
+    stream.seek(10)
+    assert sha256_of(data) == sha256_of(str(path)) == expected
+    assert sha256_of(stream) == hashlib.sha256(data[10:]).hexdigest() and stream.tell() == 10
+
+
+def test_cache_round_trip_and_corrupt_entry(tmp_path):
+    cache = ExtractionCache(str(tmp_path))
+    entry = {'text': '论文', 'pages': [[0, 2]], 'paragraphs': [[0, 2]]}
+    cache.put('ab' * 32, 'docx-v2', entry)
+    assert cache.get('ab' * 32, 'docx-v2') == entry
+    assert cache.get('ab' * 32, 'docx-v1') is None  # 版本不同视为未命中
+
+    corrupt = cache._path('cd' * 32, 'docx-v2')
+    os.makedirs(os.path.dirname(corrupt))
+    with open(corrupt, 'wb') as f:
+        f.write(b'not zlib')
+    assert cache.get('cd' * 32, 'docx-v2') is None
+    assert cache.get_stats()['hits'] == 1 and cache.get_stats()['misses'] == 2
+
+
+def test_eviction_removes_least_recently_used(tmp_path):
+    cache = ExtractionCache(str(tmp_path), max_bytes=10 ** 9)
+    payload = {'text': os.urandom(2000).hex(), 'pages': [], 'paragraphs': []}
+    keys = [f'{i:064x}' for i in range(5)]
+    for i, key in enumerate(keys):
+        cache.put(key, 'pdfplumber-v1', payload)
+        os.utime(cache._path(key, 'pdfplumber-v1'), (time.time() - 100 + i, time.time() - 100 + i))
+    cache.get(keys[0], 'pdfplumber-v1')  # 最近使用
+    size = os.path.getsize(cache._path(keys[0], 'pdfplumber-v1'))
+    cache.max_bytes = size * 3
+    cache.evict(target_ratio=0.8)  # 保留 2 个
+    remaining = [key for key in keys if os.path.exists(cache._path(key, 'pdfplumber-v1'))]
+    assert remaining == [keys[0], keys[4]]
+
+
+@pytest.fixture
+def counted_docx(tmp_path, monkeypatch):
+    monkeypatch.setattr(document_extractor, '_cache', ExtractionCache(str(tmp_path / 'cache')))
+    calls = []
+
+    def fake_extract_docx(source):
+        calls.append(source)
+        text = f'第{len(calls)}次提取'
+        return ExtractionResult(text, [(0, len(text))], [(0, len(text))], complete=not os.fspath(source).endswith('partial.docx'))
+
+    monkeypatch.setattr(document_extractor, 'extract_docx', fake_extract_docx)
+    return calls
+
+
+def test_extract_document_is_keyed_by_content_and_version(tmp_path, monkeypatch, counted_docx):
+    first, copy = tmp_path / 'a.docx', tmp_path / 'b.docx'
+    first.write_bytes(b'same bytes')
+    copy.write_bytes(b'same bytes')
+
+    assert extract_document(str(first), 'docx').text == '第1次提取'
+    assert extract_document(str(copy), 'DOCX').text == '第1次提取'  # 内容相同的另一个文件命中缓存
+    assert extract_document(str(first), 'docx', content_hash=sha256_of(b'same bytes')).text == '第1次提取'
+    assert len(counted_docx) == 1
+
+    monkeypatch.setitem(document_extractor.EXTRACTOR_VERSIONS, 'docx', 99)  # 提升版本号：旧条目失效
+    assert extract_document(str(first), 'docx').text == '第2次提取'
+    assert extract_document(str(first), 'docx').text == '第2次提取'
+    assert len(counted_docx) == 2
+
+
+def test_incomplete_result_is_not_cached(tmp_path, counted_docx):
+    partial = tmp_path / 'partial.docx'
+    partial.write_bytes(b'big document')
+    assert not extract_document(str(partial), 'docx').complete
+    assert not extract_document(str(partial), 'docx').complete
+    assert len(counted_docx) == 2
+    assert extract_document(str(partial), 'rtf') is None
@@ -0,0 +1,116 @@
+# test_fingerprint_store.py
+import os
+import sys
+import threading
+
+import numpy as np
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils import fingerprint_store
+from utils.fingerprint_store import PersistentFingerprintIndex, _Segment, RECORD_DTYPE
+from utils.winnowing import Fingerprint
+
+
+def fingerprints(*hashes):
+    return [Fingerprint(h, i * 10, i * 10 + 5) for i, h in enumerate(hashes)]
+
+
+@pytest.fixture
+def index_dir(tmp_path):
+    return str(tmp_path / 'index')
+
+
+def test_add_query_remove(index_dir):
+    index = PersistentFingerprintIndex(index_dir)
+    index.add(1, fingerprints(11, 12, 13))
+    index.add(2, fingerprints(12, 13, 14))
+    hits = index.query(fingerprints(12, 13, 99), exclude=1)
+    assert [hit['doc_id'] for hit in hits] == [2]
+
+    index.remove(2)
+    assert 2 not in index and len(index) == 1
+    assert index.query(fingerprints(14)) == []
+    # 重新加载后状态一致
+    reloaded = PersistentFingerprintIndex(index_dir)
+    assert 1 in reloaded and 2 not in reloaded
+
+
+def test_empty_paper_survives_reload(index_dir):
+    PersistentFingerprintIndex(index_dir).add(5, [])
+    assert 5 in PersistentFingerprintIndex(index_dir)
+
+
+def test_readd_replaces_old_fingerprints(index_dir):
+    index = PersistentFingerprintIndex(index_dir)
+    index.add(1, fingerprints(11))
+    index.add(1, fingerprints(22))
+    assert index.query(fingerprints(11)) == []
+    assert [hit['doc_id'] for hit in index.query(fingerprints(22))] == [1]
+
+
+def test_compaction_keeps_live_docs_and_prunes_tombstones(index_dir):
+    index = PersistentFingerprintIndex(index_dir, merge_factor=100)
+    for doc in range(10):
+        index.add(doc, fingerprints(1000 + doc, 7))
+    for doc in range(0, 10, 2):
+        index.remove(doc)
+    index.compact()
+
+    stats = index.get_stats()
+    assert stats == {'segments': 1, 'records': 10, 'papers': 5, 'tombstones': 0}
+    reloaded = PersistentFingerprintIndex(index_dir)
+    assert sorted(hit['doc_id'] for hit in reloaded.query(fingerprints(7))) == [1, 3, 5, 7, 9]
+
+
+def test_tiered_compaction_merges_full_tiers_only(index_dir):
+    index = PersistentFingerprintIndex(index_dir, merge_factor=4)
+    for doc in range(4):
+        index.add(doc, fingerprints(doc))  # 第 4 个段触发第 0 层合并
+    assert index.get_stats()['segments'] == 1
+    index.add(4, fingerprints(4))
+    assert index.get_stats()['segments'] == 2
+    assert len(index) == 5
+
+
+def test_tier_uses_integer_arithmetic(index_dir):
+    index = PersistentFingerprintIndex(index_dir, merge_factor=10)
+    tiers = [index._tier(_Segment(0, np.zeros(n, dtype=RECORD_DTYPE), set())) for n in (0, 9, 10, 999, 1000)]
+    assert tiers == [0, 0, 1, 2, 3]
+
+
+def test_tombstone_after_compaction_in_other_worker(index_dir, monkeypatch):
+    """另一个 worker 合并写入了更新的段之后再删除：墓碑序号必须大于合并段，论文不能“复活”"""
+    stale = PersistentFingerprintIndex(index_dir, merge_factor=100)
+    other = PersistentFingerprintIndex(index_dir, merge_factor=100)
+    other.add(1, fingerprints(11))
+    other.add(2, fingerprints(12))
+    other.compact()
+
+    monkeypatch.setattr(fingerprint_store.time, 'time_ns', lambda: 1)  # 删除时的时钟早于合并段的序号
+    stale.remove(1)
+
+    fresh = PersistentFingerprintIndex(index_dir)
+    assert 1 not in fresh and len(fresh) == 1
+    assert fresh.query(fingerprints(11)) == []
+
+
+def test_concurrent_writers_with_compaction(index_dir):
+    def work(worker):
+        index = PersistentFingerprintIndex(index_dir, merge_factor=2)
+        for i in range(15):
+            doc = worker * 100 + i
+            index.add(doc, fingerprints(doc, 1))
+            if i % 3 == 0:
+                index.remove(doc)
+
+    threads = [threading.Thread(target=work, args=(w,)) for w in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    fresh = PersistentFingerprintIndex(index_dir)
+    expected = {w * 100 + i for w in range(4) for i in range(15) if i % 3}
+    assert {hit['doc_id'] for hit in fresh.query(fingerprints(1))} == expected
+    assert len(fresh) == len(expected)
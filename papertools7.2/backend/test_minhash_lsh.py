@@ -0,0 +1,72 @@
+# test_minhash_lsh.py
+import os
+import random
+import sys
+
+import numpy as np
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BACKEND_DIR, os.path.dirname(BACKEND_DIR)]  # service 包经 backend.dao 导入
+from service.minhash_lsh import MinHashLSH, char_shingles, optimal_bands
+
+CHARS = '的一是在不了有和人这中大为上个国我以要他时来用们生到作地于出就分对成会可也你'
+
+
+def shingle_set(text, k=3):
+    return {text[i:i + k] for i in range(len(text) - k + 1)}
+
+
+def jaccard(a, b):
+    a, b = shingle_set(a), shingle_set(b)
+    return len(a & b) / len(a | b)
+
+
+def mutate(rng, text, rate):
+    """按比例随机替换字符，得到不同相似度的改写段落"""
+    chars = list(text)
+    for i in rng.sample(range(len(chars)), int(len(chars) * rate)):
+        chars[i] = rng.choice(CHARS)
+    return ''.join(chars)
+
+
+def test_optimal_bands_divides_signature():
+    bands, rows = optimal_bands(64, 0.3)
+    assert bands * rows == 64
+    errors = {r: abs((1 / (64 // r)) ** (1 / r) - 0.3) for r in range(1, 65) if 64 % r == 0}
+    assert errors[rows] == min(errors.values())
+
+
+def test_signature_estimates_jaccard():
+    rng = random.Random(1)
+    lsh = MinHashLSH(num_perm=256)
+    base = ''.join(rng.choice(CHARS) for _ in range(300))
+    for rate in (0.02, 0.1, 0.3):
+        other = mutate(rng, base, rate)
+        estimate = np.mean(lsh.signature(base) == lsh.signature(other))
+        assert abs(estimate - jaccard(base, other)) < 0.1
+
+
+def test_candidate_recall_and_pruning():
+    rng = random.Random(2)
+    lsh = MinHashLSH()
+    paragraphs1 = [''.join(rng.choice(CHARS) for _ in range(120)) for _ in range(60)]
+    paragraphs2 = [mutate(rng, p, rng.choice((0.02, 0.05, 0.1))) for p in paragraphs1[:30]]
+    paragraphs2 += [''.join(rng.choice(CHARS) for _ in range(120)) for _ in range(30)]
+    paragraphs2.append('')
+
+    pairs = lsh.candidate_pairs(paragraphs1 + [''], paragraphs2)
+    similar = {(i, j) for i, p in enumerate(paragraphs1) for j, q in enumerate(paragraphs2)
+               if q and jaccard(p, q) >= 0.5}
+    assert len(similar) >= 30
+    recall = len(similar & pairs) / len(similar)
+    assert recall >= 0.95
+    assert len(pairs) < 0.2 * len(paragraphs1) * len(paragraphs2)  # 不相似的段落对大多被排除
+    assert all(i < len(paragraphs1) and paragraphs2[j] for i, j in pairs)  # 空段落不参与
+
+
+def test_short_and_empty_texts():
+    assert char_shingles('').size == 0
+    assert char_shingles('ab').size == 1
+    lsh = MinHashLSH()
+    assert (0, 0) in lsh.candidate_pairs(['ab'], ['ab'])
+    assert lsh.candidate_pairs([''], ['']) == set()
@@ -0,0 +1,80 @@
+# test_spell_shards.py
+import multiprocessing
+import os
+import sys
+import threading
+import time
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils import spell_shards
+from utils.spell_shards import CorrectorError, ShardedCorrector, detect_with_cache
+from utils.typo_cache import SentenceTypoCache
+
+
+class FakeCorrector:
+    """把 “按装” 纠正为 “安装”；文本中含 “慢” 时模拟耗时的检测"""
+
+    def correct(self, text):
+        if '慢' in text:
+            time.sleep(1 if '稍慢' in text else 3)
+        errors = []
+        start = text.find('按装')
+        while start != -1:
+            errors.append(('按装', '安装', start))
+            start = text.find('按装', start + 1)
+        return {'source': text, 'target': text.replace('按装', '安装'), 'errors': errors}
+
+
+def run_locally(shards):
+    return [spell_shards.correct_errors(FakeCorrector(), shard) for shard in shards]
+
+
+def test_detect_with_cache_maps_positions_and_rechecks_only_new_sentences(tmp_path):
+    cache = SentenceTypoCache(str(tmp_path / 'typos.sqlite3'))
+    text = '  软件按装完成。\n第二句没有错。按装失败了！'
+    errors, summary = detect_with_cache(text, run_locally, lambda n: 8, cache)
+    assert [(e.start, e.end, e.wrong) for e in errors] == [(4, 6, '按装'), (17, 19, '按装')]
+    assert all(text[e.start:e.end] == e.wrong for e in errors)
+    assert summary['cached_sentences'] == 0
+
+    edited = '新增一句按装。\n' + text
+    shards_seen = []
+
+    def record(shards):
+        shards_seen.extend(shards)
+        return run_locally(shards)
+
+    errors, summary = detect_with_cache(edited, record, lambda n: 1000, cache)
+    assert shards_seen == ['新增一句按装。']
+    assert summary['cached_sentences'] == 3
+    assert all(edited[e.start:e.end] == '按装' for e in errors) and len(errors) == 3
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='需要 fork 启动方式')
+def test_timeout_retires_pool_without_breaking_other_requests(monkeypatch):
+    monkeypatch.setattr(spell_shards, '_worker_corrector', FakeCorrector())  # 以 fork 启动，工作进程继承
+    engine = ShardedCorrector(workers=2)
+    engine.warmup()
+
+    other = {}
+
+    def other_request():  # 与超时请求同时在旧进程池中执行
+        other['errors'] = engine.detect('稍慢的请求按装了软件。', timeout=10)
+
+    thread = threading.Thread(target=other_request)
+    thread.start()
+    time.sleep(0.2)
+    with pytest.raises(TimeoutError):
+        engine._run_shards(['很慢的分片。'], timeout=0.5)
+    assert engine.get_stats()['retired_pools'] == 1
+
+    start = time.perf_counter()
+    assert engine.detect('新请求按装。', timeout=10) == [CorrectorError(3, 5, '按装', '安装')]  # 新进程池立即可用
+    assert time.perf_counter() - start < 1.5
+    thread.join()
+    assert other['errors'] == [CorrectorError(5, 7, '按装', '安装')]  # 旧进程池中的任务照常完成
+
+    time.sleep(3)
+    assert engine.get_stats()['retired_pools'] == 0  # 旧进程池完成剩余任务后退出
@@ -0,0 +1,68 @@
+# test_spooled_upload.py
+import hashlib
+import io
+import os
+import stat
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils import spooled_upload
+from utils.spooled_upload import SpooledUpload, UploadTooLarge
+
+
+def test_small_upload_stays_in_memory():
+    data = '论文内容'.encode('utf-8')
+    with SpooledUpload(io.BytesIO(data), max_memory=1024) as upload:
+        assert not upload.on_disk and upload.source() == data
+        assert upload.size == len(data)
+        assert upload.sha256 == hashlib.sha256(data).hexdigest()
+        assert upload.decode_text() == '论文内容'
+
+
+def test_rollover_to_disk_keeps_content_and_hash(tmp_path):
+    data = os.urandom(300 * 1024)  # 跨越多个读取块，在中途转存
+    upload = SpooledUpload(io.BytesIO(data), suffix='.pdf', max_memory=100 * 1024)
+    path = upload.path
+    assert upload.on_disk and path.endswith('.pdf')
+    with open(path, 'rb') as f:
+        assert f.read() == data
+    assert upload.sha256 == hashlib.sha256(data).hexdigest() and upload.size == len(data)
+    assert bytes(upload.buffer()[:10]) == data[:10]
+    upload.close()
+    assert not os.path.exists(path)
+
+
+def test_too_large_upload_is_rejected_and_cleaned_up(monkeypatch):
+    created = []
+    mkstemp = spooled_upload.tempfile.mkstemp
+
+    def record(*args, **kwargs):
+        fd, path = mkstemp(*args, **kwargs)
+        created.append(path)
+        return fd, path
+
+    monkeypatch.setattr(spooled_upload.tempfile, 'mkstemp', record)
+    with pytest.raises(UploadTooLarge):
+        SpooledUpload(io.BytesIO(b'x' * 200 * 1024), max_bytes=150 * 1024, max_memory=64 * 1024)
+    assert created and not any(os.path.exists(path) for path in created)
+
+
+def test_decode_errors_match_bytes_decode():
+    with SpooledUpload(io.BytesIO('文本'.encode('gbk'))) as upload:
+        with pytest.raises(UnicodeDecodeError):
+            upload.decode_text('utf-8')
+    with SpooledUpload(io.BytesIO(b'')) as upload:
+        assert upload.decode_text() == ''
+
+
+@pytest.mark.parametrize('size', [10, 200 * 1024])
+def test_save_from_memory_and_disk_with_regular_permissions(tmp_path, size):
+    data = os.urandom(size)
+    dest = str(tmp_path / 'paper.docx')
+    with SpooledUpload(io.BytesIO(data), max_memory=64 * 1024) as upload:
+        upload.save(dest)
+    with open(dest, 'rb') as f:
+        assert f.read() == data
+    assert stat.S_IMODE(os.stat(dest).st_mode) == spooled_upload._FILE_MODE
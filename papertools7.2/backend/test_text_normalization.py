@@ -0,0 +1,67 @@
+# test_text_normalization.py
+import os
+import random
+import sys
+import unicodedata
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils.text_normalization import (
+    normalize, normalize_for_fingerprint, preprocess_paragraph, to_original_span
+)
+
+# 随机文本的字符来源：中英文、全角字母数字、连字、组合字符、各种空白和标点
+ALPHABET = ('论文查重方法ABCxyz019_ ，。！？、；：“”（）-.,!?\t\n　\xa0'
+            'ＡＢｃ１２ﬁ²Ⅻİé́ß😀')
+
+
+def random_texts(count=300, seed=3):
+    rng = random.Random(seed)
+    return [''.join(rng.choice(ALPHABET) for _ in range(rng.randint(0, 40))) for _ in range(count)]
+
+
+def reference_fingerprint_normalize(text):
+    """winnowing 原来的逐字符实现（指纹索引中已有数据按它计算，结果必须保持一致）"""
+    chars, offsets = [], []
+    for index, char in enumerate(text):
+        for c in unicodedata.normalize('NFKC', char).lower():
+            if c.isascii() and c.isalnum() or '一' <= c <= '龥':
+                chars.append(c)
+                offsets.append(index)
+    return ''.join(chars), offsets
+
+
+@pytest.mark.parametrize('text', random_texts())
+def test_normalize_matches_preprocess_and_offsets_round_trip(text):
+    normalized = normalize(text)
+    assert normalized.text == preprocess_paragraph(text)
+    assert len(normalized.offsets) == len(normalized.text)
+    assert normalized.offsets == sorted(normalized.offsets)
+    for char, offset in zip(normalized.text, normalized.offsets):
+        if char == ' ':
+            assert text[offset].isspace()
+        else:
+            assert char in text[offset].lower()
+
+
+def test_to_original_span():
+    text = '  Hello，  World！论文 查重 '
+    normalized = normalize(text)
+    start = normalized.text.index('world')
+    assert normalized.text == 'hello world论文 查重'
+    span = to_original_span(normalized, start, start + len('world论文'))
+    assert text[span[0]:span[1]] == 'World！论文'
+    assert to_original_span(normalized, start, start) == (text.index('W'), text.index('W'))
+    assert to_original_span(normalized, len(normalized.text), len(normalized.text)) == (None, None)
+
+
+@pytest.mark.parametrize('text', random_texts(seed=5))
+def test_fingerprint_normalize_matches_reference(text):
+    assert tuple(normalize_for_fingerprint(text)) == reference_fingerprint_normalize(text)
+
+
+def test_fingerprint_normalize_folds_width():
+    normalized = normalize_for_fingerprint('ＡＢ１２，论文 ﬁ')
+    assert normalized.text == 'ab12论文fi'
+    assert normalized.offsets == [0, 1, 2, 3, 5, 6, 8, 8]
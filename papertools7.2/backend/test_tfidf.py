@@ -0,0 +1,95 @@
+# test_tfidf.py
+import multiprocessing
+import os
+import sys
+
+import numpy as np
+import pytest
+
+BACKEND_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path[:0] = [BACKEND_DIR, os.path.dirname(BACKEND_DIR)]  # service 包经 backend.dao 导入
+from service.tfidf import CorpusStatistics, TfidfVectorizer
+
+
+@pytest.fixture
+def stats_path(tmp_path):
+    return str(tmp_path / 'tfidf' / 'corpus_df.sqlite3')
+
+
+def dense_cosine(corpus, query_counts, candidate_counts):
+    """参照实现：在统一词表上构建稠密 TF-IDF 矩阵后求余弦"""
+    vocabulary, df_table, num_docs = corpus.snapshot()
+    terms = sorted({t for counts in [query_counts] + candidate_counts for t in counts})
+    df = np.array([df_table[vocabulary[t]] if t in vocabulary else 0 for t in terms], dtype=np.float64)
+    idf = CorpusStatistics.idf(df, num_docs)
+    rows = np.array([[1 + np.log(counts[t]) if counts.get(t) else 0.0 for t in terms]
+                     for counts in [query_counts] + candidate_counts]) * idf
+    norms = np.linalg.norm(rows, axis=1)
+    rows = rows / np.where(norms > 0, norms, 1.0)[:, None]
+    return rows[1:] @ rows[0]
+
+
+def test_sparse_cosine_matches_dense(stats_path):
+    corpus = CorpusStatistics(stats_path)
+    rng = np.random.default_rng(7)
+    words = [f'w{i}' for i in range(60)]
+    corpus.add_documents((doc, rng.choice(words, 15)) for doc in range(30))
+
+    def random_counts(size):
+        return {str(t): int(c) for t, c in zip(rng.choice(words + ['新词', '未登录'], size, replace=False),
+                                                 rng.integers(1, 6, size))}
+
+    query = random_counts(20)
+    candidates = [random_counts(n) for n in (1, 5, 20, 40)] + [{}, {'只在候选中': 3}]
+    sparse = TfidfVectorizer(corpus).similarities(query, candidates)
+    assert np.allclose(sparse, dense_cosine(corpus, query, candidates))
+    assert np.isclose(TfidfVectorizer(corpus).similarities(query, [query])[0], 1.0)
+
+
+def test_other_instance_sees_only_new_changes(stats_path):
+    writer = CorpusStatistics(stats_path)
+    reader = CorpusStatistics(stats_path)
+    writer.add_document(1, ['a', 'b'])
+    writer.add_document(1, ['a', 'b'])  # 重复添加被忽略
+    writer.add_documents([(2, ['b', 'c']), (3, ['c'])])
+
+    old_vocabulary, old_df, _ = reader.snapshot()
+    reader.refresh()
+    vocabulary, df, num_docs = reader.snapshot()
+    assert num_docs == 3 and vocabulary is old_vocabulary and df is not old_df
+    assert {t: df[vocabulary[t]] for t in 'abc'} == {'a': 1, 'b': 2, 'c': 2}
+
+    writer.remove_document(2, ['b', 'c'])
+    reader.refresh()
+    vocabulary, df, num_docs = reader.snapshot()
+    assert 2 not in reader and num_docs == 2
+    assert {t: df[vocabulary[t]] for t in 'abc'} == {'a': 1, 'b': 1, 'c': 1}
+
+    writer.add_document(2, ['d'])  # 删除后可重新计入
+    assert 2 in CorpusStatistics(stats_path)
+
+
+def _add_and_remove(path, worker):
+    corpus = CorpusStatistics(path)
+    for i in range(20):
+        corpus.add_document(f'{worker}-{i}', ['common', f'term{worker}'])
+    for i in range(0, 20, 2):
+        corpus.remove_document(f'{worker}-{i}', ['common', f'term{worker}'])
+
+
+@pytest.mark.skipif('fork' not in multiprocessing.get_all_start_methods(), reason='需要 fork 启动方式')
+def test_concurrent_workers(stats_path):
+    CorpusStatistics(stats_path)
+    context = multiprocessing.get_context('fork')
+    processes = [context.Process(target=_add_and_remove, args=(stats_path, worker)) for worker in range(4)]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    corpus = CorpusStatistics(stats_path)
+    vocabulary, df, num_docs = corpus.snapshot()
+    assert num_docs == 40
+    assert df[vocabulary['common']] == 40
+    assert all(df[vocabulary[f'term{worker}']] == 10 for worker in range(4))
+    assert sorted(vocabulary.values()) == list(range(len(vocabulary)))  # 词 ID 连续
@@ -0,0 +1,45 @@
+# test_typo_cache.py
+import itertools
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils import typo_cache
+from utils.typo_cache import SentenceTypoCache, sentence_key
+
+
+def test_round_trip_and_version_in_key(tmp_path, monkeypatch):
+    cache = SentenceTypoCache(str(tmp_path / 'typos.sqlite3'))
+    cache.put_many({'a': [(0, 2, '按装', '安装')], 'b': []})
+    assert cache.get_many(['a', 'b', 'c']) == {'a': [(0, 2, '按装', '安装')], 'b': []}
+    assert cache.get_stats()['sentence_hits'] == 2 and cache.get_stats()['sentence_misses'] == 1
+
+    key = sentence_key('软件按装完成。')
+    monkeypatch.setattr(typo_cache, 'SPELL_CACHE_VERSION', 'other-model')
+    assert sentence_key('软件按装完成。') != key  # 模型版本变化后旧条目不再命中
+
+
+def test_evicts_least_recently_used(tmp_path, monkeypatch):
+    clock = itertools.count(1000)
+    monkeypatch.setattr(typo_cache.time, 'time', lambda: next(clock))
+    cache = SentenceTypoCache(str(tmp_path / 'typos.sqlite3'), max_entries=10)
+    cache.put_many({f'old{i}': [] for i in range(10)})
+    assert cache.get_many(['old0', 'old1']).keys() == {'old0', 'old1'}  # 刷新最近使用时间
+
+    cache.put_many({'new0': [], 'new1': []})  # 12 条，超过上限，淘汰到 9 条
+    stats = cache.get_stats()
+    assert stats['entries'] == 9 and stats['evictions'] == 3
+    remaining = cache.get_many([f'old{i}' for i in range(10)] + ['new0', 'new1']).keys()
+    assert {'old0', 'old1', 'new0', 'new1'} <= remaining  # 淘汰的是未再使用的旧条目
+    assert len(remaining) == 9
+
+
+def test_eviction_counts_entries_written_by_other_workers(tmp_path):
+    path = str(tmp_path / 'typos.sqlite3')
+    first = SentenceTypoCache(path, max_entries=10)
+    other = SentenceTypoCache(path, max_entries=10)
+    other.put_many({f'o{i}': [] for i in range(8)})
+    first.put_many({f'f{i}': [] for i in range(4)})  # 本进程只计了 4 条：不触发
+    assert SentenceTypoCache(path, max_entries=10).get_stats()['entries'] == 12
+    first.put_many({f'g{i}': [] for i in range(7)})  # 重新统计实际条数后淘汰
+    assert SentenceTypoCache(path, max_entries=10).get_stats()['entries'] == 9
@@ -0,0 +1,91 @@
+# test_winnowing.py
+import os
+import random
+import sys
+
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from utils.text_normalization import normalize_for_fingerprint
+from utils.winnowing import FingerprintIndex, kgram_hashes, merge_spans, winnow
+
+CHARS = '查重系统基于指纹算法检测论文中的重复片段并给出相似度报告'
+
+
+def random_text(rng, length):
+    return ''.join(rng.choice(CHARS + '，。 ABCdef123') for _ in range(length))
+
+
+def reference_positions(hashes, window):
+    """逐窗口取最小哈希（并列取最右），相邻窗口选中同一位置只记一次"""
+    positions = []
+    for start in range(max(1, len(hashes) - window + 1)):
+        chunk = hashes[start:start + window]
+        pos = start + max(i for i, h in enumerate(chunk) if h == min(chunk))
+        if not positions or positions[-1] != pos:
+            positions.append(pos)
+    return positions
+
+
+@pytest.mark.parametrize('seed', range(20))
+def test_winnow_matches_reference_and_offsets(seed):
+    rng = random.Random(seed)
+    text = random_text(rng, rng.randint(0, 200))
+    k, window = 5, 4
+    normalized, offsets = normalize_for_fingerprint(text)
+    hashes = kgram_hashes(normalized, k)
+    fingerprints = winnow(text, k, window)
+    if not hashes:
+        assert fingerprints == []
+        return
+
+    expected = reference_positions(hashes, window)
+    assert [fp.hash for fp in fingerprints] == [hashes[pos] for pos in expected]
+    for fp, pos in zip(fingerprints, expected):
+        # 原文片段规范化后正好是该 k-gram
+        assert normalize_for_fingerprint(text[fp.start:fp.end]).text == normalized[pos:pos + k]
+        assert (fp.start, fp.end) == (offsets[pos], offsets[pos + k - 1] + 1)
+
+
+def test_shared_passage_is_found_and_aligned():
+    rng = random.Random(7)
+    passage = '基于指纹的查重算法保证任何足够长的公共片段都至少共享一个指纹'
+    prefix1, prefix2 = random_text(rng, 150), random_text(rng, 80)
+    text1 = prefix1 + passage + random_text(rng, 100)
+    text2 = prefix2 + passage.replace('，', '') + random_text(rng, 120)
+
+    index = FingerprintIndex()
+    index.add('other', winnow(text2))
+    index.add('noise', winnow(random_text(rng, 300)))
+    result = index.query(winnow(text1), min_similarity=0.01)[0]
+    assert result['doc_id'] == 'other' and result['shared'] > 0
+
+    longest = max(result['spans'], key=lambda s: s['source_end'] - s['source_start'])
+    source = text1[longest['source_start']:longest['source_end']]
+    target = text2[longest['target_start']:longest['target_end']]
+    assert normalize_for_fingerprint(source).text == normalize_for_fingerprint(target).text
+    assert len(normalize_for_fingerprint(source).text) >= len(passage) - 8
+    assert longest['source_start'] >= len(prefix1) - 1 and longest['target_start'] >= len(prefix2) - 1
+
+    index.remove('other')
+    assert 'other' not in index and all(r['doc_id'] != 'other' for r in index.query(winnow(text1)))
+
+
+def test_merge_spans():
+    matches = [
+        (30, 38, 130, 138),  # 与下一条重叠
+        (0, 8, 100, 108),
+        (4, 12, 104, 112),
+        (14, 22, 114, 122),  # 间隔 2 个字符
+        (50, 58, 10, 18),    # 目标位置倒退：新片段
+    ]
+    assert merge_spans(matches) == [
+        {'source_start': 0, 'source_end': 12, 'target_start': 100, 'target_end': 112},
+        {'source_start': 14, 'source_end': 22, 'target_start': 114, 'target_end': 122},
+        {'source_start': 30, 'source_end': 38, 'target_start': 130, 'target_end': 138},
+        {'source_start': 50, 'source_end': 58, 'target_start': 10, 'target_end': 18},
+    ]
+    merged = merge_spans(matches, gap=2)
+    assert merged[0] == {'source_start': 0, 'source_end': 22, 'target_start': 100, 'target_end': 122}
+    assert len(merged) == 3
+    assert merge_spans([]) == []
@@ -0,0 +1,93 @@
+# backend/utils/aho_corasick.py
+"""
+Aho-Corasick 多模式串匹配
+
+一次扫描文本即可找出词典中所有词（包括相互重叠的）的出现位置，
+耗时与文本长度和命中数成正比，与词典大小无关。
+"""
+from bisect import bisect_right
+from collections import deque
+from typing import Iterable, Iterator, List, Tuple
+
+
+class AhoCorasick:
+    """在构造时一次性建好自动机，之后可在多个线程中并发扫描（扫描过程只读）"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self._goto = [{}]      # 节点 -> {字符: 子节点}
+        self._fail = [0]       # 失配指针
+        self._output = [()]    # 在该节点结束的模式串（含经由失配指针可达的后缀）
+        self.size = 0
+        for pattern in patterns:
+            if pattern:
+                self._insert(pattern)
+        self._build_failure_links()
+
+    def _insert(self, pattern: str):
+        node = 0
+        for char in pattern:
+            child = self._goto[node].get(char)
+            if child is None:
+                child = len(self._goto)
+                self._goto[node][char] = child
+                self._goto.append({})
+                self._fail.append(0)
+                self._output.append(())
+            node = child
+        if pattern not in self._output[node]:
+            self._output[node] = (pattern,)
+            self.size += 1
+
+    def _build_failure_links(self):
+        """按层（BFS）计算失配指针，并把后缀节点的输出合并进来"""
+        queue = deque(self._goto[0].values())
+        while queue:
+            node = queue.popleft()
+            for char, child in self._goto[node].items():
+                queue.append(child)
+                fallback = self._fail[node]
+                while fallback and char not in self._goto[fallback]:
+                    fallback = self._fail[fallback]
+                target = self._goto[fallback].get(char, 0)
+                self._fail[child] = target
+                if self._output[self._fail[child]]:
+                    self._output[child] = self._output[child] + self._output[self._fail[child]]
+
+    def __len__(self):
+        return self.size
+
+    def iter_matches(self, text: str) -> Iterator[Tuple[int, str]]:
+        """按结束位置顺序返回 (起始位置, 模式串)；同一结束位置上长的模式串在前"""
+        goto, fail, output = self._goto, self._fail, self._output
+        node = 0
+        for i, char in enumerate(text):
+            while node and char not in goto[node]:
+                node = fail[node]
+            node = goto[node].get(char, 0)
+            if output[node]:
+                for pattern in output[node]:
+                    yield i - len(pattern) + 1, pattern
+
+    def find_all(self, text: str) -> List[Tuple[int, str]]:
+        """所有命中，按 (起始位置, 长度降序) 排序"""
+        return sorted(self.iter_matches(text), key=lambda m: (m[0], -len(m[1])))
+
+
+class IntervalIndex:
+    """
+    一组（可能相互重叠的）区间 [start, end)，查询某个位置是否落在任一区间内
+    区间按起点排序并记录前缀最大终点，每次查询 O(log n)
+    """
+
+    def __init__(self, intervals: Iterable[Tuple[int, int]] = ()):
+        intervals = sorted(intervals)
+        self._starts = [start for start, _ in intervals]
+        self._max_ends = []
+        max_end = None
+        for _, end in intervals:
+            max_end = end if max_end is None else max(max_end, end)
+            self._max_ends.append(max_end)
+
+    def covers(self, position: int) -> bool:
+        i = bisect_right(self._starts, position) - 1
+        return i >= 0 and self._max_ends[i] > position
@@ -0,0 +1,466 @@
+# backend/utils/doc_converter.py
+"""
+旧版 Word（.doc）转换工作池
+
+.doc 原来每次都通过 textract 启动一个外部转换进程，负载高时是最慢、耗时最不稳定的格式。
+这里用纯 Python 读取 OLE 复合文档（Word 97-2003 的 WordDocument 流 + 分段表），
+在常驻的工作进程池中执行：请求排队（队列有上限），每个任务有超时（超时只终止并替换卡住的进程），并统计吞吐量。
+Word 95 及更早版本、加密文档等无法直接读取的文件回退到 textract。
+提取结果由 document_extractor.extract_document 写入统一的提取缓存。
+"""
+import mmap
+import multiprocessing
+import os
+import re
+import struct
+import threading
+import time
+from typing import Dict, List, Tuple, Union
+
+from config.config import (
+    DOC_CONVERT_WORKERS, DOC_CONVERT_TIMEOUT, DOC_CONVERT_QUEUE_SIZE, DOC_CONVERT_MAX_TASKS,
+    PDF_EXTRACT_MEMORY_MB
+)
+from config.logging_config import logger
+from utils.document_extractor import _limit_worker_memory
+
+
+class DocFormatError(ValueError):
+    """文件不是可直接读取的 Word 97-2003 文档"""
+
+
+class DocConversionError(RuntimeError):
+    """转换失败（队列已满、工作进程异常等）"""
+
+
+class DocConversionTimeout(DocConversionError):
+    """转换超时"""
+
+
+# ---------------------------------------------------------------- OLE 复合文档
+
+_CFB_SIGNATURE = b'\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1'
+_MAX_REGULAR_SECTOR = 0xFFFFFFFA  # 大于等于该值的扇区号是特殊标记（链尾、空闲等）
+_DIR_ENTRY_SIZE = 128
+_DIR_TYPE_STREAM = 2
+_DIR_TYPE_ROOT = 5
+
+
+def _u32_list(data: bytes) -> List[int]:
+    return list(struct.unpack(f'<{len(data) // 4}I', data[:len(data) // 4 * 4]))
+
+
+class _CompoundFile:
+    """只读的 OLE 复合文档（CFB）解析，按名称读取流"""
+
+    def __init__(self, data: Union[bytes, mmap.mmap]):
+        if len(data) < 512 or data[:8] != _CFB_SIGNATURE:
+            raise DocFormatError('不是 OLE 复合文档')
+        self.data = data
+        (major_version, sector_shift, mini_sector_shift) = struct.unpack_from('<H2xHH', data, 0x1A)
+        self.sector_size = 1 << sector_shift
+        self.mini_sector_size = 1 << mini_sector_shift
+        (num_fat_sectors, first_dir_sector, _, self.mini_cutoff, first_mini_fat,
+         num_mini_fat, first_difat, num_difat) = struct.unpack_from('<8I', data, 0x2C)
+        self._v3 = major_version == 3
+
+        # FAT：前 109 个 FAT 扇区号在文件头中，其余在 DIFAT 扇区链中
+        fat_sectors = _u32_list(data[0x4C:0x200])
+        sid = first_difat
+        for _ in range(num_difat):
+            if sid >= _MAX_REGULAR_SECTOR:
+                break
+            entries = _u32_list(self._sector(sid))
+            fat_sectors.extend(entries[:-1])
+            sid = entries[-1]
+        fat_sectors = [s for s in fat_sectors if s < _MAX_REGULAR_SECTOR][:num_fat_sectors]
+        self.fat = []
+        for s in fat_sectors:
+            self.fat.extend(_u32_list(self._sector(s)))
+
+        self.entries = self._read_directory(first_dir_sector)
+        root = next((e for e in self.entries if e[1] == _DIR_TYPE_ROOT), None)
+        if root is None:
+            raise DocFormatError('缺少根目录项')
+        self.mini_fat = _u32_list(self._read_chain(first_mini_fat)) if num_mini_fat else []
+        self.mini_stream = self._read_chain(root[2])[:root[3]]
+
+    def _sector(self, sid: int) -> bytes:
+        offset = (sid + 1) * self.sector_size
+        if offset >= len(self.data):
+            raise DocFormatError('扇区超出文件范围')
+        sector = self.data[offset:offset + self.sector_size]
+        if len(sector) < self.sector_size:  # WPS 等写出的文件最后一个扇区常不完整，与 olefile 一样补零
+            sector = bytes(sector) + b'\0' * (self.sector_size - len(sector))
+        return sector
+
+    @staticmethod
+    def _chain(table: List[int], start: int) -> List[int]:
+        """沿分配表收集扇区链（检测越界和环）"""
+        chain = []
+        sid = start
+        while sid < _MAX_REGULAR_SECTOR:
+            if sid >= len(table) or len(chain) > len(table):
+                raise DocFormatError('扇区链损坏')
+            chain.append(sid)
+            sid = table[sid]
+        return chain
+
+    def _read_chain(self, start: int) -> bytes:
+        return b''.join(self._sector(sid) for sid in self._chain(self.fat, start))
+
+    def _read_directory(self, first_dir_sector: int) -> List[Tuple[str, int, int, int]]:
+        """目录项：(名称, 类型, 起始扇区, 大小)"""
+        data = self._read_chain(first_dir_sector)
+        entries = []
+        for offset in range(0, len(data) - _DIR_ENTRY_SIZE + 1, _DIR_ENTRY_SIZE):
+            name_len, entry_type = struct.unpack_from('<HB', data, offset + 64)
+            start, size = struct.unpack_from('<IQ', data, offset + 116)
+            if self._v3:
+                size &= 0xFFFFFFFF  # 版本 3 只有低 32 位有效
+            name = data[offset:offset + max(0, min(name_len, 64) - 2)].decode('utf-16-le', errors='ignore')
+            entries.append((name, entry_type, start, size))
+        return entries
+
+    def open_stream(self, name: str) -> bytes:
+        for entry_name, entry_type, start, size in self.entries:
+            if entry_type == _DIR_TYPE_STREAM and entry_name == name:
+                if size < self.mini_cutoff:
+                    mini = self.mini_sector_size
+                    return b''.join(self.mini_stream[s * mini:(s + 1) * mini]
+                                    for s in self._chain(self.mini_fat, start))[:size]
+                return self._read_chain(start)[:size]
+        raise DocFormatError(f'缺少 {name} 流')
+
+
+# ---------------------------------------------------------------- Word 97-2003 文本
+
+_WORD_IDENT = 0xA5EC
+_NFIB_WORD97 = 0xC1
+_FIB_ENCRYPTED = 0x0100
+_FIB_WHICH_TABLE = 0x0200
+_FIELD_MARKS_RE = re.compile('([\x13\x14\x15])')
+# 段落/单元格/换行/分页标记统一为换行；对象锚点、脚注引用等占位字符删除
+_CONTROL_CHARS = str.maketrans({
+    '\r': '\n', '\x07': '\n', '\x0b': '\n', '\x0c': '\n', '\x1e': '-',
+    '\x00': None, '\x01': None, '\x02': None, '\x03': None, '\x04': None,
+    '\x05': None, '\x08': None, '\x1f': None,
+})
+
+
+def _strip_fields(text: str) -> str:
+    """域（\\x13 代码 \\x14 结果 \\x15）只保留结果部分，支持嵌套"""
+    if '\x13' not in text:
+        return text
+    out = []
+    stack = []  # 每层域当前是否处于结果部分
+    for token in _FIELD_MARKS_RE.split(text):
+        if token == '\x13':
+            stack.append(False)
+        elif token == '\x14':
+            if stack:
+                stack[-1] = True
+        elif token == '\x15':
+            if stack:
+                stack.pop()
+        elif all(stack):
+            out.append(token)
+    return ''.join(out)
+
+
+def _piece_table_text(word_stream: bytes, clx: bytes) -> str:
+    """按分段表（Clx 中的 PlcPcd）拼出文档的全部字符"""
+    i = 0
+    while i < len(clx) and clx[i] == 0x01:  # 跳过 Prc（格式属性）
+        i += 3 + struct.unpack_from('<H', clx, i + 1)[0]
+    if i >= len(clx) or clx[i] != 0x02:
+        raise DocFormatError('分段表损坏')
+    lcb = struct.unpack_from('<I', clx, i + 1)[0]
+    plc = clx[i + 5:i + 5 + lcb]
+    count = (lcb - 4) // 12
+    cps = struct.unpack_from(f'<{count + 1}I', plc, 0)
+    pieces = []
+    for k in range(count):
+        fc = struct.unpack_from('<I', plc, 4 * (count + 1) + 8 * k + 2)[0]
+        length = cps[k + 1] - cps[k]
+        if fc & 0x40000000:  # 压缩存储：每个字符 1 字节（cp1252）
+            start = (fc & 0x3FFFFFFF) // 2
+            pieces.append(word_stream[start:start + length].decode('cp1252', errors='replace'))
+        else:                # UTF-16LE
+            start = fc & 0x3FFFFFFF
+            pieces.append(word_stream[start:start + 2 * length].decode('utf-16-le', errors='replace'))
+    return ''.join(pieces)
+
+
+def read_doc_text(source: Union[str, bytes]) -> str:
+    """
+    读取 Word 97-2003 文档的正文、脚注、尾注和文本框文本
+    :param source: 文件路径或 bytes
+    :raises DocFormatError: 不是可直接读取的 .doc（加密、Word 95 及更早版本、文件损坏）
+    """
+    if isinstance(source, (bytes, bytearray)):
+        return _read_doc_text(bytes(source))
+    with open(source, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            raise DocFormatError('文件为空')
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            return _read_doc_text(data)
+
+
+def _read_doc_text(data) -> str:
+    try:
+        ole = _CompoundFile(data)
+        word = ole.open_stream('WordDocument')
+        ident, nfib = struct.unpack_from('<HH', word, 0)
+        flags = struct.unpack_from('<H', word, 0x0A)[0]
+        if ident != _WORD_IDENT or nfib < _NFIB_WORD97:
+            raise DocFormatError('不是 Word 97-2003 文档')
+        if flags & _FIB_ENCRYPTED:
+            raise DocFormatError('文档已加密')
+
+        # FIB 的变长部分：csw 个 16 位字、cslw 个 32 位字（字符数统计）、cbRgFcLcb 对偏移/长度
+        pos = 32
+        pos += 2 + 2 * struct.unpack_from('<H', word, pos)[0]
+        ccp = struct.unpack_from('<11I', word, pos + 2)
+        pos += 2 + 4 * struct.unpack_from('<H', word, pos)[0]
+        fc_clx, lcb_clx = struct.unpack_from('<II', word, pos + 2 + 33 * 8)
+
+        table = ole.open_stream('1Table' if flags & _FIB_WHICH_TABLE else '0Table')
+        chars = _piece_table_text(word, table[fc_clx:fc_clx + lcb_clx])
+    except struct.error as e:
+        raise DocFormatError(f'文档结构损坏: {e}')
+
+    # 字符位置依次为：正文、脚注、页眉页脚、（保留）、批注、尾注、文本框、页眉文本框
+    ccp_text, ccp_ftn, ccp_hdd, ccp_mcr, ccp_atn, ccp_edn, ccp_txbx = ccp[3:10]
+    bounds = []
+    cp = 0
+    for length, keep in ((ccp_text, True), (ccp_ftn, True), (ccp_hdd + ccp_mcr + ccp_atn, False),
+                         (ccp_edn, True), (ccp_txbx, True)):
+        if keep and length:
+            bounds.append((cp, cp + length))
+        cp += length
+    sections = [_strip_fields(chars[s:e]).translate(_CONTROL_CHARS).rstrip('\n') for s, e in bounds]
+    return '\n'.join(section for section in sections if section.strip())
+
+
+def _convert_doc(path: str) -> Tuple[str, str]:
+    """在工作进程中转换一个文件，返回 (使用的方法, 文本)"""
+    try:
+        return 'ole', read_doc_text(path)
+    except DocFormatError as e:
+        logger.info(f".doc 无法直接读取（{str(e)}），改用 textract")
+    import textract
+    return 'textract', textract.process(path, extension='doc').decode('utf-8', errors='ignore')
+
+
+# ---------------------------------------------------------------- 工作池
+
+def _worker_main(conn, memory_mb: int):
+    """转换进程主循环：逐个接收文件路径，返回 (True, (方法, 文本)) 或 (False, 异常)；收到 None 时退出"""
+    _limit_worker_memory(memory_mb)
+    while True:
+        try:
+            path = conn.recv()
+        except (EOFError, OSError):
+            return
+        if path is None:
+            return
+        try:
+            reply = (True, _convert_doc(path))
+        except Exception as e:
+            reply = (False, e)
+        try:
+            conn.send(reply)
+        except Exception:  # 异常对象无法序列化
+            conn.send((False, DocConversionError(repr(reply[1]))))
+
+
+class _DocWorker:
+    """一个常驻转换进程及其管道，一次只处理一个文件；卡住时只终止这一个进程"""
+
+    def __init__(self, context, memory_mb: int):
+        self.conn, child_conn = context.Pipe()
+        self.process = context.Process(target=_worker_main, args=(child_conn, memory_mb), daemon=True)
+        self.process.start()
+        child_conn.close()
+        self.tasks = 0
+
+    def run(self, path: str, timeout: float) -> Tuple[str, str]:
+        """
+        :raises DocConversionTimeout: 超时（进程仍在处理，调用方应终止它）
+        :raises DocConversionError: 进程异常退出
+        """
+        self.tasks += 1
+        try:
+            self.conn.send(path)
+            if not self.conn.poll(timeout):
+                raise DocConversionTimeout(f'.doc 转换超时（{timeout:.0f} 秒）')
+            ok, value = self.conn.recv()
+        except (EOFError, OSError) as e:
+            raise DocConversionError(f'.doc 转换进程异常退出: {e!r}')
+        if not ok:
+            raise value
+        return value
+
+    def stop(self, kill: bool = False):
+        """空闲进程通知其退出；卡住的进程直接终止"""
+        try:
+            if kill:
+                self.process.kill()
+            else:
+                self.conn.send(None)
+        except (OSError, ValueError):
+            pass
+        self.process.join(1)
+        if self.process.is_alive():
+            self.process.kill()
+            self.process.join(1)
+        self.conn.close()
+
+
+class DocConverterPool:
+    """常驻的 .doc 转换进程池（有界排队、单任务超时、吞吐量统计），超时只替换卡住的那一个进程"""
+
+    def __init__(self, workers: int = DOC_CONVERT_WORKERS, timeout: float = DOC_CONVERT_TIMEOUT,
+                 queue_size: int = DOC_CONVERT_QUEUE_SIZE, max_tasks: int = DOC_CONVERT_MAX_TASKS):
+        self.workers = max(1, workers)
+        self.timeout = timeout
+        self.max_tasks = max_tasks or None
+        self._slots = threading.BoundedSemaphore(self.workers + queue_size)  # 执行中 + 排队中的任务数上限
+        self._lock = threading.Lock()
+        self._worker_free = threading.Condition(self._lock)
+        self._idle = []  # 空闲的 _DocWorker
+        self._live = 0  # 已启动（空闲 + 执行中）的进程数
+        self._context = multiprocessing.get_context('spawn')
+
+        # 统计
+        self.completed = 0
+        self.failed = 0
+        self.timeouts = 0
+        self.rejected = 0
+        self.replaced = 0
+        self.by_method = {'ole': 0, 'textract': 0}
+        self.total_time = 0.0
+        self.total_chars = 0
+
+    def _acquire_worker(self, deadline: float):
+        """取一个空闲进程，不足 workers 个时启动新进程（spawn 启动）；deadline 前没有可用进程时返回 None"""
+        with self._worker_free:
+            while True:
+                while self._idle:
+                    worker = self._idle.pop()
+                    if worker.process.is_alive():
+                        return worker
+                    self._live -= 1  # 空闲时退出（如超出内存上限），丢弃
+                if self._live < self.workers:
+                    self._live += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0 or not self._worker_free.wait(remaining):
+                    return None
+        try:
+            return _DocWorker(self._context, PDF_EXTRACT_MEMORY_MB)
+        except BaseException:
+            with self._worker_free:
+                self._live -= 1
+                self._worker_free.notify()
+            raise
+
+    def _release_worker(self, worker: _DocWorker, stuck: bool = False):
+        """任务结束后归还进程；卡住的、已退出的或处理满 max_tasks 个文件的进程被替换（避免外部库泄漏内存）"""
+        if not stuck and worker.process.is_alive() and (self.max_tasks is None or worker.tasks < self.max_tasks):
+            with self._worker_free:
+                self._idle.append(worker)
+                self._worker_free.notify()
+            return
+        worker.stop(kill=stuck)
+        with self._worker_free:
+            self._live -= 1
+            self.replaced += 1
+            self._worker_free.notify()
+
+    def convert(self, path: str, timeout: float = None) -> str:
+        """
+        转换一个 .doc 文件（阻塞直到完成）
+        :param timeout: 排队 + 转换的总时限（秒），默认 DOC_CONVERT_TIMEOUT
+        :raises DocConversionTimeout: 超时
+        :raises DocConversionError: 队列已满或工作进程异常
+        """
+        timeout = self.timeout if timeout is None else timeout
+        deadline = time.monotonic() + timeout
+        if not self._slots.acquire(timeout=timeout):
+            with self._lock:
+                self.rejected += 1
+            raise DocConversionError('.doc 转换队列已满，请稍后重试')
+        start = time.perf_counter()
+        try:
+            try:
+                worker = self._acquire_worker(deadline)
+            except (OSError, ValueError) as e:
+                logger.warning(f".doc 转换进程不可用，在当前进程转换: {str(e)}")
+                method, text = _convert_doc(path)
+            else:
+                if worker is None:
+                    with self._lock:
+                        self.timeouts += 1
+                    raise DocConversionTimeout(f'.doc 转换排队超时（{timeout:.0f} 秒）')
+                stuck = False
+                try:
+                    method, text = worker.run(path, max(0.0, deadline - time.monotonic()))
+                except DocConversionTimeout:
+                    stuck = True
+                    with self._lock:
+                        self.timeouts += 1
+                    raise
+                except DocConversionError:
+                    with self._lock:
+                        self.failed += 1
+                    raise
+                finally:
+                    self._release_worker(worker, stuck)
+        except DocConversionError:
+            raise
+        except Exception:
+            with self._lock:
+                self.failed += 1
+            raise
+        finally:
+            self._slots.release()
+
+        elapsed = time.perf_counter() - start
+        with self._lock:
+            self.completed += 1
+            self.by_method[method] += 1
+            self.total_time += elapsed
+            self.total_chars += len(text)
+        logger.info(f".doc 转换完成（{method}）：{len(text)} 字符，耗时 {elapsed:.3f} 秒")
+        return text
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'completed': self.completed,
+                'failed': self.failed,
+                'timeouts': self.timeouts,
+                'rejected': self.rejected,
+                'replaced_workers': self.replaced,
+                'by_method': dict(self.by_method),
+                'avg_seconds': round(self.total_time / self.completed, 4) if self.completed else 0,
+                'docs_per_second': round(self.completed / self.total_time, 2) if self.total_time else 0,
+                'chars_per_second': round(self.total_chars / self.total_time) if self.total_time else 0
+            }
+
+
+_converter = None
+_converter_lock = threading.Lock()
+
+
+def get_doc_converter() -> DocConverterPool:
+    """进程内共享的 .doc 转换池"""
+    global _converter
+    if _converter is None:
+        with _converter_lock:
+            if _converter is None:
+                _converter = DocConverterPool()
+    return _converter
@@ -0,0 +1,560 @@
+# backend/utils/document_extractor.py
+"""
+文档文本提取引擎
+
+PDF 按页范围切分后交给有界进程池并行提取（pdfplumber 的版面分析是 CPU 密集型，线程无法并行），
+短文档整篇作为一个任务，同样在进程池中提取（工作进程有内存上限），结果按页序拼接并记录每页在全文中的偏移。
+每篇文档有总耗时预算：提取任务在工作进程内按截止时间自行中断（SIGALRM），返回已完成的页并标记为不完整，
+既不让请求无限期阻塞，也不占用工作进程拖慢其他文档，更不需要终止整个进程池。
+docx 直接从 zip 中流式读取 word/document.xml 增量解析（不构建 python-docx 对象树），内存占用与文件大小无关。
+extract_document 是各格式的统一入口，解析前先按文件内容哈希查询提取缓存；
+ProgressiveExtraction 先逐页返回文档开头部分，全文提取同时在后台进行。
+"""
+import io
+import mmap
+import multiprocessing
+import os
+import signal
+import tempfile
+import threading
+import time
+import zipfile
+from collections import namedtuple
+from contextlib import contextmanager
+from xml.etree.ElementTree import iterparse
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, TimeoutError as FutureTimeoutError, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import List, Tuple, Union
+
+from config.config import (
+    PDF_EXTRACT_WORKERS, PDF_PARALLEL_MIN_PAGES, PDF_PAGES_PER_TASK,
+    PDF_EXTRACT_TIMEOUT, PDF_EXTRACT_MEMORY_MB, PROGRESSIVE_EXTRACT_THREADS
+)
+from config.logging_config import logger
+from utils.extraction_cache import ExtractionCache, sha256_of
+from utils.text_normalization import PARAGRAPH_RE
+
+# 提取结果：全文、每页 (起点, 终点) 偏移、每个段落 (起点, 终点) 偏移、是否在预算内完整提取
+ExtractionResult = namedtuple('ExtractionResult', ['text', 'pages', 'paragraphs', 'complete'])
+
+PAGE_SEPARATOR = '\n'
+
+# 提取器版本：实现变化导致输出不同时提升版本号，旧的缓存条目随之失效
+EXTRACTOR_VERSIONS = {
+    'pdfplumber': 1,
+    'pypdf2': 1,
+    'docx': 2,  # v2：流式解析 document.xml，包含表格、文本框、脚注/尾注
+    'doc': 2,  # v2：常驻转换进程池 + 纯 Python OLE 读取
+}
+
+_pool = None
+_pool_lock = threading.Lock()
+_cache = None
+_cache_lock = threading.Lock()
+_background = None
+_background_lock = threading.Lock()
+
+
+def get_extraction_cache() -> ExtractionCache:
+    """进程内共享的提取缓存（懒创建，提取工作进程不会用到）"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = ExtractionCache()
+    return _cache
+
+
+def _limit_worker_memory(memory_mb: int):
+    """进程池初始化：限制工作进程的地址空间（仅类 Unix 系统）"""
+    if not memory_mb:
+        return
+    try:
+        import resource
+        limit = memory_mb * 1024 * 1024
+        resource.setrlimit(resource.RLIMIT_AS, (limit, limit))
+    except (ImportError, ValueError, OSError):
+        pass
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """懒创建进程池（spawn 启动：不继承 Web 进程中已加载的模型，内存上限只约束提取本身）"""
+    global _pool
+    if _pool is None:
+        with _pool_lock:
+            if _pool is None:
+                _pool = ProcessPoolExecutor(
+                    max_workers=max(1, PDF_EXTRACT_WORKERS),
+                    mp_context=multiprocessing.get_context('spawn'),
+                    initializer=_limit_worker_memory,
+                    initargs=(PDF_EXTRACT_MEMORY_MB,)
+                )
+    return _pool
+
+
+def _reset_pool(pool: ProcessPoolExecutor):
+    """进程池损坏（如工作进程因内存上限被终止）后丢弃，下次使用时重建（只在当前进程池仍是它时，并发请求可能已经重建过）"""
+    global _pool
+    with _pool_lock:
+        if _pool is not pool:
+            return
+        _pool = None
+    pool.shutdown(wait=False, cancel_futures=True)
+
+
+class _BudgetExceeded(Exception):
+    """提取任务超出文档的耗时预算"""
+
+
+@contextmanager
+def _time_limit(deadline: float):
+    """
+    在工作进程中限制任务的结束时间（deadline 为 time.time() 时间戳）：到时在正在处理的页中抛出 _BudgetExceeded
+    （只在支持 setitimer 的系统的主线程中生效，其他情况只在页与页之间检查截止时间）
+    """
+    if deadline is None or not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+        yield
+        return
+
+    def on_alarm(signum, frame):
+        raise _BudgetExceeded()
+
+    previous = signal.signal(signal.SIGALRM, on_alarm)
+    signal.setitimer(signal.ITIMER_REAL, max(deadline - time.time(), 0.001))
+    try:
+        yield
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+
+
+def _pdf_page_count(path: str, engine: str) -> int:
+    if engine == 'pypdf2':
+        from PyPDF2 import PdfReader
+        return len(PdfReader(path).pages)
+    import pdfplumber
+    with pdfplumber.open(path) as pdf:
+        return len(pdf.pages)
+
+
+def iter_pdf_pages(path: str, engine: str, start: int = 0, end: int = None):
+    """逐页返回 [start, end) 页的文本（文档只打开一次）"""
+    if engine == 'pypdf2':
+        from PyPDF2 import PdfReader
+        reader = PdfReader(path)
+        for i in range(start, len(reader.pages) if end is None else end):
+            yield reader.pages[i].extract_text() or ''
+        return
+    import pdfplumber
+    pages = None if end is None and start == 0 else list(range(start + 1, end + 1))
+    with pdfplumber.open(path, pages=pages) as pdf:
+        for page in pdf.pages:
+            yield page.extract_text() or ''
+            page.close()  # 释放该页缓存的版面对象，长文档内存保持平稳
+
+
+def _count_pdf_pages(path: str, engine: str, deadline: float = None) -> int:
+    """在工作进程中统计页数（超出预算时返回 None）"""
+    try:
+        with _time_limit(deadline):
+            return _pdf_page_count(path, engine)
+    except _BudgetExceeded:
+        return None
+
+
+def _extract_pdf_pages(path: str, engine: str, start: int, end: int, deadline: float = None) -> List[str]:
+    """
+    提取 [start, end) 页的文本（在工作进程中执行）
+    :param deadline: time.time() 时间戳，到时停止并返回已提取的页（可能少于 end - start 页）
+    """
+    texts = []
+    if deadline is not None and time.time() >= deadline:
+        return texts  # 排在超时文档后面、已经没有预算的任务直接结束
+    try:
+        with _time_limit(deadline):
+            for page_text in iter_pdf_pages(path, engine, start, end):
+                texts.append(page_text)
+    except _BudgetExceeded:
+        pass
+    return texts
+
+
+def join_pages(page_texts: List[str]) -> Tuple[str, List[Tuple[int, int]]]:
+    """按页序拼接文本，返回全文和每页偏移"""
+    pages = []
+    offset = 0
+    for i, page_text in enumerate(page_texts):
+        if i:
+            offset += len(PAGE_SEPARATOR)
+        pages.append((offset, offset + len(page_text)))
+        offset += len(page_text)
+    return PAGE_SEPARATOR.join(page_texts), pages
+
+
+def paragraph_offsets(text: str) -> List[Tuple[int, int]]:
+    """非空段落（按换行切分）在全文中的偏移"""
+    return [(m.start(), m.end()) for m in PARAGRAPH_RE.finditer(text) if m.group().strip()]
+
+
+class _SourceFile:
+    """把 bytes / 文件对象落到临时文件，供工作进程或外部工具按路径读取；本身是路径时直接使用"""
+
+    def __init__(self, source, suffix: str = '.pdf'):
+        self.source = source
+        self.suffix = suffix
+        self.path = None
+        self._temp = False
+
+    def __enter__(self) -> str:
+        if isinstance(self.source, (str, os.PathLike)):
+            self.path = os.fspath(self.source)
+            return self.path
+        data = self.source if isinstance(self.source, (bytes, bytearray)) else self.source.read()
+        fd, self.path = tempfile.mkstemp(suffix=self.suffix)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(data)
+        self._temp = True
+        return self.path
+
+    def __exit__(self, *exc):
+        if self._temp:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+
+
+def _extract_serial(path: str, engine: str, num_pages: int, deadline: float) -> Tuple[List[str], bool]:
+    """在当前进程逐页提取，超过截止时间时停止（进程池不可用时的兜底）"""
+    page_texts = [''] * num_pages
+    for i, page_text in enumerate(iter_pdf_pages(path, engine, 0, num_pages)):
+        page_texts[i] = page_text
+        if i + 1 < num_pages and time.perf_counter() > deadline:
+            return page_texts, False
+    return page_texts, True
+
+
+# 截止时间到后再等工作进程返回部分结果的时间（秒）
+_RESULT_GRACE_SECONDS = 1.0
+
+
+def _extract_in_pool(pool: ProcessPoolExecutor, path: str, engine: str, deadline: float) -> Tuple[List[str], bool]:
+    """
+    在进程池中提取：长文档按页范围分发并行提取，短文档整篇作为一个任务（同样受工作进程内存上限约束）
+    各任务到截止时间自行结束并返回已完成的页，不会继续占用工作进程
+    """
+    wall_deadline = time.time() + max(0.0, deadline - time.perf_counter())
+    count_future = pool.submit(_count_pdf_pages, path, engine, wall_deadline)
+    try:
+        num_pages = count_future.result(timeout=max(0.0, deadline - time.perf_counter()) + _RESULT_GRACE_SECONDS)
+    except FutureTimeoutError:
+        num_pages = None  # 排队等待空闲工作进程时已用完预算
+        count_future.cancel()
+    if num_pages is None:
+        return [], False
+    pages_per_task = PDF_PAGES_PER_TASK if num_pages >= PDF_PARALLEL_MIN_PAGES else max(num_pages, 1)
+
+    page_texts = [''] * num_pages
+    complete = True
+    futures = {
+        pool.submit(_extract_pdf_pages, path, engine, s, min(s + pages_per_task, num_pages), wall_deadline): s
+        for s in range(0, num_pages, pages_per_task)
+    }
+    done, not_done = wait(futures, timeout=max(0.0, deadline - time.perf_counter()) + _RESULT_GRACE_SECONDS)
+    for future in not_done:
+        future.cancel()
+        complete = False
+    for future in done:
+        s = futures[future]
+        try:
+            texts = future.result()
+        except BrokenProcessPool:
+            raise  # 工作进程异常退出，由调用方丢弃进程池并在当前进程兜底
+        except Exception as e:
+            logger.warning(f"PDF 第 {s + 1} 页起的页范围提取失败: {e!r}")
+            complete = False
+            continue
+        if len(texts) < min(pages_per_task, num_pages - s):
+            complete = False  # 超出预算，任务只返回了部分页
+        page_texts[s:s + len(texts)] = texts
+    return page_texts, complete
+
+
+def extract_pdf(source: Union[str, bytes, io.IOBase], engine: str = 'pdfplumber',
+                timeout: float = PDF_EXTRACT_TIMEOUT) -> ExtractionResult:
+    """
+    提取 PDF 全文
+    :param source: 文件路径、bytes 或二进制文件对象
+    :param engine: 'pdfplumber'（默认）或 'pypdf2'
+    :param timeout: 单篇文档的耗时预算（秒），超出时返回已完成的页
+    """
+    start_time = time.perf_counter()
+    deadline = start_time + timeout
+    page_texts = None
+    with _SourceFile(source) as path:
+        pool = None
+        try:
+            pool = _get_pool()
+            page_texts, complete = _extract_in_pool(pool, path, engine, deadline)
+        except (BrokenProcessPool, RuntimeError, OSError) as e:
+            logger.warning(f"PDF 提取进程池不可用，改为在当前进程提取（不受工作进程内存上限约束）: {str(e)}")
+            if pool is not None:
+                _reset_pool(pool)
+        if page_texts is None:
+            page_texts, complete = _extract_serial(path, engine, _pdf_page_count(path, engine), deadline)
+
+    num_pages = len(page_texts)
+    text, pages = join_pages(page_texts)
+    elapsed = time.perf_counter() - start_time
+    if not complete:
+        logger.warning(f"PDF 提取未在预算内完成（{num_pages} 页，{elapsed:.1f} 秒），返回部分文本")
+    logger.info(f"PDF 提取完成：{num_pages} 页，{len(text)} 字符，耗时 {elapsed:.2f} 秒")
+    return ExtractionResult(text, pages, paragraph_offsets(text), complete)
+
+
+# WordprocessingML 标签
+_W = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+_MC_FALLBACK = '{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback'
+_W_P, _W_T, _W_TAB, _W_BR, _W_CR = _W + 'p', _W + 't', _W + 'tab', _W + 'br', _W + 'cr'
+# 正文之后依次读取的部件（脚注、尾注）
+_DOCX_PARTS = ('word/document.xml', 'word/footnotes.xml', 'word/endnotes.xml')
+
+
+def _iter_docx_part(stream):
+    """
+    增量解析一个 WordprocessingML 部件，按文档顺序逐段返回段落文本
+    表格单元格中的段落逐个返回；文本框内的段落先于所在段落返回；
+    mc:Fallback 是 mc:Choice 的兼容副本，跳过以免文本框内容重复
+    """
+    parts = []      # 每层未结束段落已收集的文本片段（文本框中的段落嵌套在外层段落内）
+    stack = []      # 当前打开的元素
+    skip_depth = None
+    for event, elem in iterparse(stream, events=('start', 'end')):
+        if event == 'start':
+            stack.append(elem)
+            if skip_depth is None:
+                if elem.tag == _MC_FALLBACK:
+                    skip_depth = len(stack)
+                elif elem.tag == _W_P:
+                    parts.append([])
+            continue
+
+        if skip_depth is None:
+            tag = elem.tag
+            if tag == _W_T:
+                if parts and elem.text:
+                    parts[-1].append(elem.text)
+            elif tag == _W_TAB:
+                if parts:
+                    parts[-1].append('\t')
+            elif tag == _W_BR or tag == _W_CR:
+                if parts:
+                    parts[-1].append('\n')
+            elif tag == _W_P:
+                yield ''.join(parts.pop())
+        elif len(stack) == skip_depth:
+            skip_depth = None
+        stack.pop()
+        if 0 < len(stack) <= 2:
+            # 顶层块（w:body 下的段落/表格、每条脚注）处理完后从父元素中释放，内存不随文档增长
+            stack[-1].clear()
+
+
+def iter_docx_paragraphs(source):
+    """
+    流式读取 docx 的段落文本（正文，其后是脚注和尾注）
+    :param source: 文件路径、bytes 或二进制文件对象
+    """
+    if isinstance(source, (bytes, bytearray)):
+        source = io.BytesIO(source)
+    with zipfile.ZipFile(source) as archive:
+        names = set(archive.namelist())
+        for part in _DOCX_PARTS:
+            if part in names:
+                with archive.open(part) as stream:
+                    yield from _iter_docx_part(stream)
+
+
+def extract_docx(source) -> ExtractionResult:
+    """提取 docx 文本（包含表格单元格、文本框、脚注和尾注），段落之间以换行分隔"""
+    text = '\n'.join(iter_docx_paragraphs(source))
+    return ExtractionResult(text, [(0, len(text))], paragraph_offsets(text), True)
+
+
+def extract_doc(source) -> ExtractionResult:
+    """提取旧版 Word（.doc）文本（交给常驻的转换进程池，无法直接读取时回退 textract）"""
+    from utils.doc_converter import get_doc_converter
+    with _SourceFile(source, suffix='.doc') as path:
+        text = get_doc_converter().convert(path)
+    return ExtractionResult(text, [(0, len(text))], paragraph_offsets(text), True)
+
+
+def _decode_text_file(path: str) -> str:
+    """通过内存映射解码纯文本文件（不先读出整份 bytes）"""
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return ''
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+            return str(mapped, 'utf-8', 'ignore')
+
+
+def extract_document(source: Union[str, bytes, io.IOBase], file_ext: str,
+                     pdf_engine: str = 'pdfplumber', content_hash: str = None) -> Union[ExtractionResult, None]:
+    """
+    按扩展名提取文档文本（统一入口）
+    非纯文本格式先按 “内容 SHA-256 + 提取器版本” 查询缓存，命中时不再解析文件
+    :param source: 文件路径、bytes 或二进制文件对象
+    :param file_ext: 扩展名（不含点）
+    :param pdf_engine: PDF 提取器，'pdfplumber' 或 'pypdf2'
+    :param content_hash: 已知的内容 SHA-256（如上传时边读边算），省去再读一遍文件
+    :return: ExtractionResult；不支持的格式返回 None
+    """
+    file_ext = (file_ext or '').lower()
+    if not isinstance(source, (str, os.PathLike, bytes, bytearray)):
+        source = source.read()
+
+    if file_ext == 'txt':
+        if isinstance(source, (str, os.PathLike)):
+            text = _decode_text_file(source)
+        else:
+            text = str(source, 'utf-8', 'ignore')
+        return ExtractionResult(text, [(0, len(text))], paragraph_offsets(text), True)
+
+    extractors = {
+        'pdf': (pdf_engine, lambda: extract_pdf(source, engine=pdf_engine)),
+        'docx': ('docx', lambda: extract_docx(source)),
+        'doc': ('doc', lambda: extract_doc(source)),
+    }
+    if file_ext not in extractors:
+        return None
+    name, extract = extractors[file_ext]
+    cache_key = f"{name}-v{EXTRACTOR_VERSIONS[name]}"
+
+    cache = get_extraction_cache()
+    content_hash = content_hash or sha256_of(source)
+    entry = cache.get(content_hash, cache_key)
+    if entry is not None:
+        logger.info(f"提取缓存命中：{content_hash[:12]} ({cache_key})")
+        return ExtractionResult(entry['text'], [tuple(p) for p in entry['pages']],
+                                [tuple(p) for p in entry['paragraphs']], True)
+
+    result = extract()
+    if result.complete:  # 超出预算的部分结果不缓存，下次重新完整提取
+        try:
+            cache.put(content_hash, cache_key, {
+                'text': result.text, 'pages': result.pages, 'paragraphs': result.paragraphs
+            })
+        except OSError as e:
+            logger.warning(f"写入提取缓存失败: {str(e)}")
+    return result
+
+
+def _get_background_executor() -> ThreadPoolExecutor:
+    """渐进式提取的后台线程池（懒创建）"""
+    global _background
+    if _background is None:
+        with _background_lock:
+            if _background is None:
+                _background = ThreadPoolExecutor(max_workers=PROGRESSIVE_EXTRACT_THREADS,
+                                                 thread_name_prefix='progressive-extract')
+    return _background
+
+
+def iter_document_units(source, file_ext: str, pdf_engine: str = 'pdfplumber'):
+    """
+    惰性逐页（PDF）/ 逐段（docx）返回文本，只读到调用方需要的位置为止
+    其他格式没有可以提前返回的单元，整体提取后一次返回
+    """
+    file_ext = (file_ext or '').lower()
+    if file_ext == 'pdf':
+        with _SourceFile(source) as path:
+            yield from iter_pdf_pages(path, pdf_engine)
+    elif file_ext == 'docx':
+        yield from iter_docx_paragraphs(source)
+    else:
+        result = extract_document(source, file_ext, pdf_engine=pdf_engine)
+        if result is not None:
+            yield result.text
+
+
+class ProgressiveExtraction:
+    """
+    渐进式提取：全文提取（走提取缓存和 PDF 进程池）在后台线程进行，
+    head() 同时在当前线程逐页读取开头部分，读够即返回，供关键词检索等只需要开头的阶段提前开始
+    :param owner: 持有 source 的对象（如 SpooledUpload），开头读取和全文提取都结束后调用其 close()
+    """
+
+    _PROGRESSIVE_FORMATS = ('pdf', 'docx')
+
+    def __init__(self, source, file_ext: str, pdf_engine: str = 'pdfplumber',
+                 content_hash: str = None, owner=None):
+        self.source = source
+        self.file_ext = (file_ext or '').lower()
+        self.pdf_engine = pdf_engine
+        self._owner = owner
+        self._users = 2  # 开头读取 + 后台全文提取
+        self._head_released = False
+        self._lock = threading.Lock()
+        self.started = time.perf_counter()
+        self._future = _get_background_executor().submit(
+            extract_document, source, self.file_ext, pdf_engine, content_hash
+        )
+        self._future.add_done_callback(lambda _: self._release())
+
+    def _release(self):
+        with self._lock:
+            self._users -= 1
+            done = self._users == 0
+        if done and self._owner is not None:
+            self._owner.close()
+
+    def _release_head(self):
+        with self._lock:
+            if self._head_released:
+                return
+            self._head_released = True
+        self._release()
+
+    @staticmethod
+    def _head_of(result: ExtractionResult, max_pages: int, max_chars: int) -> str:
+        end = len(result.text)
+        if len(result.pages) > 1 and max_pages:
+            end = result.pages[min(max_pages, len(result.pages)) - 1][1]
+        return result.text[:min(end, max_chars)]
+
+    def head(self, max_pages: int, max_chars: int) -> str:
+        """
+        文档开头的前 max_pages 页（非 PDF 按段落累计）且不超过 max_chars 个字符
+        全文已经提取完（如缓存命中）时直接截取全文
+        """
+        try:
+            if self.file_ext not in self._PROGRESSIVE_FORMATS or self._future.done():
+                result = self._future.result()
+                return self._head_of(result, max_pages, max_chars) if result else ''
+            units = []
+            chars = 0
+            for unit in iter_document_units(self.source, self.file_ext, self.pdf_engine):
+                units.append(unit)
+                chars += len(unit) + len(PAGE_SEPARATOR)
+                if chars >= max_chars or (self.file_ext == 'pdf' and len(units) >= max_pages):
+                    break
+                if self._future.done() and self._future.exception() is None and self._future.result():
+                    return self._head_of(self._future.result(), max_pages, max_chars)
+            head = PAGE_SEPARATOR.join(units)[:max_chars]
+            logger.info(f"文档开头已读取：{len(units)} 个单元，{len(head)} 字符，"
+                        f"耗时 {time.perf_counter() - self.started:.2f} 秒")
+            return head
+        finally:
+            self._release_head()
+
+    def result(self, timeout: float = None) -> Union[ExtractionResult, None]:
+        """等待全文提取完成（提取异常在这里抛出）"""
+        return self._future.result(timeout)
+
+    def text(self, timeout: float = None) -> Union[str, None]:
+        result = self.result(timeout)
+        return result.text if result is not None else None
+
+    def close(self):
+        """不再读取开头部分（未调用 head() 时释放对 source 的占用）"""
+        self._release_head()
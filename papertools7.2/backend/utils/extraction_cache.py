@@ -0,0 +1,143 @@
+# backend/utils/extraction_cache.py
+"""
+文本提取结果缓存
+
+同一份文件往往会先后提交到上传、错字检测、主题提取、查重等多个接口，每次都重新解析原始文件。
+这里按 “文件内容 SHA-256 + 提取器版本” 缓存提取结果（zlib 压缩的全文 + 页/段落偏移），
+存放在本地磁盘，总大小超过上限时按最近使用时间淘汰。提取器实现变化时提升版本号即可让旧缓存失效。
+"""
+import hashlib
+import json
+import os
+import threading
+import time
+import zlib
+from typing import Dict, Optional
+
+from config.config import EXTRACTION_CACHE_DIR, EXTRACTION_CACHE_MAX_MB
+from config.logging_config import logger
+
+_HASH_CHUNK_SIZE = 1024 * 1024
+
+
+def sha256_of(source) -> str:
+    """计算 bytes / 文件路径 / 二进制文件对象内容的 SHA-256（文件按块读取）"""
+    digest = hashlib.sha256()
+    if isinstance(source, (bytes, bytearray, memoryview)):
+        digest.update(source)
+    elif isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            for chunk in iter(lambda: f.read(_HASH_CHUNK_SIZE), b''):
+                digest.update(chunk)
+    else:
+        position = source.tell()
+        for chunk in iter(lambda: source.read(_HASH_CHUNK_SIZE), b''):
+            digest.update(chunk)
+        source.seek(position)
+    return digest.hexdigest()
+
+
+class ExtractionCache:
+    """磁盘上的提取结果缓存（多个 worker 进程共享同一目录）"""
+
+    def __init__(self, cache_dir: str = EXTRACTION_CACHE_DIR, max_bytes: int = EXTRACTION_CACHE_MAX_MB * 1024 * 1024):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        os.makedirs(cache_dir, exist_ok=True)
+        self._lock = threading.Lock()
+        self._total_bytes = None  # 首次写入时统计
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def _path(self, content_hash: str, extractor: str) -> str:
+        return os.path.join(self.cache_dir, content_hash[:2], f"{content_hash}.{extractor}.z")
+
+    def get(self, content_hash: str, extractor: str) -> Optional[Dict]:
+        """
+        读取缓存
+        :return: {'text', 'pages', 'paragraphs'}，未命中时返回 None
+        """
+        path = self._path(content_hash, extractor)
+        try:
+            with open(path, 'rb') as f:
+                entry = json.loads(zlib.decompress(f.read()).decode('utf-8'))
+            os.utime(path)  # 更新最近使用时间，供淘汰使用
+        except FileNotFoundError:
+            entry = None
+        except (OSError, ValueError, zlib.error) as e:
+            logger.warning(f"提取缓存 {os.path.basename(path)} 损坏，忽略: {str(e)}")
+            entry = None
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.hits += 1
+        return entry
+
+    def put(self, content_hash: str, extractor: str, entry: Dict):
+        """写入缓存（临时文件 + 原子重命名），必要时淘汰最久未使用的条目"""
+        path = self._path(content_hash, extractor)
+        data = zlib.compress(json.dumps(entry, ensure_ascii=False).encode('utf-8'), 6)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+
+        with self._lock:
+            if self._total_bytes is None:
+                self._total_bytes = self._scan_size()
+            else:
+                self._total_bytes += len(data)
+            over_limit = self._total_bytes > self.max_bytes
+        if over_limit:
+            self.evict()
+
+    def _entries(self):
+        for root, _, names in os.walk(self.cache_dir):
+            for name in names:
+                if name.endswith('.z'):
+                    path = os.path.join(root, name)
+                    try:
+                        stat = os.stat(path)
+                    except OSError:
+                        continue
+                    yield path, stat.st_size, stat.st_mtime
+
+    def _scan_size(self) -> int:
+        return sum(size for _, size, _ in self._entries())
+
+    def evict(self, target_ratio: float = 0.8):
+        """按最近使用时间淘汰，直到总大小降到上限的 target_ratio"""
+        start = time.perf_counter()
+        entries = sorted(self._entries(), key=lambda item: item[2])
+        total = sum(size for _, size, _ in entries)
+        target = self.max_bytes * target_ratio
+        removed = 0
+        for path, size, _ in entries:
+            if total <= target:
+                break
+            try:
+                os.remove(path)
+            except OSError:
+                continue
+            total -= size
+            removed += 1
+        with self._lock:
+            self._total_bytes = total
+            self.evictions += removed
+        logger.info(f"提取缓存淘汰 {removed} 个条目，当前 {total / 1024 / 1024:.1f} MB，"
+                    f"耗时 {time.perf_counter() - start:.2f} 秒")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions,
+                'size_bytes': self._total_bytes,
+                'max_bytes': self.max_bytes
+            }
@@ -0,0 +1,299 @@
+# backend/utils/fingerprint_store.py
+"""
+持久化的增量指纹倒排索引（LSM 风格）
+
+- 每次上传论文写入一个按哈希排序的不可变段文件（seg_<序号>.npy），查询时内存映射 + 二分查找
+- 删除论文只追加一条墓碑记录（tombstones.log），不改写段文件
+- 分层合并：同一规模层级的段累积到 FINGERPRINT_MERGE_FACTOR 个时合并为一个更大的段，
+  每条记录只会被合并约 log(总记录数) 次，写入代价不随论文库规模线性增长；合并时清理不再需要的墓碑
+多个 worker 进程共享同一目录：写入通过临时文件 + 原子重命名完成；新增段、墓碑和合并都在文件锁内
+先同步磁盘状态再分配序号，保证序号在各进程间单调递增（墓碑的序号一定大于它之前写入的任何段）
+"""
+import os
+import threading
+import time
+from contextlib import contextmanager
+from typing import Dict, List
+
+import numpy as np
+
+from config.config import FINGERPRINT_INDEX_DIR, FINGERPRINT_MERGE_FACTOR
+from config.logging_config import logger
+from utils.winnowing import Fingerprint, rank_matches
+
+try:
+    import fcntl  # Windows 下不可用，退化为进程内锁
+except ImportError:
+    fcntl = None
+
+RECORD_DTYPE = np.dtype([('hash', '<u8'), ('doc', '<i8'), ('start', '<u4'), ('end', '<u4')])
+_SEGMENT_PREFIX = 'seg_'
+_SEGMENT_SUFFIX = '.npy'
+_DOCS_SUFFIX = '.docs.npy'
+
+
+class _Segment:
+    """一个不可变段：按哈希排序的指纹记录 + 段内文档 ID 集合"""
+
+    def __init__(self, seq: int, records: np.ndarray, docs: set):
+        self.seq = seq
+        self.records = records
+        self.hashes = records['hash']
+        self.docs = docs
+
+
+class PersistentFingerprintIndex:
+    """与 FingerprintIndex 接口一致的磁盘指纹索引"""
+
+    def __init__(self, index_dir: str = FINGERPRINT_INDEX_DIR, merge_factor: int = FINGERPRINT_MERGE_FACTOR):
+        self.index_dir = index_dir
+        self.merge_factor = max(2, merge_factor)
+        os.makedirs(index_dir, exist_ok=True)
+        self.tombstone_path = os.path.join(index_dir, 'tombstones.log')
+        self.lock_path = os.path.join(index_dir, '.lock')
+
+        self._lock = threading.RLock()
+        self._segments = {}     # seq -> _Segment
+        self._tombstones = {}   # doc_id -> 删除时的序号（序号更大的段中的记录仍然有效）
+        self._tombstone_pos = 0
+        self._tombstone_head = None  # 墓碑文件首行：合并改写时写入唯一的版本行，首行变化说明文件已被替换，需要从头读取
+        self._refresh()
+
+    # ------------------------- 文件读写 -------------------------
+    def _file_lock(self):
+        lock_file = open(self.lock_path, 'a')
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        return lock_file
+
+    @staticmethod
+    def _file_unlock(lock_file):
+        if fcntl:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+        lock_file.close()
+
+    @contextmanager
+    def _write_locked(self):
+        """持文件锁修改索引（先取文件锁再取进程内锁，与 compact 顺序一致），并同步其他进程的最新状态"""
+        lock_file = self._file_lock()
+        try:
+            with self._lock:
+                self._refresh()
+                yield
+        finally:
+            self._file_unlock(lock_file)
+
+    def _next_seq(self) -> int:
+        """在文件锁内调用：大于磁盘上已有的任何段和墓碑序号（即使系统时钟回拨）"""
+        latest = max(list(self._segments) + list(self._tombstones.values()) + [0])
+        return max(time.time_ns(), latest + 1)
+
+    def _segment_path(self, seq: int, suffix: str = _SEGMENT_SUFFIX) -> str:
+        return os.path.join(self.index_dir, f"{_SEGMENT_PREFIX}{seq:020d}{suffix}")
+
+    def _write_segment(self, seq: int, records: np.ndarray, docs) -> np.ndarray:
+        """
+        先写文档列表再写记录文件，记录文件出现即代表段完整可用
+        文档列表按写入时给定的 ID 保存（没有指纹的论文也要记录，否则重新加载后会被当作未建索引）
+        """
+        records = np.sort(records, order='hash')
+        docs = np.array(sorted(int(d) for d in docs), dtype='<i8')
+        for path, data in ((self._segment_path(seq, _DOCS_SUFFIX), docs), (self._segment_path(seq), records)):
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, 'wb') as f:
+                np.save(f, data)
+            os.replace(tmp_path, path)
+        return records
+
+    def _refresh(self):
+        """同步其他进程新增/合并的段以及新的墓碑"""
+        with self._lock:
+            names = [n for n in os.listdir(self.index_dir)
+                     if n.startswith(_SEGMENT_PREFIX) and n.endswith(_SEGMENT_SUFFIX) and not n.endswith(_DOCS_SUFFIX)]
+            on_disk = {int(n[len(_SEGMENT_PREFIX):-len(_SEGMENT_SUFFIX)]) for n in names}
+            for seq in list(self._segments):
+                if seq not in on_disk:
+                    del self._segments[seq]  # 已被合并
+            for seq in on_disk - set(self._segments):
+                try:
+                    records = np.load(self._segment_path(seq), mmap_mode='r')
+                    docs = set(np.load(self._segment_path(seq, _DOCS_SUFFIX)).tolist())
+                except (OSError, ValueError) as e:
+                    logger.warning(f"加载指纹段 {seq} 失败（可能正在合并）: {str(e)}")
+                    continue
+                self._segments[seq] = _Segment(seq, records, docs)
+
+            if os.path.exists(self.tombstone_path):
+                # 不能用 inode 判断文件是否被替换：旧文件删除后 inode 号可能被新文件复用
+                with open(self.tombstone_path, 'rb') as f:
+                    head = f.readline()
+                    if not head.endswith(b'\n'):
+                        head = b''  # 空文件或首行尚未写完
+                    if head != self._tombstone_head:
+                        self._tombstones, self._tombstone_pos = {}, 0  # 合并后墓碑文件被改写
+                        self._tombstone_head = head
+                    f.seek(self._tombstone_pos)
+                    for line in f:
+                        if not line.endswith(b'\n'):
+                            break
+                        self._tombstone_pos += len(line)
+                        if line.startswith(b'#'):
+                            continue  # 版本行
+                        doc, _, seq = line.strip().partition(b'\t')
+                        self._tombstones[int(doc)] = max(self._tombstones.get(int(doc), 0), int(seq))
+
+    def _is_live(self, doc_id: int, seq: int) -> bool:
+        return seq > self._tombstones.get(doc_id, -1)
+
+    # ------------------------- 对外接口 -------------------------
+    def refresh(self):
+        """手动同步磁盘上的最新状态"""
+        self._refresh()
+
+    def __contains__(self, doc_id):
+        with self._lock:
+            return any(doc_id in seg.docs and self._is_live(doc_id, seq) for seq, seg in self._segments.items())
+
+    def __len__(self):
+        with self._lock:
+            return len({doc for seq, seg in self._segments.items() for doc in seg.docs if self._is_live(doc, seq)})
+
+    def add(self, doc_id, fingerprints: List[Fingerprint]):
+        """追加一篇论文的指纹（新段），已存在的旧指纹会被新段覆盖"""
+        records = np.zeros(len(fingerprints), dtype=RECORD_DTYPE)
+        if fingerprints:
+            records['hash'], records['start'], records['end'] = zip(*fingerprints)
+        records['doc'] = doc_id
+        with self._write_locked():
+            if doc_id in self:
+                self._append_tombstone(doc_id)
+            seq = self._next_seq()
+            records = self._write_segment(seq, records, [doc_id])
+            self._segments[seq] = _Segment(seq, records, {doc_id})
+        self.maybe_compact()
+
+    def remove(self, doc_id):
+        """删除论文：追加墓碑记录"""
+        with self._write_locked():
+            self._append_tombstone(doc_id)
+            self._refresh()
+
+    def _append_tombstone(self, doc_id):
+        """调用方持有文件锁"""
+        seq = self._next_seq()
+        with open(self.tombstone_path, 'ab') as f:
+            f.write(f"{int(doc_id)}\t{seq}\n".encode('ascii'))
+        self._tombstones[int(doc_id)] = seq
+
+    def query(self, fingerprints: List[Fingerprint], exclude=None, min_similarity: float = 0.0) -> List[Dict]:
+        """查询共享指纹的论文（每个段内二分查找，不读取原始文件）"""
+        if not fingerprints:
+            return []
+        self._refresh()
+        query_hashes = np.unique(np.fromiter((fp.hash for fp in fingerprints), dtype='<u8', count=len(fingerprints)))
+
+        hits = []
+        with self._lock:
+            segments = list(self._segments.values())
+        for seg in segments:
+            if not len(seg.hashes):
+                continue
+            lo = np.searchsorted(seg.hashes, query_hashes, side='left')
+            hi = np.searchsorted(seg.hashes, query_hashes, side='right')
+            for start, end in zip(lo[hi > lo], hi[hi > lo]):
+                for record in seg.records[start:end]:
+                    doc_id = int(record['doc'])
+                    if doc_id == exclude or not self._is_live(doc_id, seg.seq):
+                        continue
+                    hits.append((int(record['hash']), doc_id, int(record['start']), int(record['end'])))
+        return rank_matches(fingerprints, hits, min_similarity)
+
+    def _tier(self, seg: _Segment) -> int:
+        """段的规模层级：记录数每增长 merge_factor 倍升一级（整数运算，避免浮点对数在边界上少算一级）"""
+        size, tier = len(seg.records), 0
+        while size >= self.merge_factor:
+            size //= self.merge_factor
+            tier += 1
+        return tier
+
+    def _merge_groups(self) -> List[List[int]]:
+        """同一层级累积到 merge_factor 个段时，这一层的段合并为一组"""
+        tiers = {}
+        for seq, seg in self._segments.items():
+            tiers.setdefault(self._tier(seg), []).append(seq)
+        return [sorted(seqs) for seqs in tiers.values() if len(seqs) >= self.merge_factor]
+
+    def maybe_compact(self):
+        """有层级的段数量达到合并因子时触发合并"""
+        with self._lock:
+            needed = bool(self._merge_groups())
+        if needed:
+            self.compact(full=False)
+
+    def compact(self, full: bool = True):
+        """
+        合并段，丢弃已删除论文的记录，只保留仍有作用的墓碑
+        :param full: True 时把所有段合并为一个段；False 时只合并达到合并因子的层级
+        """
+        with self._write_locked():
+            start = time.perf_counter()
+            groups = [sorted(self._segments)] if full else self._merge_groups()
+            grouped = {seq for group in groups for seq in group}
+            # 所有论文都已删除的段直接丢弃
+            dead = [seq for seq, seg in self._segments.items()
+                    if seq not in grouped and not any(self._is_live(doc, seq) for doc in seg.docs)]
+            groups = [group for group in groups if len(group) > 1 or self._tombstones]
+            if not groups and not dead:
+                return
+
+            merged_records = 0
+            for group in groups:
+                live_parts = []
+                live_docs = set()
+                for seq in group:
+                    seg = self._segments[seq]
+                    records = np.asarray(seg.records)
+                    if len(records) and self._tombstones:
+                        tomb = np.array([self._tombstones.get(int(d), -1) for d in records['doc']], dtype=np.int64)
+                        records = records[seq > tomb]
+                    live_parts.append(records)
+                    live_docs.update(doc for doc in seg.docs if self._is_live(doc, seq))
+                merged = np.concatenate(live_parts) if live_parts else np.zeros(0, dtype=RECORD_DTYPE)
+                # 先写入新段（更大的序号）再删除旧段：其他进程任意时刻看到的都是完整数据（最多短暂重复）
+                seq = self._next_seq()
+                merged = self._write_segment(seq, merged, live_docs)
+                self._segments[seq] = _Segment(seq, merged, live_docs)
+                merged_records += len(merged)
+            removed = [seq for group in groups for seq in group] + dead
+            for seq in removed:
+                del self._segments[seq]
+                for suffix in (_SEGMENT_SUFFIX, _DOCS_SUFFIX):
+                    try:
+                        os.remove(self._segment_path(seq, suffix))
+                    except OSError:
+                        pass  # Windows 下仍被映射的文件无法删除，下次合并再清理
+            self._rewrite_tombstones()
+            self._refresh()
+            logger.info(f"指纹索引合并完成：{len(removed)} 个段 -> {len(groups)} 个段，"
+                        f"{merged_records} 条记录，耗时 {time.perf_counter() - start:.2f} 秒")
+
+    def _rewrite_tombstones(self):
+        """只保留仍会屏蔽某个段中记录的墓碑（调用方持有文件锁），原子替换墓碑文件（首行为唯一的版本行）"""
+        keep = {doc: seq for doc, seq in self._tombstones.items()
+                if any(doc in seg.docs and seg_seq < seq for seg_seq, seg in self._segments.items())}
+        tmp_path = f"{self.tombstone_path}.{os.getpid()}.tmp"
+        with open(tmp_path, 'wb') as f:
+            f.write(f"#{self._next_seq()}\n".encode('ascii'))
+            f.write(''.join(f"{doc}\t{seq}\n" for doc, seq in keep.items()).encode('ascii'))
+        os.replace(tmp_path, self.tombstone_path)
+        self._tombstones, self._tombstone_pos, self._tombstone_head = {}, 0, None
+
+    def get_stats(self) -> Dict:
+        """索引规模统计"""
+        with self._lock:
+            return {
+                'segments': len(self._segments),
+                'records': int(sum(len(seg.records) for seg in self._segments.values())),
+                'papers': len(self),
+                'tombstones': len(self._tombstones)
+            }
@@ -0,0 +1,95 @@
+# backend/utils/paper_text_store.py
+"""
+已上传论文的文本与解析状态存储
+
+上传时后台解析出的全文按论文 ID 压缩保存在本地磁盘（不受提取缓存淘汰影响，
+也不受数据库 TEXT 字段长度限制），解析状态以 JSON 记录，多个 worker 进程共享同一目录。
+目录与上传文件同在 store 下（旧版本放在缓存目录中，首次启动时迁移过来）。
+"""
+import json
+import os
+import tempfile
+import time
+import zlib
+from typing import Dict, Optional
+
+from config.config import LEGACY_PAPER_TEXT_DIR, PAPER_TEXT_DIR
+from config.logging_config import logger
+
+# 解析状态
+STATUS_PENDING = 'pending'
+STATUS_RUNNING = 'running'
+STATUS_DONE = 'done'
+STATUS_FAILED = 'failed'
+
+
+class PaperTextStore:
+    """论文 ID -> 提取文本 / 解析状态"""
+
+    def __init__(self, store_dir: str = PAPER_TEXT_DIR, legacy_dir: str = LEGACY_PAPER_TEXT_DIR):
+        self.store_dir = store_dir
+        os.makedirs(store_dir, exist_ok=True)
+        if legacy_dir and os.path.isdir(legacy_dir) and os.path.abspath(legacy_dir) != os.path.abspath(store_dir):
+            self._migrate(legacy_dir)
+
+    def _migrate(self, legacy_dir: str):
+        """把旧版本保存在缓存目录中的文本移到存储目录（已存在的不覆盖）"""
+        moved = 0
+        for name in os.listdir(legacy_dir):
+            if name.endswith('.tmp') or os.path.exists(os.path.join(self.store_dir, name)):
+                continue
+            try:
+                os.replace(os.path.join(legacy_dir, name), os.path.join(self.store_dir, name))
+                moved += 1
+            except OSError:
+                pass  # 其他 worker 已经移走，或跨文件系统（保留在原处，读取时回退到解析原始文件）
+        if moved:
+            logger.info(f"已将 {moved} 个论文文本文件从 {legacy_dir} 迁移到 {self.store_dir}")
+
+    def _path(self, paper_id, suffix: str) -> str:
+        return os.path.join(self.store_dir, f"{int(paper_id)}{suffix}")
+
+    @staticmethod
+    def _atomic_write(path: str, data: bytes):
+        # 临时文件名唯一（同一进程的多个线程可能同时写同一篇论文），与目标同目录保证 os.replace 是原子的
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.replace(tmp_path, path)
+        except BaseException:
+            try:
+                os.remove(tmp_path)
+            except OSError:
+                pass
+            raise
+
+    def put_text(self, paper_id, text: str):
+        self._atomic_write(self._path(paper_id, '.txt.z'), zlib.compress(text.encode('utf-8'), 6))
+
+    def get_text(self, paper_id) -> Optional[str]:
+        try:
+            with open(self._path(paper_id, '.txt.z'), 'rb') as f:
+                return zlib.decompress(f.read()).decode('utf-8')
+        except FileNotFoundError:
+            return None
+
+    def set_status(self, paper_id, status: str, **info):
+        """记录解析状态（附带耗时、字符数、错误信息等）"""
+        record = {'paper_id': int(paper_id), 'status': status, 'updated_at': time.time()}
+        record.update(info)
+        self._atomic_write(self._path(paper_id, '.status.json'), json.dumps(record, ensure_ascii=False).encode('utf-8'))
+
+    def get_status(self, paper_id) -> Optional[Dict]:
+        try:
+            with open(self._path(paper_id, '.status.json'), 'r', encoding='utf-8') as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def delete(self, paper_id):
+        for suffix in ('.txt.z', '.status.json'):
+            try:
+                os.remove(self._path(paper_id, suffix))
+            except OSError:
+                pass
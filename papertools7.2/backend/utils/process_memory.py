@@ -0,0 +1,48 @@
+# backend/utils/process_memory.py
+"""
+进程内存统计
+
+多个 worker 进程通过 fork 共享预加载的模型时，RSS 会把共享页重复计入每个进程，
+因此同时给出 PSS（共享页按共享进程数均摊）和私有脏页，用来判断模型内存是否真正被共享。
+数据来自 /proc（仅 Linux），其他平台退化为 getrusage 的峰值 RSS。
+"""
+import os
+from typing import Dict, Optional
+
+_SMAPS_FIELDS = {
+    'Rss': 'rss_mb',
+    'Pss': 'pss_mb',
+    'Shared_Clean': 'shared_clean_mb',
+    'Shared_Dirty': 'shared_dirty_mb',
+    'Private_Clean': 'private_clean_mb',
+    'Private_Dirty': 'private_dirty_mb'
+}
+
+
+def process_memory(pid: Optional[int] = None) -> Dict:
+    """返回进程内存占用（MB）；pid 为空时统计当前进程"""
+    pid = pid or os.getpid()
+    usage = {'pid': pid}
+    try:
+        with open(f'/proc/{pid}/smaps_rollup') as f:
+            for line in f:
+                name, _, value = line.partition(':')
+                if name in _SMAPS_FIELDS:
+                    usage[_SMAPS_FIELDS[name]] = round(int(value.split()[0]) / 1024, 1)
+        return usage
+    except (OSError, ValueError):
+        pass
+    try:
+        with open(f'/proc/{pid}/status') as f:
+            for line in f:
+                if line.startswith('VmRSS:'):
+                    usage['rss_mb'] = round(int(line.split()[1]) / 1024, 1)
+                    return usage
+    except (OSError, ValueError):
+        pass
+    if pid == os.getpid():
+        import resource
+        import sys
+        peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        usage['max_rss_mb'] = round(peak / (1024 * 1024 if sys.platform == 'darwin' else 1024), 1)
+    return usage
@@ -0,0 +1,349 @@
+# backend/utils/spell_shards.py
+"""
+按句分片的并行错字检测引擎
+
+pycorrector 的语言模型打分是 CPU 密集型的。这里把文档按句切分并合并成若干分片，
+分发到常驻进程池（每个工作进程启动时加载一次 Corrector 并一直复用），
+每个分片只做一次 correct()（同时得到错误位置和建议），再把分片内的位置加上分片偏移合并回全文。
+
+检测结果按句缓存（utils.typo_cache）：只有缓存中没有的句子才会组成分片送去检测，
+缓存中的句内位置加上句子在本次文档中的起点即为全文位置，因此小改后复查的耗时与改动量成正比。
+"""
+import bisect
+import multiprocessing
+import os
+import threading
+import time
+from collections import namedtuple
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from typing import Callable, Dict, List, Optional, Tuple
+
+from config.config import SPELL_CHECK_WORKERS, SPELL_SHARD_MIN_CHARS, SPELL_SHARD_MAX_CHARS, SPELL_CHECK_TIMEOUT
+from config.logging_config import logger
+from utils.process_memory import process_memory
+from utils.text_normalization import SPELL_SENTENCE_SPLIT_RE, Span, split_sentences
+from utils.typo_cache import SentenceTypoCache, get_typo_cache, sentence_key
+
+# 检测到的错误：全文中的起止位置、错误文本、建议
+CorrectorError = namedtuple('CorrectorError', ['start', 'end', 'wrong', 'correct'])
+
+_worker_corrector = None      # 工作进程（或预加载模式下 web 进程）内常驻的 Corrector
+_worker_load_seconds = None   # 加载 Corrector 的耗时
+
+
+def correct_errors(corrector, text: str) -> List[CorrectorError]:
+    """
+    对一段文本做一次 correct()，统一不同版本 pycorrector 的返回格式
+    - 1.x：{'source', 'target', 'errors': [(错误, 建议, 起点), ...]}
+    - 0.x：(纠正后文本, [(错误, 建议, 起点, 终点), ...])
+    """
+    if not text.strip():
+        return []
+    result = corrector.correct(text)
+    if isinstance(result, dict):
+        return [CorrectorError(e[2], e[2] + len(e[0]), e[0], e[1]) for e in result.get('errors') or []]
+    _, details = result
+    return [CorrectorError(d[2], d[3], d[0], d[1]) for d in details]
+
+
+def _content_sentences(text: str) -> List[Span]:
+    """按句切分并去掉句子首尾空白（缩进、换行不同不影响缓存命中），跳过空白句"""
+    sentences = []
+    for sentence in split_sentences(text, SPELL_SENTENCE_SPLIT_RE):
+        stripped = sentence.text.strip()
+        if stripped:
+            start = sentence.start + len(sentence.text) - len(sentence.text.lstrip())
+            sentences.append(Span(stripped, start, start + len(stripped)))
+    return sentences
+
+
+def _group_sentences(sentences: List[Span], target_chars: int) -> List[Tuple[str, List[int]]]:
+    """
+    把待检测的句子合并成约 target_chars 个字符的分片
+    句子之间用换行分隔（保证句子边界不变），返回 (分片文本, 每个句子在分片中的起点)
+    """
+    groups = []
+    parts, starts, length = [], [], 0
+    for sentence in sentences:
+        starts.append(length)
+        parts.append(sentence.text)
+        length += len(sentence.text) + 1
+        if length >= target_chars:
+            groups.append(('\n'.join(parts), starts))
+            parts, starts, length = [], [], 0
+    if parts:
+        groups.append(('\n'.join(parts), starts))
+    return groups
+
+
+def detect_with_cache(text: str, run_shards: Callable[[List[str]], List[List[CorrectorError]]],
+                      shard_size: Callable[[int], int], cache: Optional[SentenceTypoCache] = None) -> Tuple[List[CorrectorError], Dict]:
+    """
+    按句查缓存，只把未命中的句子组成分片交给 run_shards 检测（返回分片内位置），结果写回缓存
+    :param shard_size: 待检测字符数 -> 分片大小
+    :return: (按位置排序的全文错误, 本次统计 {sentences, cached_sentences, checked_chars, shards})
+    """
+    sentences = _content_sentences(text)
+    keys = [sentence_key(sentence.text) for sentence in sentences]
+    cached = cache.get_many(keys) if cache is not None else {}
+
+    sentence_errors = [cached.get(key) for key in keys]  # 句内位置
+    pending = [i for i, errors in enumerate(sentence_errors) if errors is None]
+    checked_chars = sum(len(sentences[i].text) for i in pending)
+    groups = _group_sentences([sentences[i] for i in pending], shard_size(checked_chars))
+    if groups:
+        for i in pending:
+            sentence_errors[i] = []
+        shard_results = run_shards([shard_text for shard_text, _ in groups])
+        position = 0
+        for (_, starts), errors in zip(groups, shard_results):
+            members = pending[position:position + len(starts)]
+            position += len(starts)
+            for error in errors:
+                j = bisect.bisect_right(starts, error.start) - 1
+                offset = starts[j]
+                sentence_errors[members[j]].append((error.start - offset, error.end - offset, error.wrong, error.correct))
+        if cache is not None:
+            cache.put_many({keys[i]: sentence_errors[i] for i in pending})
+
+    errors = [
+        CorrectorError(sentence.start + start, sentence.start + end, wrong, correct)
+        for sentence, found in zip(sentences, sentence_errors)
+        for start, end, wrong, correct in found
+    ]
+    errors.sort(key=lambda e: e.start)
+    return errors, {
+        'sentences': len(sentences),
+        'cached_sentences': len(sentences) - len(pending),
+        'checked_chars': checked_chars,
+        'shards': len(groups)
+    }
+
+
+def _load_corrector():
+    global _worker_corrector, _worker_load_seconds
+    from pycorrector import Corrector
+    start = time.perf_counter()
+    _worker_corrector = Corrector()
+    _worker_load_seconds = time.perf_counter() - start
+    return _worker_corrector
+
+
+def _init_worker():
+    """工作进程初始化：加载 Corrector（语言模型只在进程启动时加载一次；fork 启动时已继承预加载的模型）"""
+    if _worker_corrector is None:
+        _load_corrector()
+
+
+def _ping() -> Tuple[int, float]:
+    return os.getpid(), _worker_load_seconds
+
+
+def preload_corrector():
+    """
+    预加载模式：在 web 主进程 fork 出 worker 之前加载 Corrector
+    （配合 gunicorn preload_app，模型内存以写时复制的方式被所有 worker 共享，不再每个 worker 各加载一份）
+    """
+    if _worker_corrector is None:
+        _load_corrector()
+        logger.info(f"预加载 Corrector 完成，耗时 {_worker_load_seconds:.2f} 秒，当前进程内存 {process_memory()}")
+    return _worker_corrector
+
+
+def preloaded_corrector():
+    """已预加载的 Corrector（未预加载时为 None）"""
+    return _worker_corrector
+
+
+def preloaded_model_stats() -> Dict:
+    """预加载模型的加载耗时和当前进程内存（进程池模式下本进程未加载模型）"""
+    return {
+        'preloaded': _worker_corrector is not None,
+        'load_seconds': round(_worker_load_seconds, 2) if _worker_load_seconds is not None else None,
+        'memory': process_memory()
+    }
+
+
+def _correct_shard(text: str) -> Tuple[List[CorrectorError], float, Tuple[int, float]]:
+    """在工作进程中检测一个分片（位置为分片内位置），并返回耗时和工作进程信息"""
+    start = time.perf_counter()
+    errors = correct_errors(_worker_corrector, text)
+    return errors, time.perf_counter() - start, _ping()
+
+
+class ShardedCorrector:
+    """持有常驻 Corrector 工作进程的分片检测引擎"""
+
+    def __init__(self, workers: int = SPELL_CHECK_WORKERS, cache: Optional[SentenceTypoCache] = None):
+        self.workers = max(1, workers)
+        self._pool = None
+        self._lock = threading.Lock()
+        self.cache = cache
+        self._worker_load_seconds = {}  # 工作进程 pid -> 模型加载耗时
+        self._retired = 0  # 已退役、仍在完成剩余任务的进程池数
+
+        # 统计
+        self.documents = 0
+        self.shards = 0
+        self.shard_time = 0.0
+        self.wall_time = 0.0
+
+    def _get_pool(self) -> ProcessPoolExecutor:
+        """
+        懒创建进程池
+        本进程已预加载模型时以 fork 启动，工作进程写时复制共享这份模型；否则 spawn 启动，工作进程只加载检测所需的模块和模型
+        """
+        with self._lock:
+            if self._pool is None:
+                method = 'fork' if _worker_corrector is not None and 'fork' in multiprocessing.get_all_start_methods() \
+                    else 'spawn'
+                self._pool = ProcessPoolExecutor(
+                    max_workers=self.workers,
+                    mp_context=multiprocessing.get_context(method),
+                    initializer=_init_worker
+                )
+            return self._pool
+
+    def _retire_pool(self, pool: ProcessPoolExecutor):
+        """
+        让超时后仍被占用的进程池退役：新任务改用新建的进程池，旧进程池不再接收任务，
+        其他请求已提交的分片照常完成，全部完成后工作进程自行退出（不终止工作进程，避免其他请求收到 BrokenProcessPool）
+        """
+        with self._lock:
+            if self._pool is not pool:
+                return  # 已被其他请求替换
+            self._pool = None
+            self._worker_load_seconds.clear()
+            self._retired += 1
+        threading.Thread(target=self._drain, args=(pool,), name='spell-pool-drain', daemon=True).start()
+
+    def _drain(self, pool: ProcessPoolExecutor):
+        pool.shutdown(wait=True)
+        with self._lock:
+            self._retired -= 1
+
+    def _discard_pool(self, pool: ProcessPoolExecutor):
+        """工作进程异常退出后丢弃已损坏的进程池，下次使用时重建"""
+        with self._lock:
+            if self._pool is not pool:
+                return
+            self._pool = None
+            self._worker_load_seconds.clear()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+    def submit(self, fn, *args) -> Future:
+        """
+        在常驻工作进程中执行其他检测任务（如批量检测中的整篇文档），与分片检测共用同一组进程和模型
+        任务内可通过 preloaded_corrector() 取得工作进程中的 Corrector；工作进程异常退出时进程池会被丢弃
+        """
+        pool = self._get_pool()
+        future = pool.submit(fn, *args)
+        future.add_done_callback(lambda f: self._on_done(pool, f))
+        return future
+
+    def _on_done(self, pool: ProcessPoolExecutor, future: Future):
+        if not future.cancelled() and isinstance(future.exception(), BrokenProcessPool):
+            self._discard_pool(pool)
+
+    def warmup(self):
+        """启动全部工作进程并加载模型（create_app 启动时在后台调用，避免第一个请求在检测时限内承担加载耗时）"""
+        pool = self._get_pool()
+        futures = [pool.submit(_ping) for _ in range(self.workers)]
+        wait(futures)
+        with self._lock:
+            for future in futures:
+                pid, load_seconds = future.result()
+                self._worker_load_seconds[pid] = load_seconds
+
+    def shard_size(self, text_length: int) -> int:
+        """每个工作进程约分到 4 个分片，便于负载均衡；分片大小限制在 [最小, 最大] 之间"""
+        return max(SPELL_SHARD_MIN_CHARS, min(SPELL_SHARD_MAX_CHARS, text_length // (self.workers * 4) + 1))
+
+    def _run_shards(self, shards: List[str], timeout: float) -> Tuple[List[List[CorrectorError]], float]:
+        """把分片分发到进程池，返回各分片的错误（分片内位置）和分片累计耗时"""
+        pool = self._get_pool()
+        futures = [pool.submit(_correct_shard, shard) for shard in shards]
+        done, not_done = wait(futures, timeout=timeout)
+        if not_done:
+            # 取消本请求仍在排队的分片；已在执行的分片无法中断，让这个进程池退役，后续请求不必排在它们后面
+            if not all(future.cancel() for future in not_done):
+                self._retire_pool(pool)
+            raise TimeoutError(f'错字检测超时（{len(not_done)}/{len(shards)} 个分片未完成）')
+
+        results = []
+        shard_time = 0.0
+        workers = {}
+        try:
+            for future in futures:
+                shard_errors, elapsed, (pid, load_seconds) = future.result()
+                results.append(shard_errors)
+                shard_time += elapsed
+                workers[pid] = load_seconds
+        except BrokenProcessPool:
+            self._discard_pool(pool)
+            raise
+        with self._lock:
+            self._worker_load_seconds.update(workers)
+        return results, shard_time
+
+    def detect(self, text: str, timeout: float = SPELL_CHECK_TIMEOUT) -> List[CorrectorError]:
+        """
+        检测全文，返回按位置排序的错误（全文位置）；缓存命中的句子不再送入进程池
+        :raises TimeoutError: 超过 timeout 秒未完成
+        :raises BrokenProcessPool: 工作进程异常退出（进程池已重置，由调用方决定是否在本进程兜底）
+        """
+        start = time.perf_counter()
+        shard_time = 0.0
+
+        def run_shards(shards: List[str]) -> List[List[CorrectorError]]:
+            nonlocal shard_time
+            results, shard_time = self._run_shards(shards, timeout)
+            return results
+
+        errors, summary = detect_with_cache(text, run_shards, self.shard_size, self.cache)
+
+        wall = time.perf_counter() - start
+        with self._lock:
+            self.documents += 1
+            self.shards += summary['shards']
+            self.shard_time += shard_time
+            self.wall_time += wall
+        logger.info(f"分片错字检测完成：{len(text)} 字符，{summary['sentences']} 句（缓存命中 {summary['cached_sentences']} 句），"
+                    f"检测 {summary['checked_chars']} 字符 / {summary['shards']} 个分片，{len(errors)} 处错误，"
+                    f"耗时 {wall:.2f} 秒（分片累计 {shard_time:.2f} 秒）")
+        return errors
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            return {
+                'workers': self.workers,
+                'retired_pools': self._retired,
+                'documents': self.documents,
+                'shards': self.shards,
+                'avg_shard_seconds': round(self.shard_time / self.shards, 4) if self.shards else 0,
+                'avg_document_seconds': round(self.wall_time / self.documents, 4) if self.documents else 0,
+                # 分片累计耗时 / 墙钟耗时：接近工作进程数说明并行充分
+                'parallelism': round(self.shard_time / self.wall_time, 2) if self.wall_time else 0,
+                'sentence_cache': self.cache.get_stats() if self.cache is not None else None,
+                # 各工作进程的模型加载耗时与当前内存（进程池启动之后才有数据）
+                'worker_models': [
+                    dict(process_memory(pid), load_seconds=round(seconds, 2) if seconds is not None else None)
+                    for pid, seconds in self._worker_load_seconds.items()
+                ],
+                'local_model': preloaded_model_stats()
+            }
+
+
+_engine = None
+_engine_lock = threading.Lock()
+
+
+def get_sharded_corrector() -> ShardedCorrector:
+    """进程内共享的分片检测引擎"""
+    global _engine
+    if _engine is None:
+        with _engine_lock:
+            if _engine is None:
+                _engine = ShardedCorrector(cache=get_typo_cache())
+    return _engine
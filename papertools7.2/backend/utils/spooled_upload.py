@@ -0,0 +1,147 @@
+# backend/utils/spooled_upload.py
+"""
+流式上传缓冲
+
+上传文件按块读取：小文件留在内存，超过阈值后转存到临时文件；读取的同时计算 SHA-256、检查大小上限。
+提取器拿到的是文件路径（内存中的小文件为 bytes），纯文本通过内存映射直接解码，
+不再出现 file.read() -> BytesIO -> str 的多份整文件拷贝。
+"""
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from typing import Union
+
+from config.config import MAX_CONTENT_LENGTH, UPLOAD_SPOOL_MAX_MEMORY
+
+_CHUNK_SIZE = 64 * 1024
+
+
+def _process_umask() -> int:
+    """读取进程的 umask（os.umask 只能设置后再恢复，在导入时读取一次，避免与其他线程创建文件竞争）"""
+    mask = os.umask(0)
+    os.umask(mask)
+    return mask
+
+
+# 保存的论文文件权限：与 open() 新建文件相同（mkstemp 创建的临时文件固定为 0600）
+_FILE_MODE = 0o666 & ~_process_umask()
+
+
+class UploadTooLarge(ValueError):
+    """上传内容超过大小上限"""
+
+    def __init__(self, limit: int):
+        super().__init__(f"上传文件超过大小上限（{limit / 1024 / 1024:.0f} MB）")
+        self.limit = limit
+
+
+class SpooledUpload:
+    """
+    上传文件的本地副本（用作上下文管理器，退出时删除临时文件）
+    :param stream: 二进制输入流（如 FileStorage.stream）
+    :param suffix: 转存临时文件的后缀（部分提取器按后缀识别格式）
+    :param max_bytes: 大小上限，超出时抛出 UploadTooLarge
+    :param max_memory: 内存中最多保留的字节数，超出后转存到磁盘
+    """
+
+    def __init__(self, stream, suffix: str = '', max_bytes: int = MAX_CONTENT_LENGTH,
+                 max_memory: int = UPLOAD_SPOOL_MAX_MEMORY):
+        self.size = 0
+        self.path = None  # 转存到磁盘时的临时文件路径
+        self._buffer = io.BytesIO()
+        self._mmap = None
+        digest = hashlib.sha256()
+        out = self._buffer
+        try:
+            for chunk in iter(lambda: stream.read(_CHUNK_SIZE), b''):
+                self.size += len(chunk)
+                if max_bytes and self.size > max_bytes:
+                    raise UploadTooLarge(max_bytes)
+                digest.update(chunk)
+                if self.path is None and self.size > max_memory:
+                    out = self._rollover(suffix)
+                out.write(chunk)
+        except BaseException:
+            self.close()
+            raise
+        finally:
+            if out is not self._buffer:
+                out.close()
+        self.sha256 = digest.hexdigest()
+
+    @classmethod
+    def from_file(cls, file, **kwargs) -> 'SpooledUpload':
+        """从 werkzeug 的 FileStorage 读取，临时文件沿用原文件的扩展名"""
+        kwargs.setdefault('suffix', os.path.splitext(file.filename or '')[1])
+        return cls(file.stream, **kwargs)
+
+    def _rollover(self, suffix: str):
+        """内存缓冲转存到临时文件，返回后续写入的文件对象"""
+        fd, self.path = tempfile.mkstemp(suffix=suffix, prefix='upload_')
+        out = os.fdopen(fd, 'wb')
+        out.write(self._buffer.getvalue())
+        self._buffer = io.BytesIO()
+        return out
+
+    @property
+    def on_disk(self) -> bool:
+        return self.path is not None
+
+    def source(self) -> Union[str, bytes]:
+        """交给提取器的输入：磁盘上的路径，或内存中的 bytes"""
+        return self.path if self.on_disk else self._buffer.getvalue()
+
+    def buffer(self):
+        """只读缓冲区：磁盘文件为内存映射，内存文件为 memoryview（均不拷贝整个文件）"""
+        if not self.on_disk:
+            return self._buffer.getbuffer()
+        if self._mmap is None:
+            with open(self.path, 'rb') as f:
+                self._mmap = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+        return self._mmap
+
+    def decode_text(self, encoding: str = 'utf-8', errors: str = 'strict') -> str:
+        """按编码解码为字符串（直接从缓冲区解码，编码错误时与 bytes.decode 一样抛出 UnicodeDecodeError）"""
+        if self.size == 0:
+            return ''
+        buffer = self.buffer()
+        try:
+            return str(buffer, encoding, errors)
+        finally:
+            if isinstance(buffer, memoryview):
+                buffer.release()
+
+    def save(self, dest_path: str):
+        """保存到目标路径：已在磁盘上时直接移动临时文件，否则写出内存中的内容"""
+        if self.on_disk:
+            self._close_mmap()
+            shutil.move(self.path, dest_path)
+            self.path = None
+            os.chmod(dest_path, _FILE_MODE)
+        else:
+            with open(dest_path, 'wb') as f:
+                f.write(self._buffer.getbuffer())
+
+    def _close_mmap(self):
+        if self._mmap is not None:
+            self._mmap.close()
+            self._mmap = None
+
+    def close(self):
+        self._close_mmap()
+        if self.path is not None:
+            try:
+                os.remove(self.path)
+            except OSError:
+                pass
+            self.path = None
+        self._buffer = io.BytesIO()
+
+    def __enter__(self) -> 'SpooledUpload':
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
@@ -0,0 +1,237 @@
+# backend/utils/text_normalization.py
+"""
+共用的文本规范化
+
+各处的文本清洗（关键词提取、分词预处理、相似段落、主题摘要、错字检测）统一使用这里预编译的正则和冻结的停用词表，
+不再在热点函数里每次调用时重新构造。normalize 一次遍历完成小写化、去标点和空白压缩，
+同时返回规范化文本每个字符在原文中的位置，便于把规范化文本上的匹配结果映射回原文；
+记录偏移比 preprocess_paragraph 慢约一倍，只在需要映射回原文的地方使用。
+normalize_for_fingerprint 是 winnowing 指纹使用的规范化（NFKC，去掉空白），同样返回偏移。
+
+运行 python -m utils.text_normalization 可查看各写法的单次调用耗时（与生产代码调用的函数一致）。
+"""
+import re
+import unicodedata
+from collections import namedtuple
+from typing import List
+
+# 文本片段：内容 + 在原文中的起止偏移
+Span = namedtuple('Span', ['text', 'start', 'end'])
+# 规范化结果：文本 + 每个字符在原文中的位置
+NormalizedText = namedtuple('NormalizedText', ['text', 'offsets'])
+
+# ---------------------------------------------------------------- 预编译正则
+
+CHINESE_RE = re.compile(r'[\u4e00-\u9fa5]')
+TOKEN_CLEAN_RE = re.compile(r'[^\u4e00-\u9fa5a-zA-Z0-9\s]')     # 分词前替换为空格的字符
+WORD_RE = re.compile(r'\b[\w]+\b')
+PARAGRAPH_RE = re.compile(r'[^\n]+')
+SENTENCE_SPLIT_RE = re.compile(r'(。|！|\?|\.|!|\?)')            # 中英文句末标点
+CN_SENTENCE_SPLIT_RE = re.compile(r'([。？！])')                # 中文句末标点
+PARAGRAPH_CLEAN_RE = re.compile(r'[^\w\s\u4e00-\u9fa5]')
+WHITESPACE_RE = re.compile(r'\s+')
+PUNCTUATION_RE = re.compile(r'[^\w\s]')
+SEARCH_TERM_RE = re.compile(r'[\u4e00-\u9fa5a-zA-Z0-9]{2,}')     # 检索用的候选词（至少两个字符）
+TYPO_TEXT_RE = re.compile(r'[\u4e00-\u9fa5a-zA-Z0-9，。、？！：；,.!?;:]+')
+SPELL_SENTENCE_SPLIT_RE = re.compile(r'([。！？!?；;\n])')        # 错字检测分片的句子边界
+_NORMALIZE_RUN_RE = re.compile(r'(\s+)|\w+')  # normalize 保留的连续片段：空白或单词字符
+# normalize_for_fingerprint：ASCII 字母数字和常用汉字的连续片段（NFKC 不改变这些字符）或单个需要 NFKC 的非 ASCII 字符
+_FINGERPRINT_RUN_RE = re.compile(r'([0-9a-zA-Z\u4e00-\u9fa5]+)|[^\x00-\x7f\u4e00-\u9fa5]')
+_FINGERPRINT_KEEP_RE = re.compile(r'[0-9a-z\u4e00-\u9fa5]')
+
+# ---------------------------------------------------------------- 停用词
+
+CHINESE_STOP_WORDS = frozenset([
+    '的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个',
+    '上', '也', '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己'
+])
+ENGLISH_STOP_WORDS = frozenset([
+    'a', 'an', 'the', 'in', 'on', 'at', 'by', 'for', 'to', 'of', 'with', 'is',
+    'are', 'was', 'were', 'be', 'been', 'being', 'have', 'has', 'had', 'having'
+])
+# 分词结果过滤用停用词（中文 + 英文）
+TOKEN_STOP_WORDS = CHINESE_STOP_WORDS | ENGLISH_STOP_WORDS
+# 主题关键词提取用停用词（额外过滤常见连词、指示词）
+KEYWORD_STOP_WORDS = CHINESE_STOP_WORDS | frozenset([
+    '这个', '那个', '然后', '如果', '所以', '但是', '因为', '或者', '而且'
+])
+
+
+# ---------------------------------------------------------------- 规范化
+
+def normalize(text: str) -> NormalizedText:
+    """
+    一次遍历完成规范化：小写，去掉中文、字母、数字、下划线以外的字符，连续空白压缩为一个空格并去掉首尾空白
+    结果与 preprocess_paragraph 相同，另外返回每个字符在原文中的位置（offsets[i] 为第 i 个字符的原文下标）
+    """
+    pieces = []
+    offsets = []
+    pending_space = None  # 尚未输出的空白（只在后面还有单词字符时输出）
+    for match in _NORMALIZE_RUN_RE.finditer(text):
+        start = match.start()
+        if match.group(1) is not None:
+            if pieces:
+                pending_space = start
+            continue
+        if pending_space is not None:
+            pieces.append(' ')
+            offsets.append(pending_space)
+            pending_space = None
+        run = match.group().lower()
+        if len(run) == match.end() - start:
+            pieces.append(run)
+            offsets.extend(range(start, match.end()))
+        else:  # 少数字符小写后长度变化（如 'İ' -> 'i' + 组合符），逐字符处理并去掉产生的非单词字符
+            for i, char in enumerate(match.group()):
+                lowered = PARAGRAPH_CLEAN_RE.sub('', char.lower())
+                pieces.append(lowered)
+                offsets.extend([start + i] * len(lowered))
+    return NormalizedText(''.join(pieces), offsets)
+
+
+def normalize_for_fingerprint(text: str) -> NormalizedText:
+    """
+    指纹用规范化：逐字符 NFKC、小写，只保留中文、小写字母和数字（全角字母数字折叠为半角，空白和标点全部去掉）
+    只有非 ASCII 的非汉字字符需要逐个做 NFKC，其余字符按连续片段整体处理
+    """
+    pieces = []
+    offsets = []
+    for match in _FINGERPRINT_RUN_RE.finditer(text or ''):
+        start = match.start()
+        if match.group(1) is not None:
+            pieces.append(match.group().lower())
+            offsets.extend(range(start, match.end()))
+            continue
+        for char in unicodedata.normalize('NFKC', match.group()).lower():
+            if _FINGERPRINT_KEEP_RE.match(char):
+                pieces.append(char)
+                offsets.append(start)
+    return NormalizedText(''.join(pieces), offsets)
+
+
+def to_original_span(normalized: NormalizedText, start: int, end: int):
+    """规范化文本上的 [start, end) 映射为原文中的 [start, end)"""
+    if start >= end:
+        position = normalized.offsets[start] if start < len(normalized.offsets) else None
+        return position, position
+    return normalized.offsets[start], normalized.offsets[end - 1] + 1
+
+
+def preprocess_paragraph(text: str) -> str:
+    """段落级预处理：小写，只保留中文、字母、数字，压缩空白"""
+    return ' '.join(PARAGRAPH_CLEAN_RE.sub('', text.lower()).split())  # str.split() 一步完成空白压缩和去首尾
+
+
+def clean_for_tokenize(text: str) -> str:
+    """分词前清洗：标点等替换为空格"""
+    return TOKEN_CLEAN_RE.sub(' ', text)
+
+
+def strip_punctuation(text: str) -> str:
+    return PUNCTUATION_RE.sub('', text)
+
+
+def search_terms(text: str, limit: int = None) -> List[str]:
+    """从标题等短文本中提取检索候选词"""
+    terms = SEARCH_TERM_RE.findall(text)
+    return terms if limit is None else terms[:limit]
+
+
+def split_sentence_texts(text: str, split_re=SENTENCE_SPLIT_RE) -> List[str]:
+    """按句末标点切分句子（标点归入前一句）；末尾没有标点的部分单独成句"""
+    parts = split_re.split(text)
+    parts.append('')
+    return list(map(str.__add__, parts[0::2], parts[1::2]))
+
+
+def split_sentences(text: str, split_re=SENTENCE_SPLIT_RE) -> List[Span]:
+    """同 split_sentence_texts，同时返回每个句子在原文中的偏移"""
+    sentences = []
+    offset = 0
+    for sentence in split_sentence_texts(text, split_re):
+        end = offset + len(sentence)
+        sentences.append(Span(sentence, offset, end))
+        offset = end
+    return sentences
+
+
+def sentence_batches(text: str, max_chars: int, split_re=SPELL_SENTENCE_SPLIT_RE) -> List[Span]:
+    """把相邻句子合并成约 max_chars 个字符的连续片段（句子不会被截断，片段首尾相接覆盖全文）"""
+    batches = []
+    start = 0
+    for sentence in split_sentences(text, split_re):
+        if sentence.end - start >= max_chars:
+            batches.append(Span(text[start:sentence.end], start, sentence.end))
+            start = sentence.end
+    if start < len(text):
+        batches.append(Span(text[start:], start, len(text)))
+    return batches
+
+
+# ---------------------------------------------------------------- 微基准
+
+def _benchmark(rounds: int = 2000):
+    """对比旧写法与生产代码当前调用的函数的单次调用耗时"""
+    import timeit
+
+    paragraph = ('本文提出了一种基于深度学习的文本相似度计算方法，Experiments on the benchmark show that '
+                 'the proposed method is effective！我们在多个数据集上进行了验证。') * 4
+    words = ['方法', '的', '文本', 'the', '数据集', '了', '验证'] * 20
+
+    def old_preprocess():  # 模块级 re 函数：每次调用都要按模式字符串查编译缓存，且分两遍清洗
+        text = paragraph.lower()
+        text = re.sub(r'[^\w\s\u4e00-\u9fa5]', '', text)
+        return re.sub(r'\s+', ' ', text).strip()
+
+    def old_stopword_filter():
+        stopwords = set(['的', '了', '在', '是', '我', '有', '和', '就', '不', '人', '都', '一', '一个', '上', '也',
+                         '很', '到', '说', '要', '去', '你', '会', '着', '没有', '看', '好', '自己'])
+        return [w for w in words if w not in stopwords and len(w) >= 2]
+
+    def old_sentences():
+        parts = re.split(r'([。？！])', paragraph)
+        combined, current = [], ''
+        for i, part in enumerate(parts):
+            current += part
+            if i % 2 == 1 or i == len(parts) - 1:
+                combined.append(current)
+                current = ''
+        return combined
+
+    def old_fingerprint_normalize():  # 原 winnowing.normalize_with_offsets：每个字符单独做 NFKC 和正则匹配
+        chars, offsets = [], []
+        for index, char in enumerate(paragraph):
+            for c in unicodedata.normalize('NFKC', char).lower():
+                if _FINGERPRINT_KEEP_RE.match(c):
+                    chars.append(c)
+                    offsets.append(index)
+        return ''.join(chars), offsets
+
+    def new_stopword_filter(stopwords=CHINESE_STOP_WORDS):
+        return [w for w in words if w not in stopwords and len(w) >= 2]
+
+    cases = [
+        # AnalyzedDocument.processed_paragraphs：每个段落都会调用
+        ('段落预处理', old_preprocess, lambda: preprocess_paragraph(paragraph)),
+        ('停用词过滤', old_stopword_filter, new_stopword_filter),
+        ('句子切分', old_sentences, lambda: split_sentence_texts(paragraph, CN_SENTENCE_SPLIT_RE)),
+        # winnow：上传和查重时对全文调用
+        ('指纹规范化', old_fingerprint_normalize, lambda: normalize_for_fingerprint(paragraph)),
+    ]
+    assert old_preprocess() == normalize(paragraph).text == preprocess_paragraph(paragraph)
+    assert old_stopword_filter() == new_stopword_filter()
+    assert old_sentences() == split_sentence_texts(paragraph, CN_SENTENCE_SPLIT_RE)
+    assert old_fingerprint_normalize() == tuple(normalize_for_fingerprint(paragraph))
+
+    def per_call_us(func):
+        return min(timeit.repeat(func, number=rounds, repeat=5)) / rounds * 1e6
+
+    for name, old, new in cases:
+        old_us, new_us = per_call_us(old), per_call_us(new)
+        print(f"{name:<10} 旧写法 {old_us:8.2f} µs   新写法 {new_us:8.2f} µs   节省 {old_us - new_us:6.2f} µs/次")
+    # normalize 只用于相似段落对把匹配片段映射回原文（旧写法没有对应实现），单独列出其开销
+    print(f"{'规范化 + 偏移映射（仅命中的段落对）':<10} {per_call_us(lambda: normalize(paragraph)):8.2f} µs/次")
+
+
+if __name__ == '__main__':
+    _benchmark()
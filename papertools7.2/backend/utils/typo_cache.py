@@ -0,0 +1,136 @@
+# backend/utils/typo_cache.py
+"""
+句子级错字检测结果缓存
+
+学生常把同一篇论文小改后反复提交错字检测。pycorrector 对每个句子的判断只依赖句子本身，
+这里按 “句子文本哈希 + 模型版本” 缓存检测结果（位置相对于句首），复查时只有新增/修改的句子需要重新检测。
+缓存保存在 SQLite 中（重启后仍然有效，多个 worker 进程共享），条数超过上限时按最近使用时间淘汰。
+"""
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+from typing import Dict, Iterable, List, Tuple
+
+from config.config import SPELL_CACHE_PATH, SPELL_CACHE_MAX_ENTRIES, SPELL_CACHE_VERSION
+from config.logging_config import logger
+
+# 句内错误：(句内起点, 句内终点, 错误文本, 建议)
+SentenceErrors = List[Tuple[int, int, str, str]]
+
+_SQLITE_MAX_VARIABLES = 500  # 单条 IN (...) 查询的参数个数
+
+
+def sentence_key(sentence: str) -> str:
+    return hashlib.sha1(f"{SPELL_CACHE_VERSION}\x00{sentence}".encode('utf-8')).hexdigest()
+
+
+class SentenceTypoCache:
+    """SQLite 持久化的句子检测结果缓存（有条数上限）"""
+
+    def __init__(self, path: str = SPELL_CACHE_PATH, max_entries: int = SPELL_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, timeout=30, check_same_thread=False, isolation_level=None)
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA synchronous=NORMAL')
+        self._conn.execute('CREATE TABLE IF NOT EXISTS typo_cache ('
+                           'key TEXT PRIMARY KEY, errors TEXT NOT NULL, used_at REAL NOT NULL)')
+        self._conn.execute('CREATE INDEX IF NOT EXISTS idx_typo_cache_used_at ON typo_cache (used_at)')
+        self._count = self._conn.execute('SELECT COUNT(*) FROM typo_cache').fetchone()[0]
+
+        # 统计（按句子计）
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    @staticmethod
+    def _chunks(items: List, size: int = _SQLITE_MAX_VARIABLES):
+        for i in range(0, len(items), size):
+            yield items[i:i + size]
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, SentenceErrors]:
+        """批量查询，命中的条目同时刷新最近使用时间"""
+        keys = list(dict.fromkeys(keys))
+        found = {}
+        now = time.time()
+        with self._lock:
+            try:
+                for chunk in self._chunks(keys):
+                    placeholders = ','.join('?' * len(chunk))
+                    rows = self._conn.execute(
+                        f'SELECT key, errors FROM typo_cache WHERE key IN ({placeholders})', chunk
+                    ).fetchall()
+                    for key, errors in rows:
+                        found[key] = [tuple(e) for e in json.loads(errors)]
+                    if rows:
+                        hit_keys = [key for key, _ in rows]
+                        self._conn.execute(
+                            f'UPDATE typo_cache SET used_at = ? WHERE key IN ({",".join("?" * len(hit_keys))})',
+                            [now] + hit_keys
+                        )
+            except sqlite3.Error as e:
+                logger.warning(f"读取错字缓存失败: {str(e)}")
+            self.hits += len(found)
+            self.misses += len(keys) - len(found)
+        return found
+
+    def put_many(self, entries: Dict[str, SentenceErrors]):
+        """批量写入，超过上限时淘汰最久未使用的条目（一次淘汰到上限的 90%）"""
+        if not entries:
+            return
+        now = time.time()
+        rows = [(key, json.dumps(errors, ensure_ascii=False), now) for key, errors in entries.items()]
+        with self._lock:
+            try:
+                self._conn.execute('BEGIN')
+                self._conn.executemany('INSERT OR REPLACE INTO typo_cache (key, errors, used_at) VALUES (?, ?, ?)', rows)
+                self._conn.execute('COMMIT')
+                self._count += len(rows)
+                if self._count > self.max_entries:
+                    self._evict()
+            except sqlite3.Error as e:
+                logger.warning(f"写入错字缓存失败: {str(e)}")
+                if self._conn.in_transaction:
+                    self._conn.execute('ROLLBACK')
+
+    def _evict(self):
+        self._count = self._conn.execute('SELECT COUNT(*) FROM typo_cache').fetchone()[0]
+        excess = self._count - int(self.max_entries * 0.9)
+        if excess <= 0:
+            return
+        self._conn.execute('DELETE FROM typo_cache WHERE key IN '
+                           '(SELECT key FROM typo_cache ORDER BY used_at LIMIT ?)', (excess,))
+        self._count -= excess
+        self.evictions += excess
+        logger.info(f"错字缓存淘汰 {excess} 条，剩余 {self._count} 条")
+
+    def get_stats(self) -> Dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'entries': self._count,
+                'max_entries': self.max_entries,
+                'sentence_hits': self.hits,
+                'sentence_misses': self.misses,
+                'hit_rate': round(self.hits / lookups, 4) if lookups else 0,
+                'evictions': self.evictions
+            }
+
+
+_cache = None
+_cache_lock = threading.Lock()
+
+
+def get_typo_cache() -> SentenceTypoCache:
+    """进程内共享的句子检测结果缓存"""
+    global _cache
+    if _cache is None:
+        with _cache_lock:
+            if _cache is None:
+                _cache = SentenceTypoCache()
+    return _cache
@@ -0,0 +1,182 @@
+# backend/utils/winnowing.py
+"""
+Winnowing 文本指纹（Schleimer et al., SIGMOD 2003）
+
+对归一化文本做 k-gram 滚动哈希，在每个长度为 w 的窗口中选取最小哈希作为指纹。
+任何长度 >= w + k - 1 的公共子串都保证至少共享一个指纹，
+因此查重只需比较指纹集合，而不需要对全文做两两比对。
+"""
+import threading
+from collections import defaultdict, namedtuple
+from typing import Dict, Iterable, List, Tuple
+
+from config.config import WINNOWING_K, WINNOWING_WINDOW
+from utils.text_normalization import normalize_for_fingerprint
+
+# 指纹：哈希值 + 在原文中的起止偏移
+Fingerprint = namedtuple('Fingerprint', ['hash', 'start', 'end'])
+
+_HASH_BASE = 257
+_HASH_MOD = (1 << 61) - 1
+
+
+def kgram_hashes(text: str, k: int = WINNOWING_K) -> List[int]:
+    """Karp-Rabin 滚动哈希，返回每个 k-gram 的哈希值"""
+    if len(text) < k:
+        return []
+    high = pow(_HASH_BASE, k - 1, _HASH_MOD)
+    value = 0
+    for c in text[:k]:
+        value = (value * _HASH_BASE + ord(c)) % _HASH_MOD
+    hashes = [value]
+    for i in range(k, len(text)):
+        value = ((value - ord(text[i - k]) * high) * _HASH_BASE + ord(text[i])) % _HASH_MOD
+        hashes.append(value)
+    return hashes
+
+
+def winnow(text: str, k: int = WINNOWING_K, window: int = WINNOWING_WINDOW) -> List[Fingerprint]:
+    """
+    计算文本的 winnowing 指纹
+    每个窗口选取最小哈希（并列时取最右侧），相邻窗口选中同一位置时只记录一次
+    """
+    normalized, offsets = normalize_for_fingerprint(text)
+    hashes = kgram_hashes(normalized, k)
+    if not hashes:
+        return []
+
+    fingerprints = []
+    if len(hashes) <= window:
+        positions = [min(range(len(hashes)), key=lambda i: (hashes[i], -i))]
+    else:
+        positions = []
+        min_pos = -1
+        for start in range(len(hashes) - window + 1):
+            end = start + window
+            if min_pos < start:
+                # 上一个最小值已滑出窗口，重新扫描整个窗口
+                min_pos = start
+                for i in range(start, end):
+                    if hashes[i] <= hashes[min_pos]:
+                        min_pos = i
+                positions.append(min_pos)
+            elif hashes[end - 1] <= hashes[min_pos]:
+                min_pos = end - 1
+                positions.append(min_pos)
+
+    for pos in positions:
+        fingerprints.append(Fingerprint(hashes[pos], offsets[pos], offsets[pos + k - 1] + 1))
+    return fingerprints
+
+
+def merge_spans(matches: Iterable[Tuple[int, int, int, int]], gap: int = 0) -> List[Dict]:
+    """
+    将命中的指纹对合并为连续片段
+    :param matches: (查询起点, 查询终点, 命中起点, 命中终点) 列表
+    :param gap: 允许合并的最大间隔字符数
+    """
+    spans = []
+    for q_start, q_end, c_start, c_end in sorted(matches):
+        if spans:
+            last = spans[-1]
+            if (q_start <= last['source_end'] + gap
+                    and last['target_start'] <= c_start <= last['target_end'] + gap):
+                last['source_end'] = max(last['source_end'], q_end)
+                last['target_end'] = max(last['target_end'], c_end)
+                continue
+        spans.append({
+            'source_start': q_start, 'source_end': q_end,
+            'target_start': c_start, 'target_end': c_end
+        })
+    return spans
+
+
+class FingerprintIndex:
+    """内存中的指纹倒排索引：hash -> [(doc_id, 起点, 终点)]"""
+
+    def __init__(self):
+        self._postings = defaultdict(list)
+        self._doc_hashes = {}  # doc_id -> 指纹哈希集合（用于删除）
+        self._lock = threading.RLock()
+
+    def __contains__(self, doc_id):
+        return doc_id in self._doc_hashes
+
+    def __len__(self):
+        return len(self._doc_hashes)
+
+    def add(self, doc_id, fingerprints: List[Fingerprint]):
+        """添加（或替换）一篇文档的指纹"""
+        with self._lock:
+            if doc_id in self._doc_hashes:
+                self.remove(doc_id)
+            for fp in fingerprints:
+                self._postings[fp.hash].append((doc_id, fp.start, fp.end))
+            self._doc_hashes[doc_id] = {fp.hash for fp in fingerprints}
+
+    def remove(self, doc_id):
+        """删除一篇文档的全部指纹"""
+        with self._lock:
+            hashes = self._doc_hashes.pop(doc_id, None)
+            if hashes is None:
+                return
+            for fp_hash in hashes:
+                remaining = [entry for entry in self._postings[fp_hash] if entry[0] != doc_id]
+                if remaining:
+                    self._postings[fp_hash] = remaining
+                else:
+                    del self._postings[fp_hash]
+
+    def query(self, fingerprints: List[Fingerprint], exclude=None, min_similarity: float = 0.0) -> List[Dict]:
+        """
+        查询与给定指纹共享片段的文档
+        :param exclude: 需要排除的文档 ID（通常是查询文档自身）
+        :param min_similarity: 最低相似度（共享指纹数 / 查询指纹数）
+        :return: 按相似度降序的 [{'doc_id', 'similarity', 'shared', 'spans'}]
+        """
+        if not fingerprints:
+            return []
+        with self._lock:
+            hits = [
+                (fp_hash, doc_id, c_start, c_end)
+                for fp_hash in {fp.hash for fp in fingerprints}
+                for doc_id, c_start, c_end in self._postings.get(fp_hash, ())
+                if doc_id != exclude
+            ]
+        return rank_matches(fingerprints, hits, min_similarity)
+
+
+def rank_matches(fingerprints: List[Fingerprint], hits: Iterable[Tuple[int, int, int, int]],
+                 min_similarity: float = 0.0) -> List[Dict]:
+    """
+    根据倒排索引命中结果计算每篇文档的相似度并对齐重复片段
+    :param fingerprints: 查询文档的指纹
+    :param hits: (指纹哈希, doc_id, 命中起点, 命中终点) 列表
+    :return: 按相似度降序的 [{'doc_id', 'similarity', 'shared', 'spans'}]
+    """
+    query_positions = defaultdict(list)
+    for fp in fingerprints:
+        query_positions[fp.hash].append((fp.start, fp.end))
+    if not query_positions:
+        return []
+
+    matches = defaultdict(list)
+    shared = defaultdict(set)
+    for fp_hash, doc_id, c_start, c_end in hits:
+        for q_start, q_end in query_positions.get(fp_hash, ()):
+            matches[doc_id].append((q_start, q_end, c_start, c_end))
+        shared[doc_id].add(fp_hash)
+
+    results = []
+    for doc_id, hashes in shared.items():
+        similarity = len(hashes) / len(query_positions)
+        if similarity < min_similarity:
+            continue
+        results.append({
+            'doc_id': doc_id,
+            'similarity': similarity,
+            'shared': len(hashes),
+            'spans': merge_spans(matches[doc_id], gap=WINNOWING_K)
+        })
+    results.sort(key=lambda item: item['similarity'], reverse=True)
+    return results